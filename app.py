@@ -1,21 +1,42 @@
-from flask import Flask, request, redirect, session, jsonify, url_for
+from flask import Flask, Response, request, redirect, session, jsonify, url_for
 from flask_cors import CORS
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 import requests
 import os
 from datetime import date, time, datetime
 import time
 from urllib.parse import urlencode
 import json
+import hmac
 import openai
-import math
 from dotenv import load_dotenv
 import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import schedule
 import pandas as pd
 from acrcloud.recognizer import ACRCloudRecognizer
 import threading
+import db
+import fastjson
+import compression
+from httpcache import conditional
+import geo
+import search as search_bars
+import tags
+import event_windows
+import feed
+import follow_counts
+import leaderboard
+import user_search
+from pagination import encode_cursor, decode_cursor
+from bar_names import BarNames
+from cache import LRUCache, response_cache
+from facets import BarFacets
+from identity import UserIds
+from live_queue import song_queue
+from projections import BAR_CARD_COLUMNS, bar_detail_columns, requested_fields, columns_sql
+from db import get_db, release_db
 
 load_dotenv()
 
@@ -31,21 +52,52 @@ REDIRECT_URI = os.getenv('REDIRECT_URI')
 
 OPENAI_KEY = os.getenv('OPENAI_KEY')
 
-HOST = os.getenv('HOST')
-DATABASE = os.getenv('DATABASE')
-DB_USER = os.getenv('DB_USER')
-PASSWORD = os.getenv('PASSWORD')
+MAX_SONGS_PER_BAR = int(os.getenv('MAX_SONGS_PER_BAR', 50))  # songs attached to each bar in list views
+BAR_INDEX_TTL = int(os.getenv('BAR_INDEX_TTL', 600))  # seconds before the in-memory bar location index is reloaded
 
+USER_ID_CACHE_SIZE = int(os.getenv('USER_ID_CACHE_SIZE', 10000))  # emails whose user id is kept in memory
 
+AI_CACHE_TTL = int(os.getenv('AI_CACHE_TTL', 24 * 3600))  # seconds an AI search result is served as fresh
+AI_CACHE_STALE_TTL = int(os.getenv('AI_CACHE_STALE_TTL', 7 * 24 * 3600))  # served stale (and refreshed) until this age
+AI_CACHE_SIZE = int(os.getenv('AI_CACHE_SIZE', 1024))  # in-memory entries in front of ai_recommendations
 
-def get_db_connection():
-    conn = psycopg2.connect(
-        host=HOST,
-        database=DATABASE,
-        user=DB_USER,
-        password=PASSWORD
-    )
-    return conn
+EVENTS_PAGE_SIZE = int(os.getenv('EVENTS_PAGE_SIZE', 50))  # events per /api/events page
+EVENTS_MAX_PAGE_SIZE = int(os.getenv('EVENTS_MAX_PAGE_SIZE', 200))  # cap on ?limit=
+
+QUEUE_PAGE_SIZE = int(os.getenv('QUEUE_PAGE_SIZE', 20))  # song requests per ranked page
+QUEUE_MAX_PAGE_SIZE = int(os.getenv('QUEUE_MAX_PAGE_SIZE', 100))  # cap on ?limit=
+
+FEED_PAGE_SIZE = int(os.getenv('FEED_PAGE_SIZE', 50))  # entries per /api/following_been_there page
+FEED_MAX_PAGE_SIZE = int(os.getenv('FEED_MAX_PAGE_SIZE', 200))  # cap on ?limit=
+
+AI_SEARCH_CONCURRENCY = int(os.getenv('AI_SEARCH_CONCURRENCY', 3))  # completions in flight per search (1 = serial)
+AI_SEARCH_BUDGET = float(os.getenv('AI_SEARCH_BUDGET', 20))  # seconds before a search gives up
+AI_SEARCH_WORKERS = int(os.getenv('AI_SEARCH_WORKERS', 16))  # completion threads shared by all searches
+AI_ATTEMPT_TIMEOUT = float(os.getenv('AI_ATTEMPT_TIMEOUT', 8))  # seconds one completion may hold an ai_executor thread
+AI_NAME_MIN_SCORE = float(os.getenv('AI_NAME_MIN_SCORE', 0.6))  # trigram score for a suggestion to match a bar
+AI_MAX_MATCHES = int(os.getenv('AI_MAX_MATCHES', 10))  # bars kept from one completion's suggestions
+
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')  # bearer token for /api/metrics; unset hides the endpoint
+
+# Connections are checked out of the shared pool on first use in a request
+# and handed back by the teardown hook, so handlers never close them.
+db.init_app(app)
+
+# orjson-backed jsonify() and gzip/brotli for clients that accept it
+fastjson.init_app(app)
+compression.init_app(app)
+
+# In-memory grid of bar coordinates for check-in detection
+bar_locations = geo.BarLocations(ttl=BAR_INDEX_TTL)
+
+# In-memory trigram index of bar names for resolving AI suggestions
+bar_names = BarNames(ttl=BAR_INDEX_TTL)
+
+# In-memory facet bitmaps for /api/filter_bars
+bar_facets = BarFacets(ttl=BAR_INDEX_TTL)
+
+# email -> user id for the social and list endpoints
+user_ids = UserIds(USER_ID_CACHE_SIZE)
 
 # BAR REDIRECT
 
@@ -57,13 +109,204 @@ def bar_redirect(bar_id):
 
 # AI SEARCH 
 
+# ai_recommendations doubles as a read-through cache of model results, keyed
+# on the normalized "query near location" string, with an LRU in front of it
+ai_cache = LRUCache(AI_CACHE_SIZE)  # key -> (bars, last_updated)
+ai_cache_stats = Counter()
+ai_refreshing = set()
+ai_refreshing_lock = threading.Lock()
+ai_executor = ThreadPoolExecutor(max_workers=AI_SEARCH_WORKERS, thread_name_prefix='ai-search')
+
+
+def ai_cache_key(query, location):
+    return ' '.join(f"{query} near {location}".lower().split())
+
+
+def suggest_bar_names(combined_query, timeout, cancelled):
+    # The search may have been answered while this sat in the queue
+    if cancelled.is_set():
+        return []
+    response = openai.chat.completions.create(
+        model="ft:gpt-4o-2024-08-06:personal::A3BdX0ph",
+        messages=[
+            {"role": "system", "content": "You are a nightlife guru who recommends bars and clubs based on users' desires."},
+            {"role": "user", "content": f"{combined_query}"}
+        ],
+        max_tokens=150,
+        timeout=timeout
+    )
+
+    suggestions = response.choices[0].message.content
+    return [suggestion.strip() for suggestion in suggestions.split(',') if suggestion.strip()]
+
+
+def ai_bar_dict(bar):
+    return {
+        "id": bar[0],
+        "name": bar[1],
+        "address": bar[2],
+        "phone_number": bar[3],
+        "description": bar[6],
+        "vibe": float(bar[7]) if bar[7] is not None else None,
+        "type": bar[8],
+        "lineWaitTime": bar[9],
+        "price_signs": bar[15],
+        "price_num": bar[16],
+        "photo": bar[18],
+        "avgMaleAge": bar[10],
+        "avgFemaleAge": bar[11],
+        "percentSingleMen": bar[12],
+        "percentSingleWomen": bar[13],
+        "latitude": bar[23], 
+        "longitude": bar[24],
+        "djsInstagram": bar[25],
+        "ticketLink": bar[26],
+        "enableRequests": bar[27],
+        "website_link": bar[28],
+        "reservation_link": bar[29],
+        "howCrowded": bar[30]
+    }
+
+
+def match_suggested_bars(suggested_bars):
+    """The catalog bar best matching each of the model's suggestions, best match first."""
+    print("Pre database check:", suggested_bars)
+    if not suggested_bars:
+        return []
+
+    # Only hold a connection for the lookup itself, not while the model runs
+    with db.pool.connection() as conn:
+        matches = bar_names.get(conn).resolve(suggested_bars, AI_NAME_MIN_SCORE, AI_MAX_MATCHES)
+        if not matches:
+            return []
+
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM bars WHERE id = ANY(%s)', ([bar_id for bar_id, _ in matches],))
+        bars_by_id = {bar[0]: bar for bar in cursor.fetchall()}
+        cursor.close()
+
+    return [ai_bar_dict(bars_by_id[bar_id]) for bar_id, _ in matches if bar_id in bars_by_id]
+
+
+def recommend_bars(combined_query):
+    """Ask the fine-tuned model for bars until one is in our catalog; [] if none.
+
+    AI_SEARCH_CONCURRENCY completions start at once on ai_executor. Each
+    answer is checked against the catalog as it arrives and the first
+    match wins; a miss or an error starts a replacement, up to max_attempts
+    in all. Once the search is answered nothing more is submitted, queued
+    attempts return without calling the model, and a call already in
+    flight can hold its thread for AI_ATTEMPT_TIMEOUT seconds at most.
+    Gives up after AI_SEARCH_BUDGET seconds.
+    """
+    openai.api_key = OPENAI_KEY
+    max_attempts = 10
+    attempts = 0
+    deadline = time.monotonic() + AI_SEARCH_BUDGET
+    cancelled = threading.Event()
+    pending = set()
+
+    def submit():
+        nonlocal attempts
+        attempts += 1
+        timeout = max(min(deadline - time.monotonic(), AI_ATTEMPT_TIMEOUT), 1)
+        pending.add(ai_executor.submit(suggest_bar_names, combined_query, timeout, cancelled))
+
+    try:
+        for _ in range(min(AI_SEARCH_CONCURRENCY, max_attempts)):
+            submit()
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                print(f"AI search budget of {AI_SEARCH_BUDGET}s exceeded after {attempts} attempts")
+                ai_cache_stats['budget_exceeded'] += 1
+                return []
+
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    suggested_bars = future.result()
+                except Exception as e:
+                    print(f"Error getting AI suggestions: {e}")
+                    suggested_bars = []
+
+                bars = match_suggested_bars(suggested_bars)
+                if bars:
+                    return bars
+
+                # A miss or an error: keep AI_SEARCH_CONCURRENCY in flight
+                if attempts < max_attempts:
+                    submit()
+
+        return []
+    finally:
+        cancelled.set()
+        for future in pending:
+            if not future.cancel():
+                ai_cache_stats['abandoned_calls'] += 1
+
+
+def save_ai_recommendation(cursor, key, bars):
+    current_time = int(time.time())
+    cursor.execute('''
+        INSERT INTO ai_recommendations (query, bars, last_updated)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (query) DO UPDATE
+        SET bars = EXCLUDED.bars,
+            last_updated = EXCLUDED.last_updated
+    ''', (key, json.dumps(bars), current_time))
+    ai_cache.set(key, (bars, current_time))
+
+
+def lookup_ai_recommendation(cursor, key):
+    cached = ai_cache.get(key)
+    if cached is not None:
+        return cached
+
+    cursor.execute('SELECT bars, last_updated FROM ai_recommendations WHERE query = %s', (key,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+
+    bars = json.loads(row[0]) if isinstance(row[0], str) else row[0]
+    cached = (bars, row[1])
+    ai_cache.set(key, cached)
+    return cached
+
+
+def refresh_ai_recommendation(key, combined_query):
+    try:
+        bars = recommend_bars(combined_query)
+        if bars:
+            with db.pool.connection() as conn:
+                cursor = conn.cursor()
+                save_ai_recommendation(cursor, key, bars)
+                conn.commit()
+                cursor.close()
+        ai_cache_stats['refreshes'] += 1
+    except Exception as e:
+        print(f"Error refreshing AI recommendation for '{key}': {e}")
+        ai_cache_stats['refresh_errors'] += 1
+    finally:
+        with ai_refreshing_lock:
+            ai_refreshing.discard(key)
+
+
+def refresh_ai_recommendation_async(key, combined_query):
+    with ai_refreshing_lock:
+        if key in ai_refreshing:
+            return
+        ai_refreshing.add(key)
+    threading.Thread(target=refresh_ai_recommendation, args=(key, combined_query), daemon=True).start()
+
+
 @app.route('/api/ai_search', methods=['POST'])
 def ai_search():
     data = request.json
     query = data.get('query', '')
     email = data.get('email', '')
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
 
     # Fetch user's location from the database
@@ -71,7 +314,6 @@ def ai_search():
     result = cursor.fetchone()
     if not result:
         cursor.close()
-        conn.close()
         return jsonify({'error': 'User not found'}), 404
 
     location = result[0]
@@ -82,84 +324,42 @@ def ai_search():
 
     print(combined_query)
 
-    # Call OpenAI API in a loop
-    openai.api_key = OPENAI_KEY
-    max_attempts = 10
-    attempts = 0
-    bar_found = False
-    bar_dict = None
-
-    while not bar_found and attempts < max_attempts:
-        attempts += 1
-        response = openai.chat.completions.create(
-            model="ft:gpt-4o-2024-08-06:personal::A3BdX0ph",
-            messages=[
-                {"role": "system", "content": "You are a nightlife guru who recommends bars and clubs based on users' desires."},
-                {"role": "user", "content": f"{combined_query}"}
-            ],
-            max_tokens=150
-        )
-
-        suggestions = response.choices[0].message.content
-        suggested_bars = [suggestion.strip() for suggestion in suggestions.split(',') if suggestion.strip()]
-
-        print("Pre database check:", suggested_bars)
-
-        # Use ILIKE for case-insensitive matching and pattern matching for partial matches
-        placeholder = ', '.join(['%s'] * len(suggested_bars))
-        cursor.execute(f'SELECT * FROM bars WHERE name ILIKE ANY(ARRAY[{placeholder}]) LIMIT 1', tuple([f'%{bar}%' for bar in suggested_bars]))
-        bars = cursor.fetchall()
+    # Serve from cache; stale entries are returned right away and
+    # refreshed in the background
+    key = ai_cache_key(query, location)
+    cached = lookup_ai_recommendation(cursor, key)
+    if cached:
+        bars, last_updated = cached
+        age = time.time() - last_updated
+        if age < AI_CACHE_TTL:
+            ai_cache_stats['hits'] += 1
+            cursor.close()
+            return jsonify(bars)
+        if age < AI_CACHE_STALE_TTL:
+            ai_cache_stats['stale_hits'] += 1
+            refresh_ai_recommendation_async(key, combined_query)
+            cursor.close()
+            return jsonify(bars)
+
+    ai_cache_stats['misses'] += 1
+
+    # Give the connection back to the pool while we wait on the model
+    cursor.close()
+    release_db()
 
-        if bars:
-            bar = bars[0]
-            bar_dict = {
-                "id": bar[0],
-                "name": bar[1],
-                "address": bar[2],
-                "phone_number": bar[3],
-                "description": bar[6],
-                "vibe": float(bar[7]) if bar[7] is not None else None,
-                "type": bar[8],
-                "lineWaitTime": bar[9],
-                "price_signs": bar[15],
-                "price_num": bar[16],
-                "photo": bar[18],
-                "avgMaleAge": bar[10],
-                "avgFemaleAge": bar[11],
-                "percentSingleMen": bar[12],
-                "percentSingleWomen": bar[13],
-                "latitude": bar[23], 
-                "longitude": bar[24],
-                "djsInstagram": bar[25],
-                "ticketLink": bar[26],
-                "enableRequests": bar[27],
-                "website_link": bar[28],
-                "reservation_link": bar[29],
-                "howCrowded": bar[30]
-            }
-            bar_found = True
-
-    if not bar_found:
-        cursor.close()
-        conn.close()
+    bars = recommend_bars(combined_query)
+    if not bars:
         return jsonify({'error': 'This happens sometimes, try a different query'}), 400
 
     # Update the AI recommendations database
-    import time
-    current_time = int(time.time())
-    cursor.execute('''
-        INSERT INTO ai_recommendations (query, bars, last_updated)
-        VALUES (%s, %s, %s)
-        ON CONFLICT (query) DO UPDATE
-        SET bars = EXCLUDED.bars,
-            last_updated = EXCLUDED.last_updated
-    ''', (query, json.dumps([bar_dict]), current_time))
+    conn = get_db()
+    cursor = conn.cursor()
+    save_ai_recommendation(cursor, key, bars)
 
     conn.commit()
     cursor.close()
-    conn.close()
 
-    return jsonify([bar_dict])
+    return jsonify(bars)
 
 
 
@@ -172,46 +372,37 @@ def filter_bars():
     genres        = data.get('genres', [])            # e.g. ["Latin/Reggaeton","Disco/Funk"]
     vibes         = data.get('vibes', [])             # e.g. ["Upscale","Loungey"]
     neighborhoods = data.get('neighborhoods', [])     # e.g. ["SoHo","East Village"]
+    include_facets = data.get('include_facets', False)  # also return per-facet counts
 
-    # Build base query
-    query = "SELECT * FROM bars WHERE 1=1"
-    params = []
+    try:
+        columns, _ = requested_fields(request.args.get('fields'), BAR_CARD_COLUMNS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    conn = get_db()
+
+    # Matching ids (already in name order) and facet counts come from the
+    # in-memory bitmap index; only the matches are read from the table
+    bar_ids, counts = bar_facets.get(conn).query({
+        'price_signs': prices,
+        'neighborhood': neighborhoods,
+        'music_genres': genres,
+        'club_vibes': vibes
+    })
 
-    # Price filter (any one match)
-    if prices:
-        placeholders = ','.join(['%s'] * len(prices))
-        query += f" AND price_signs IN ({placeholders})"
-        params.extend(prices)
-
-    # Neighborhood filter (any one match)
-    if neighborhoods:
-        placeholders = ','.join(['%s'] * len(neighborhoods))
-        query += f" AND neighborhood IN ({placeholders})"
-        params.extend(neighborhoods)
-
-    # Music-genre filter (match any one)
-    if genres:
-        genre_conditions = " OR ".join("%s = ANY(music_genres)" for _ in genres)
-        query += f" AND ({genre_conditions})"
-        params.extend(genres)
-
-    # Vibes filter (match any one)
-    if vibes:
-        vibe_conditions = " OR ".join("%s = ANY(club_vibes)" for _ in vibes)
-        query += f" AND ({vibe_conditions})"
-        params.extend(vibes)
-
-    # Final ordering
-    query += " ORDER BY name"
-
-    # Execute and fetch
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    cursor.execute(query, params)
-    bars = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    bars = []
+    if bar_ids:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute(
+            f"SELECT {columns_sql(columns)} FROM bars WHERE id = ANY(%s)",
+            (bar_ids,)
+        )
+        bars_by_id = {bar['id']: bar for bar in cursor.fetchall()}
+        cursor.close()
+        bars = [bars_by_id[bar_id] for bar_id in bar_ids if bar_id in bars_by_id]
 
+    if include_facets:
+        return jsonify({'bars': bars, 'total': len(bars), 'facets': counts}), 200
     return jsonify(bars), 200
 
 # SUBMIT NEARBY FORM
@@ -229,7 +420,7 @@ def update_bar():
     if not bar_id or line_length is None:
         return jsonify({'error': 'bar_id and line_length are required'}), 400
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
 
     updates = []
@@ -261,7 +452,8 @@ def update_bar():
     conn.commit()
 
     cursor.close()
-    conn.close()
+
+    response_cache.invalidate(f'bar:{bar_id}')
 
     return jsonify({'status': 'Bar information updated successfully!'}), 200
 
@@ -278,14 +470,13 @@ def check_username():
     if not username:
         return jsonify({'status': 'Username is required'}), 400
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
 
     cursor.execute('SELECT * FROM users WHERE username = %s', (username,))
     existing_user = cursor.fetchone()
 
     cursor.close()
-    conn.close()
 
     if existing_user:
         return jsonify({'status': 'Username is already taken'}), 400
@@ -314,12 +505,11 @@ def save_spotify_token():
     if not token or not bar_id:
         return 'Missing token or bar_id', 400
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute('UPDATE bars SET spotify_token = %s WHERE id = %s', (token, bar_id))
     conn.commit()
     cursor.close()
-    conn.close()
 
     return 'Token saved successfully', 200
 
@@ -351,24 +541,25 @@ def spotify_callback():
     if not bar_id:
         return 'Bar ID not provided', 400
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute('UPDATE bars SET spotify_token = %s WHERE id = %s', (access_token, bar_id))
     conn.commit()
     cursor.close()
-    conn.close()
 
     return 'Spotify token saved successfully', 200
 
 
 @app.route('/api/bars/<int:bar_id>/playlists')
 def fetch_playlists(bar_id):
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
     cursor.execute('SELECT spotify_token FROM bars WHERE id = %s', (bar_id,))
     bar = cursor.fetchone()
     cursor.close()
-    conn.close()
+
+    # Don't hold a pooled connection while waiting on Spotify
+    release_db()
 
     if not bar or not bar['spotify_token']:
         return jsonify({'error': 'Spotify token not found'}), 400
@@ -383,7 +574,7 @@ def fetch_playlists(bar_id):
         return jsonify({'error': 'Failed to fetch playlists'}), 400
 
     playlists = response.json().get('items', [])
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
 
     # Clear existing songs for the bar
@@ -400,7 +591,6 @@ def fetch_playlists(bar_id):
 
     conn.commit()
     cursor.close()
-    conn.close()
     print(playlists)
     return jsonify(response.json().get('items', []))
 
@@ -416,7 +606,7 @@ def fetch_songs(bar_id, playlist_id):
     print(f"Fetching songs for playlist_id: {playlist_id} and bar_id: {bar_id}")
 
     # Connect to the database
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
 
     # Check if the playlist exists using spotify_id
@@ -427,7 +617,6 @@ def fetch_songs(bar_id, playlist_id):
     if not playlist:
         print(f"Playlist with ID {playlist_id} not found.")
         cursor.close()
-        conn.close()
         return jsonify({'error': 'Playlist not found'}), 404
 
     # Get the internal playlist id
@@ -442,7 +631,6 @@ def fetch_songs(bar_id, playlist_id):
     if not bar or not bar[0]:
         print("Spotify token not found for the bar.")
         cursor.close()
-        conn.close()
         return jsonify({'error': 'Spotify token not found'}), 400
 
     spotify_token = bar[0]
@@ -458,7 +646,6 @@ def fetch_songs(bar_id, playlist_id):
     if response.status_code != 200:
         print(f"Failed to fetch songs, status code: {response.status_code}")
         cursor.close()
-        conn.close()
         return jsonify({'error': 'Failed to fetch songs'}), 400
 
     tracks = response.json().get('items', [])
@@ -481,23 +668,29 @@ def fetch_songs(bar_id, playlist_id):
     # Clear existing songs for the bar's current playlist
     cursor.execute('DELETE FROM songs WHERE bar_id = %s', (bar_id,))
     
-    # Insert or update the songs in the database using the internal playlist id and bar_id
-    for song in songs:
-        cursor.execute('''
+    # Insert or update the songs in the database using the internal playlist id and bar_id.
+    # One statement for the whole playlist, so the search document trigger
+    # (migrations/015) rebuilds the bar's songs once
+    if songs:
+        execute_values(cursor, '''
             INSERT INTO songs (playlist_id, name, artist, album_art, spotify_url, bar_id) 
-            VALUES (%s, %s, %s, %s, %s, %s)
+            VALUES %s
             ON CONFLICT (id) DO UPDATE SET 
             name = EXCLUDED.name, 
             artist = EXCLUDED.artist, 
             album_art = EXCLUDED.album_art,
             spotify_url = EXCLUDED.spotify_url,
             bar_id = EXCLUDED.bar_id
-        ''', (internal_playlist_id, song['name'], song['artist'], song['albumArt'], song['spotify_url'], bar_id))
-        print(f"Inserted/Updated song: {song}")
+        ''', [
+            (internal_playlist_id, song['name'], song['artist'], song['albumArt'], song['spotify_url'], bar_id)
+            for song in songs
+        ], page_size=len(songs))
+        print(f"Inserted/Updated {len(songs)} songs")
 
     conn.commit()
     cursor.close()
-    conn.close()
+
+    response_cache.invalidate(f'songs:{bar_id}')
 
     return jsonify(songs)
 
@@ -512,8 +705,10 @@ def fetch_songs(bar_id, playlist_id):
 
 
 @app.route('/api/bars/<int:bar_id>/songs')
+@conditional('songs')
+@response_cache.cached(300, tags=('songs:{bar_id}',), catalogs=('songs',))
 def get_songs_for_bar(bar_id):
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute('''
         SELECT s.id, s.name, s.artist, s.album_art, s.spotify_url
@@ -522,7 +717,6 @@ def get_songs_for_bar(bar_id):
     ''', (bar_id,))
     songs = cursor.fetchall()
     cursor.close()
-    conn.close()
 
     song_list = [
         {
@@ -567,7 +761,7 @@ def create_user():
     if not name:
         return jsonify({"error": "Name is required"}), 400
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
 
     # Check if the user already exists
@@ -583,7 +777,6 @@ def create_user():
     )
     conn.commit()
     cursor.close()
-    conn.close()
 
     return jsonify({"status": "User created successfully!"}), 201
 
@@ -596,12 +789,11 @@ def check_user_birthday():
     data = request.json
     email = data['email']
     
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
     cursor.execute('SELECT birthday, gender, relationship_status FROM users WHERE email = %s', (email,))
     user = cursor.fetchone()
     cursor.close()
-    conn.close()
     
     if user and user['birthday'] and user['gender'] and user['relationship_status']:
         return jsonify({'has_info': True}), 200
@@ -627,7 +819,7 @@ def update_user():
     
     print(f"Received data for update: email={email}, birthday={birthday}, gender={gender}, relationship_status={relationship_status}, location={location}, latitude={latitude}, longitude={longitude}, username={username}")
     
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
 
     # Build the update query dynamically based on which fields are provided
@@ -667,7 +859,6 @@ def update_user():
     conn.commit()
     print("Commit successful")
     cursor.close()
-    conn.close()
     return jsonify({'status': 'User information updated successfully!'}), 200
 
 
@@ -681,7 +872,7 @@ def delete_user():
     data = request.json
     email = data['email']
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
 
     try:
@@ -698,11 +889,9 @@ def delete_user():
         cursor.execute('DELETE FROM user_feedback WHERE user_email = %s', (email,))
 
         # Get user_id from users table
-        cursor.execute('SELECT id FROM users WHERE email = %s', (email,))
-        user = cursor.fetchone()
-        if not user:
+        user_id = user_ids.get(conn, email)
+        if user_id is None:
             raise Exception("User not found")
-        user_id = user[0]
 
         # Delete from been_there
         cursor.execute('DELETE FROM been_there WHERE user_id = %s', (user_id,))
@@ -718,6 +907,7 @@ def delete_user():
 
         # Commit the transaction
         conn.commit()
+        user_ids.invalidate(email)
         return jsonify({"status": "User deleted successfully!"}), 200
 
     except Exception as e:
@@ -727,81 +917,179 @@ def delete_user():
 
     finally:
         cursor.close()
-        conn.close()
 
 
 
 
+def float_arg(name, default=None):
+    """Query parameter `name` as a finite float.
+
+    Raises ValueError naming the parameter when it's malformed, or missing
+    with no default.
+    """
+    try:
+        value = float(request.args.get(name, default))
+    except (TypeError, ValueError):
+        value = None
+    if value is None or not float('-inf') < value < float('inf'):
+        raise ValueError(f"Invalid {name}")
+    return value
+
+
+def attach_songs(cursor, bars, limit=MAX_SONGS_PER_BAR):
+    """Attach up to `limit` playlist songs to each bar dict in a single query."""
+    for bar in bars:
+        bar['songs'] = []
+    if not bars:
+        return bars
+
+    cursor.execute("""
+        SELECT bar_id, id, name, artist, album_art, spotify_url
+        FROM (
+            SELECT p.bar_id, s.id::text AS id, s.name, s.artist, s.album_art, s.spotify_url,
+                   row_number() OVER (PARTITION BY p.bar_id ORDER BY s.id) AS song_rank
+            FROM songs s
+            JOIN playlists p ON s.playlist_id = p.id
+            WHERE p.bar_id = ANY(%s)
+        ) ranked
+        WHERE %s <= 0 OR song_rank <= %s
+        ORDER BY bar_id, song_rank
+    """, ([bar['id'] for bar in bars], limit, limit))
+
+    bars_by_id = {bar['id']: bar for bar in bars}
+    for song in cursor.fetchall():
+        bar_id = song.pop('bar_id')
+        bars_by_id[bar_id]['songs'].append(song)
+
+    return bars
+
+
 @app.route('/api/bars', methods=['GET'])
 def get_bars():
-    page = int(request.args.get('page', 1))
     per_page = 30
     #per_page = int(request.args.get('per_page', 30))
     search = request.args.get('search', '')
     selected_price = request.args.get('selected_price', '')
-    selected_distance = float(request.args.get('selected_distance', 0))
-    latitude = float(request.args.get('latitude', 0))
-    longitude = float(request.args.get('longitude', 0))
     selected_genres = request.args.getlist('selected_genres[]')
 
-    offset = (page - 1) * per_page
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+    except ValueError:
+        return jsonify({'error': 'Invalid page'}), 400
+    try:
+        selected_distance = float_arg('selected_distance', 0)
+        latitude = float_arg('latitude', 0)
+        longitude = float_arg('longitude', 0)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-    # Haversine formula to calculate distance
-    haversine = """
-    3959 * acos(
-        cos(radians(%s)) * cos(radians(b.latitude)) *
-        cos(radians(b.longitude) - radians(%s)) +
-        sin(radians(%s)) * sin(radians(b.latitude))
-    )
-    """
+    try:
+        columns, extras = requested_fields(request.args.get('fields'), BAR_CARD_COLUMNS, ('distance', 'songs'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Keyset cursor from the previous page's X-Next-Cursor header; `page`
+    # still works (as an OFFSET) for older clients
+    after = None
+    if request.args.get('cursor'):
+        try:
+            after = decode_cursor(request.args['cursor'])
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        offset = 0
+    else:
+        offset = (page - 1) * per_page
+
+    conn = get_db()
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+
+    # Use the earthdistance GiST index when it's installed, otherwise fall
+    # back to the plain haversine expression
+    spatial = geo.has_earthdistance(conn)
+    distance, distance_params = geo.distance_sql(latitude, longitude, spatial)
+    sort_key, sort_key_params = geo.nearest_order_sql(latitude, longitude, spatial)
+
+    select = f"{columns_sql(columns, 'b')}, {sort_key} AS sort_key"
+    params = list(sort_key_params)
+    if 'distance' in extras:
+        select += f", {distance} AS distance"
+        params.extend(distance_params)
+    joins = ""
+
+    # Search matches come back ranked, best first, then nearest first
+    if search:
+        indexed = search_bars.has_search_document(conn)
+        joins, match, match_params, rank, rank_params = search_bars.bar_search_sql(search, indexed)
+        select += f", {rank} AS rank"
+        params.extend(rank_params)
 
     query = f"""
-    SELECT b.*, {haversine} AS distance
+    SELECT {select}
     FROM bars b
-    LEFT JOIN playlists p ON b.id = p.bar_id
-    LEFT JOIN songs s ON p.id = s.playlist_id
-    WHERE (b.name ILIKE %s OR b.description ILIKE %s OR b.address ILIKE %s
-           OR s.name ILIKE %s OR s.artist ILIKE %s)
-    AND (%s = '' OR b.price_signs = %s)
-    AND (%s = 0 OR {haversine} < %s)
+    {joins}
+    WHERE (%s = '' OR b.price_signs = %s)
     """
 
-    params = [
-        latitude, longitude, latitude,
-        f"%{search}%", f"%{search}%", f"%{search}%", f"%{search}%", f"%{search}%",
-        selected_price, selected_price,
-        selected_distance, latitude, longitude, latitude, selected_distance
-    ]
+    params.extend([selected_price, selected_price])
+
+    if search:
+        query += f" AND {match}"
+        params.extend(match_params)
+
+    if selected_distance:
+        within, within_params = geo.within_sql(latitude, longitude, selected_distance, spatial)
+        query += f" AND {within}"
+        params.extend(within_params)
 
     if selected_genres:
-        genre_conditions = " OR ".join("b.venue_types ILIKE %s" for _ in selected_genres)
-        query += f" AND ({genre_conditions})"
-        params.extend(f"%{genre}%" for genre in selected_genres)
+        genres, genre_params = tags.genre_filter_sql(selected_genres, tags.has_venue_tags(conn))
+        query += f" AND {genres}"
+        params.extend(genre_params)
+
+    # Resume strictly after the last row of the previous page. Bars with no
+    # coordinates sort last, so a NULL key compares as +infinity.
+    if after is not None:
+        try:
+            after_key = float('inf') if after.get('k') is None else float(after['k'])
+            after_id = int(after['id'])
+            after_rank = float(after['r']) if search else None
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+        keyset = f"(coalesce({sort_key}, 'Infinity'), b.id) > (%s, %s)"
+        keyset_params = sort_key_params + [after_key, after_id]
+        if search:
+            query += f" AND ({rank} < %s OR ({rank} = %s AND {keyset}))"
+            params.extend(rank_params + [after_rank] + rank_params + [after_rank] + keyset_params)
+        else:
+            query += f" AND {keyset}"
+            params.extend(keyset_params)
 
-    query += f" ORDER BY distance LIMIT %s OFFSET %s"
+    order = "sort_key, b.id"
+    if search:
+        order = f"rank DESC, {order}"
+    query += f" ORDER BY {order} LIMIT %s OFFSET %s"
     params.extend([per_page, offset])
 
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
     cursor.execute(query, params)
     bars = cursor.fetchall()
 
-    # Fetch songs for each bar
-    for bar in bars:
-        bar_id = bar['id']
-        cursor.execute("""
-            SELECT s.id::text, s.name, s.artist, s.album_art, s.spotify_url
-            FROM songs s
-            JOIN playlists p ON s.playlist_id = p.id
-            WHERE p.bar_id = %s
-        """, (bar_id,))
-        songs = cursor.fetchall()
-        bar['songs'] = songs
+    if 'songs' in extras:
+        attach_songs(cursor, bars)
 
     cursor.close()
-    conn.close()
 
-    return jsonify(bars)
+    # Paging keys only feed the cursor; they aren't part of the card projection
+    sort_keys = [bar.pop('sort_key') for bar in bars]
+    ranks = [bar.pop('rank', None) for bar in bars]
+
+    response = jsonify(bars)
+    if len(bars) == per_page:
+        last = {'k': sort_keys[-1], 'id': bars[-1]['id']}
+        if search:
+            last['r'] = ranks[-1]
+        response.headers['X-Next-Cursor'] = encode_cursor(last)
+    return response
 
 
 
@@ -810,43 +1098,18 @@ def get_bars():
 
 @app.route('/api/nearby_bars', methods=['GET'])
 def get_nearby_bars():
-    latitude = float(request.args.get('latitude'))
-    longitude = float(request.args.get('longitude'))
+    try:
+        latitude = float_arg('latitude')
+        longitude = float_arg('longitude')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     distance_limit = 15  # meters
 
-    def haversine(lat1, lon1, lat2, lon2):
-        R = 6371e3  # Earth radius in meters
-        phi1 = math.radians(lat1)
-        phi2 = math.radians(lat2)
-        delta_phi = math.radians(lat2 - lat1)
-        delta_lambda = math.radians(lon2 - lon1)
-        a = math.sin(delta_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2) ** 2
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-        return R * c
-
-    query = """
-    SELECT id, name, address, latitude, longitude
-    FROM bars
-    """
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    cursor.execute(query)
-    bars = cursor.fetchall()
-
-    nearby_bars = []
-    for bar in bars:
-        if bar['latitude'] is None or bar['longitude'] is None:
-            continue
-        distance = haversine(latitude, longitude, bar['latitude'], bar['longitude'])
-        if distance < distance_limit:
-            bar['distance'] = distance
-            nearby_bars.append(bar)
-
-    # Sort by distance
-    nearby_bars.sort(key=lambda x: x['distance'])
-
-    cursor.close()
-    conn.close()
+    index = bar_locations.get(get_db())
+    nearby_bars = [
+        dict(bar, distance=distance)
+        for bar, distance in index.within(latitude, longitude, distance_limit)
+    ]
 
     print(nearby_bars)
 
@@ -858,19 +1121,25 @@ def get_nearby_bars():
 
 
 @app.route('/api/bars/<int:id>', methods=['GET'])
+@conditional('bars', 'events')
+@response_cache.cached(60, tags=('bar:{id}',), catalogs=('bars', 'events'))
 def get_bar(id):
-    conn = get_db_connection()
+    conn = get_db()
+    try:
+        columns, extras = requested_fields(request.args.get('fields'), bar_detail_columns(conn), ('events',))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     cursor = conn.cursor(cursor_factory=RealDictCursor)
-    cursor.execute('SELECT * FROM bars WHERE id = %s', (id,))
+    cursor.execute(f'SELECT {columns_sql(columns)} FROM bars WHERE id = %s', (id,))
     bar = cursor.fetchone()
     
-    if bar:
+    if bar and 'events' in extras:
         cursor.execute('SELECT * FROM events WHERE bar_id = %s', (id,))
         events = cursor.fetchall()
         bar['events'] = events
 
     cursor.close()
-    conn.close()
 
     if bar:
         return jsonify(bar)
@@ -879,35 +1148,113 @@ def get_bar(id):
 
 
 @app.route('/api/events', methods=['GET'])
+@conditional('events', cache_control='public, max-age=60', bucket=60)
+@response_cache.cached(60, tags=('events',), catalogs=('events',), bucket=60)
 def get_events():
-    conn = get_db_connection()
+    window = request.args.get('window', 'upcoming')  # upcoming, tonight, weekend or all
+    try:
+        limit = max(1, min(int(request.args.get('limit', EVENTS_PAGE_SIZE)), EVENTS_MAX_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'Invalid limit'}), 400
+    try:
+        selected_distance = float_arg('distance', 0)  # miles from (latitude, longitude)
+        latitude = float_arg('latitude', 0)
+        longitude = float_arg('longitude', 0)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        start, end = event_windows.window_bounds(window)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    conn = get_db()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
-    cursor.execute('SELECT * FROM events')
+
+    # Without a start_time column there's nothing to window or page on, so
+    # keep returning every event
+    if not event_windows.has_start_time(conn):
+        cursor.execute('SELECT * FROM events')
+        events = cursor.fetchall()
+        cursor.close()
+        return jsonify(events)
+
+    # Naive start_time values are bar-local times
+    cursor.execute('SET LOCAL TIME ZONE %s', (event_windows.EVENTS_TIMEZONE,))
+
+    query = "SELECT e.* FROM events e"
+    conditions = []
+    params = []
+
+    if selected_distance:
+        spatial = geo.has_earthdistance(conn)
+        within, within_params = geo.within_sql(latitude, longitude, selected_distance, spatial)
+        query += " JOIN bars b ON b.id = e.bar_id"
+        conditions.append(within)
+        params.extend(within_params)
+
+    if start is not None:
+        conditions.append("e.start_time >= %s")
+        params.append(start)
+    if end is not None:
+        conditions.append("e.start_time < %s")
+        params.append(end)
+
+    # Keyset cursor from the previous page's X-Next-Cursor header. Events
+    # without a start time sort last.
+    if request.args.get('cursor'):
+        try:
+            after = decode_cursor(request.args['cursor'])
+            after_id = int(after['id'])
+            after_start = datetime.fromisoformat(after['k']) if after.get('k') is not None else None
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+        if after_start is None:
+            conditions.append("(e.start_time IS NULL AND e.id > %s)")
+            params.append(after_id)
+        else:
+            conditions.append("(e.start_time > %s OR (e.start_time = %s AND e.id > %s) OR e.start_time IS NULL)")
+            params.extend([after_start, after_start, after_id])
+
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY e.start_time NULLS LAST, e.id LIMIT %s"
+    params.append(limit)
+
+    cursor.execute(query, params)
     events = cursor.fetchall()
     cursor.close()
-    conn.close()
-    return jsonify(events)
+
+    response = jsonify(events)
+    if len(events) == limit:
+        last = events[-1]
+        last_start = last['start_time'].isoformat() if last['start_time'] is not None else None
+        response.headers['X-Next-Cursor'] = encode_cursor({'k': last_start, 'id': last['id']})
+    return response
 
 @app.route('/api/events/<int:id>', methods=['GET'])
+@conditional('events', cache_control='public, max-age=60')
+@response_cache.cached(300, tags=('events',), catalogs=('events',))
 def get_event(id):
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
     cursor.execute('SELECT * FROM events WHERE id = %s', (id,))
     event = cursor.fetchone()
     cursor.close()
-    conn.close()
     if event:
         return jsonify(event)
     return jsonify({"error": "Event not found"}), 404
 
 @app.route('/api/bars/<int:id>/events', methods=['GET'])
+@conditional('events', cache_control='public, max-age=60')
+@response_cache.cached(300, tags=('events',), catalogs=('events',))
 def get_bar_events(id):
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
     cursor.execute('SELECT * FROM events WHERE bar_id = %s', (id,))
     events = cursor.fetchall()
     cursor.close()
-    conn.close()
     return jsonify(events)
 
 
@@ -922,7 +1269,7 @@ def create_song_request():
     artist_name = data['artist_name']
     album_cover_url = data.get('album_cover_url', '')
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
 
     # Check if the song has already been requested by this user at this bar/event
@@ -934,107 +1281,201 @@ def create_song_request():
 
     if existing_request:
         cursor.close()
-        conn.close()
         return jsonify({"status": "Song has already been requested"}), 400
 
     cursor.execute(
-        'INSERT INTO song_requests (user_email, bar_id, event_id, song_name, artist_name, album_cover_url) VALUES (%s, %s, %s, %s, %s, %s)',
+        'INSERT INTO song_requests (user_email, bar_id, event_id, song_name, artist_name, album_cover_url) VALUES (%s, %s, %s, %s, %s, %s) RETURNING *',
         (user_email, bar_id, event_id, song_name, artist_name, album_cover_url)
     )
+    columns = [col[0] for col in cursor.description]
+    song_request = dict(zip(columns, cursor.fetchone()))
     conn.commit()
     cursor.close()
-    conn.close()
+
+    response_cache.invalidate(f'song_requests:{bar_id}')
+    song_queue.changed(conn, 'insert', song_request)
 
     return jsonify({"status": "Song request created successfully!"}), 201
 
 
 
 
+def load_song_requests(cursor, bar_id, event_id, order='recent', limit=None, after=None):
+    """Song requests for a bar (and event), newest first or ranked by a leaderboard order.
+
+    Ranked reads return `limit` rows, resuming after the (rank, id) keyset `after`.
+    """
+    if event_id:
+        # Requests for the specific event, plus today's ones not tied to an event
+        where = "sr.bar_id = %s AND (sr.event_id = %s OR (sr.event_id IS NULL AND sr.request_time::date = %s))"
+        params = [bar_id, event_id, date.today()]
+    else:
+        # Requests for the bar (not tied to an event)
+        where = "sr.bar_id = %s AND sr.event_id IS NULL"
+        params = [bar_id]
+
+    if order == 'recent':
+        cursor.execute(f'SELECT sr.* FROM song_requests sr WHERE {where} ORDER BY sr.request_time DESC', params)
+        return cursor.fetchall()
+
+    rank = leaderboard.rank_sql(order, leaderboard.has_score_columns(cursor.connection))
+    if after is not None:
+        where += f" AND ({rank}, sr.id) < (%s, %s)"
+        params.extend(after)
+    cursor.execute(
+        f'SELECT sr.*, {rank} AS rank FROM song_requests sr WHERE {where} ORDER BY rank DESC, sr.id DESC LIMIT %s',
+        params + [limit]
+    )
+    return cursor.fetchall()
+
+
 @app.route('/api/song_requests/<int:bar_id>', methods=['GET'])
+@response_cache.cached(5, tags=('song_requests:{bar_id}',))
 def get_song_requests(bar_id):
     event_id = request.args.get('event_id', None)
-    today = date.today()
-
-    conn = get_db_connection()
+    order = request.args.get('order', 'recent')  # recent (everything), or a top/hot page
+    try:
+        limit = max(1, min(int(request.args.get('limit', QUEUE_PAGE_SIZE)), QUEUE_MAX_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'Invalid limit'}), 400
+
+    if order not in leaderboard.ORDERS:
+        return jsonify({'error': f'Unknown order: {order}'}), 400
+
+    # Keyset cursor from the previous ranked page's X-Next-Cursor header
+    after = None
+    if order != 'recent' and request.args.get('cursor'):
+        try:
+            cursor_values = decode_cursor(request.args['cursor'])
+            rank_type = int if order == 'top' else float  # keep 'top' comparable with the integer index
+            after = (rank_type(cursor_values['k']), int(cursor_values['id']))
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+    conn = get_db()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
+    song_requests = load_song_requests(cursor, bar_id, event_id, order, limit, after)
+    cursor.close()
 
-    if event_id:
-        # Get song requests for the specific event
-        cursor.execute('SELECT * FROM song_requests WHERE bar_id = %s AND (event_id = %s OR (event_id IS NULL AND request_time::date = %s)) ORDER BY request_time DESC', (bar_id, event_id, today))
-    else:
-        # Get song requests for the bar (not tied to an event)
-        cursor.execute('SELECT * FROM song_requests WHERE bar_id = %s AND event_id IS NULL ORDER BY request_time DESC', (bar_id,))
+    response = jsonify(song_requests)
+    if order != 'recent' and len(song_requests) == limit:
+        last = song_requests[-1]
+        rank = last['rank'] if order == 'top' else float(last['rank'])
+        response.headers['X-Next-Cursor'] = encode_cursor({'k': rank, 'id': last['id']})
+    return response
 
-    song_requests = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return jsonify(song_requests)
 
-@app.route('/api/song_requests/<int:request_id>/upvote', methods=['POST'])
-def upvote_song_request(request_id):
-    data = request.json
-    user_email = data['user_email']
+@app.route('/api/song_requests/<int:bar_id>/live', methods=['GET'])
+def stream_song_requests(bar_id):
+    """Server-Sent Events: a 'snapshot' of the queue, then a 'delta' per change.
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    Deltas are {"op": "insert" | "update" | "delete", "request": row}; updates
+    may carry only id, bar_id and the tallies. Reconnecting clients send
+    Last-Event-ID and get just the deltas they missed when the worker still
+    has them.
+    """
+    event_id = request.args.get('event_id', None)
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+
+    song_queue.start(get_db())
+    # Don't hold a pooled connection for the life of the stream
+    release_db()
+
+    def load_snapshot():
+        with db.pool.connection() as conn:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            song_requests = load_song_requests(cursor, bar_id, event_id)
+            cursor.close()
+        return song_requests
+
+    stream = song_queue.stream(bar_id, event_id, last_event_id, load_snapshot)
+    return Response(stream, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # don't let nginx buffer the stream
+    })
 
-    # Check if the user has already voted on this request
-    cursor.execute('SELECT * FROM votes WHERE user_email = %s AND request_id = %s', (user_email, request_id))
-    existing_vote = cursor.fetchone()
 
-    if existing_vote:
-        cursor.close()
-        conn.close()
-        return jsonify({"status": "User has already voted on this request"}), 400
+# One round trip per vote: an existing vote makes the insert a no-op, and
+# the tally only moves when the insert went through. Reads back the new
+# tallies, or the current ones if nothing changed. The NOT EXISTS check is
+# all there is before migrations/007; after it, the unique (user_email,
+# request_id) index also stops two concurrent taps (ON CONFLICT, added by
+# vote_sql()).
+VOTE_SQL = """
+    WITH target AS (
+        SELECT id FROM song_requests
+        WHERE id = %(request_id)s AND user_email IS DISTINCT FROM %(user_email)s
+    ), vote AS (
+        INSERT INTO votes (user_email, request_id, vote_type)
+        SELECT %(user_email)s, id, %(vote_type)s FROM target
+        WHERE NOT EXISTS (
+            SELECT 1 FROM votes WHERE user_email = %(user_email)s AND request_id = %(request_id)s
+        )
+        {on_conflict}
+        RETURNING request_id
+    ), tally AS (
+        UPDATE song_requests sr
+        SET upvotes = coalesce(sr.upvotes, 0) + (%(vote_type)s = 'upvote')::int,
+            downvotes = coalesce(sr.downvotes, 0) + (%(vote_type)s = 'downvote')::int
+        FROM vote
+        WHERE sr.id = vote.request_id
+        RETURNING sr.id, sr.upvotes, sr.downvotes
+    )
+    SELECT sr.bar_id, sr.event_id, sr.request_time,
+           sr.user_email = %(user_email)s AS own_request,
+           tally.id IS NOT NULL AS voted,
+           coalesce(tally.upvotes, sr.upvotes, 0) AS upvotes,
+           coalesce(tally.downvotes, sr.downvotes, 0) AS downvotes
+    FROM song_requests sr
+    LEFT JOIN tally ON tally.id = sr.id
+    WHERE sr.id = %(request_id)s
+"""
 
-    # Check if the user is the one who requested the song
-    cursor.execute('SELECT user_email FROM song_requests WHERE id = %s', (request_id,))
-    request = cursor.fetchone()
 
-    if request and request['user_email'] == user_email:
-        cursor.close()
-        conn.close()
-        return jsonify({"status": "User cannot vote on their own request"}), 400
+def vote_sql(conn):
+    """VOTE_SQL, with ON CONFLICT once migrations/007 has made votes unique."""
+    unique = db.has_feature(conn, 'votes_unique', "SELECT to_regclass('votes_user_email_request_id_key') IS NOT NULL")
+    return VOTE_SQL.format(on_conflict="ON CONFLICT (user_email, request_id) DO NOTHING" if unique else "")
 
-    cursor.execute('UPDATE song_requests SET upvotes = upvotes + 1 WHERE id = %s', (request_id,))
-    cursor.execute('INSERT INTO votes (user_email, request_id, vote_type) VALUES (%s, %s, %s)', (user_email, request_id, 'upvote'))
-    conn.commit()
-    cursor.close()
-    conn.close()
-    return jsonify({"status": "Upvoted successfully!"})
 
-@app.route('/api/song_requests/<int:request_id>/downvote', methods=['POST'])
-def downvote_song_request(request_id):
+def cast_vote(request_id, vote_type, success_status):
     data = request.json
     user_email = data['user_email']
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Check if the user has already voted on this request
-    cursor.execute('SELECT * FROM votes WHERE user_email = %s AND request_id = %s', (user_email, request_id))
-    existing_vote = cursor.fetchone()
+    conn = get_db()
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    cursor.execute(vote_sql(conn), {'request_id': request_id, 'user_email': user_email, 'vote_type': vote_type})
+    result = cursor.fetchone()
+    conn.commit()
+    cursor.close()
 
-    if existing_vote:
-        cursor.close()
-        conn.close()
-        return jsonify({"status": "User has already voted on this request"}), 400
+    if not result:
+        return jsonify({"status": "Song request not found"}), 404
+
+    tallies = {'upvotes': result['upvotes'], 'downvotes': result['downvotes']}
+    if result['own_request']:
+        return jsonify({"status": "User cannot vote on their own request", **tallies}), 400
+    if not result['voted']:
+        return jsonify({"status": "User has already voted on this request", **tallies}), 400
+
+    response_cache.invalidate(f"song_requests:{result['bar_id']}")
+    song_queue.changed(conn, 'update', {
+        'id': request_id,
+        'bar_id': result['bar_id'],
+        'event_id': result['event_id'],
+        'request_time': result['request_time'],
+        **tallies
+    })
+    return jsonify({"status": success_status, **tallies})
 
-    # Check if the user is the one who requested the song
-    cursor.execute('SELECT user_email FROM song_requests WHERE id = %s', (request_id,))
-    request = cursor.fetchone()
 
-    if request and request['user_email'] == user_email:
-        cursor.close()
-        conn.close()
-        return jsonify({"status": "User cannot vote on their own request"}), 400
+@app.route('/api/song_requests/<int:request_id>/upvote', methods=['POST'])
+def upvote_song_request(request_id):
+    return cast_vote(request_id, 'upvote', "Upvoted successfully!")
 
-    cursor.execute('UPDATE song_requests SET downvotes = downvotes + 1 WHERE id = %s', (request_id,))
-    cursor.execute('INSERT INTO votes (user_email, request_id, vote_type) VALUES (%s, %s, %s)', (user_email, request_id, 'downvote'))
-    conn.commit()
-    cursor.close()
-    conn.close()
-    return jsonify({"status": "Downvoted successfully!"})
+@app.route('/api/song_requests/<int:request_id>/downvote', methods=['POST'])
+def downvote_song_request(request_id):
+    return cast_vote(request_id, 'downvote', "Downvoted successfully!")
 
 
 
@@ -1057,18 +1498,14 @@ def add_to_list():
     if not email or not bar_id or not list_type:
         return jsonify({'status': 'Email, Bar ID, and List Type are required'}), 400
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
 
     # Get user ID from email
-    cursor.execute('SELECT id FROM users WHERE email = %s', (email,))
-    user = cursor.fetchone()
-
-    if not user:
+    user_id = user_ids.get(conn, email)
+    if user_id is None:
         return jsonify({'status': 'User not found'}), 404
 
-    user_id = user['id']
-
     # Check if the bar already exists in the list
     if list_type == 'been_there':
         cursor.execute(
@@ -1096,9 +1533,11 @@ def add_to_list():
     # Insert into the appropriate list table
     if list_type == 'been_there':
         cursor.execute(
-            'INSERT INTO been_there (user_id, bar_id, rating, comments) VALUES (%s, %s, %s, %s)',
+            'INSERT INTO been_there (user_id, bar_id, rating, comments) VALUES (%s, %s, %s, %s) RETURNING id',
             (user_id, bar_id, rating, comments)
         )
+        if feed.has_feed(conn):
+            feed.fan_out(cursor, user_id, cursor.fetchone()['id'])
     elif list_type == 'liked':
         cursor.execute(
             'INSERT INTO liked (user_id, bar_id) VALUES (%s, %s)',
@@ -1112,7 +1551,6 @@ def add_to_list():
 
     conn.commit()
     cursor.close()
-    conn.close()
 
     return jsonify({'status': f'Added to {list_type} list successfully!'}), 200
 
@@ -1122,7 +1560,7 @@ def add_to_list():
 @app.route('/get_been_there', methods=['GET'])
 def get_been_there():
     email = request.args.get('email')
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
     
     cursor.execute('''
@@ -1136,7 +1574,6 @@ def get_been_there():
     
     bars = cursor.fetchall()
     cursor.close()
-    conn.close()
     
     return jsonify(bars)
 
@@ -1145,7 +1582,7 @@ def get_been_there():
 @app.route('/get_liked', methods=['GET'])
 def get_liked():
     email = request.args.get('email')
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
     
     cursor.execute('''
@@ -1158,7 +1595,6 @@ def get_liked():
     
     bars = cursor.fetchall()
     cursor.close()
-    conn.close()
     
     return jsonify(bars)
 
@@ -1166,7 +1602,7 @@ def get_liked():
 @app.route('/get_want_to_go', methods=['GET'])
 def get_want_to_go():
     email = request.args.get('email')
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
     
     cursor.execute('''
@@ -1179,7 +1615,6 @@ def get_want_to_go():
     
     bars = cursor.fetchall()
     cursor.close()
-    conn.close()
     
     return jsonify(bars)
 
@@ -1195,14 +1630,12 @@ def remove_from_list():
     if not email or not bar_id or not list_type:
         return jsonify({'status': 'Missing required fields'}), 400
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
 
     # Get user_id from email
-    cursor.execute('SELECT id FROM users WHERE email = %s', (email,))
-    user_id = cursor.fetchone()
-
-    if not user_id:
+    user_id = user_ids.get(conn, email)
+    if user_id is None:
         return jsonify({'status': 'User not found'}), 404
 
 
@@ -1217,7 +1650,6 @@ def remove_from_list():
 
     conn.commit()
     cursor.close()
-    conn.close()
     return jsonify({'status': 'Bar removed from list successfully!'}), 200
 
 
@@ -1227,12 +1659,16 @@ def remove_from_list():
 @app.route('/api/owned_bars', methods=['GET'])
 def get_owned_bars():
     email = request.args.get('email')
-    conn = get_db_connection()
+    conn = get_db()
+    try:
+        columns, _ = requested_fields(request.args.get('fields'), bar_detail_columns(conn))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     cursor = conn.cursor(cursor_factory=RealDictCursor)
-    cursor.execute('SELECT * FROM bars WHERE owner_email = %s', (email,))
+    cursor.execute(f'SELECT {columns_sql(columns)} FROM bars WHERE owner_email = %s', (email,))
     bars = cursor.fetchall()
     cursor.close()
-    conn.close()
     return jsonify(bars)
 
 
@@ -1243,20 +1679,22 @@ def validate_passcode():
     passcode = data['passcode']
     user_email = data['user_email']  # Get the user email from the request data
     
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
-    cursor.execute('SELECT * FROM bars WHERE id = %s AND passcode = %s', (bar_id, passcode))
+    cursor.execute(
+        f'SELECT {columns_sql(bar_detail_columns(conn))} FROM bars WHERE id = %s AND passcode = %s',
+        (bar_id, passcode)
+    )
     bar = cursor.fetchone()
     
     if bar:
         cursor.execute('UPDATE bars SET owner_email = %s WHERE id = %s', (user_email, bar_id))
         conn.commit()
         cursor.close()
-        conn.close()
+        response_cache.invalidate(f'bar:{bar_id}')
         return jsonify({'status': 'Passcode is valid', 'bar': bar}), 200
     else:
         cursor.close()
-        conn.close()
         return jsonify({'status': 'Passcode is invalid'}), 400
 
 
@@ -1303,12 +1741,16 @@ def update_bar_detail(bar_id):
     query = f"UPDATE bars SET {', '.join(updates)} WHERE id = %s"
     params.append(bar_id)
     
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute(query, tuple(params))
     conn.commit()
     cursor.close()
-    conn.close()
+
+    bar_facets.invalidate()
+    bar_locations.invalidate()
+    bar_names.invalidate()
+    response_cache.invalidate(f'bar:{bar_id}')
     
     return jsonify({"status": "Bar details updated successfully"})
 
@@ -1322,12 +1764,13 @@ def update_enable_requests(bar_id):
     if enable_requests is None:
         return jsonify({'error': 'enable_requests field is required'}), 400
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute('UPDATE bars SET enable_requests = %s WHERE id = %s', (enable_requests, bar_id))
     conn.commit()
     cursor.close()
-    conn.close()
+
+    response_cache.invalidate(f'bar:{bar_id}')
 
     return jsonify({'status': 'enable_requests updated successfully'})
 
@@ -1354,7 +1797,7 @@ def submit_feedback():
     neutral = 1 if feedback == 'neutral' else 0
     no = 1 if feedback == 'no' else 0
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
 
     cursor.execute('''
@@ -1371,18 +1814,16 @@ def submit_feedback():
 
     conn.commit()
     cursor.close()
-    conn.close()
 
     return jsonify({'status': 'Feedback submitted successfully'}), 200
 
 @app.route('/api/feedback/<email>', methods=['GET'])
 def get_feedback(email):
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
     cursor.execute('SELECT * FROM user_feedback WHERE user_email = %s', (email,))
     feedback = cursor.fetchone()
     cursor.close()
-    conn.close()
 
     if feedback:
         return jsonify(feedback)
@@ -1395,6 +1836,8 @@ def get_feedback(email):
 # ADD FRIENDS
 
 @app.route('/api/users', methods=['GET'])
+@conditional(cache_control='private, max-age=30')
+@response_cache.cached(30, catalogs=('user_ids', 'blocks'))
 def get_users():
     search = request.args.get('search', '').strip()
     identifier = request.args.get('identifier').strip()
@@ -1406,33 +1849,22 @@ def get_users():
     if not search:
         return jsonify([])
 
-    conn = get_db_connection()
+    try:
+        limit = max(1, min(int(request.args.get('limit', user_search.USER_SEARCH_LIMIT)), user_search.USER_SEARCH_MAX_LIMIT))
+    except ValueError:
+        return jsonify({'status': 'Invalid limit'}), 400
+
+    conn = get_db()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
 
     # Get the user ID of the current user
-    cursor.execute("SELECT id FROM users WHERE email = %s", (identifier,))
-    result = cursor.fetchone()
-    if not result:
+    user_id = user_ids.get(conn, identifier)
+    if user_id is None:
         return jsonify({'status': 'User not found'}), 404
-    user_id = result['id']
-
-    # Modify the query to exclude the current user and users who have blocked the current user
-    query = """
-    SELECT id, email, name, username FROM users
-    WHERE (name ILIKE %s OR username ILIKE %s)
-    AND id != %s  -- Exclude the current user
-    AND id NOT IN (
-        SELECT blocker_id FROM blocks WHERE blocked_id = %s
-    )
-    ORDER BY name ASC
-    """
-    
-    params = [f"%{search}%", f"%{search}%", user_id, user_id]
-    
-    cursor.execute(query, params)
-    users = cursor.fetchall()
+
+    # Ranked typeahead matches, excluding the current user and users who have blocked them
+    users = user_search.search_users(conn, cursor, user_id, search, limit)
     cursor.close()
-    conn.close()
     
     return jsonify(users)
 
@@ -1445,19 +1877,15 @@ def get_followers():
     if not identifier:
         return jsonify({'status': 'Identifier is required'}), 400
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
 
     # Get user_id of the requesting user
-    cursor.execute("SELECT id FROM users WHERE email = %s", (identifier,))
-    result = cursor.fetchone()
-    if not result:
+    user_id = user_ids.get(conn, identifier)
+    if user_id is None:
         cursor.close()
-        conn.close()
         return jsonify({'status': 'User not found'}), 404
 
-    user_id = result['id']
-
     # Fetch followers and their details
     cursor.execute("""
         SELECT u.id, u.email, u.name, u.username
@@ -1470,7 +1898,6 @@ def get_followers():
     followers = cursor.fetchall()
 
     cursor.close()
-    conn.close()
 
     return jsonify(followers)
 
@@ -1482,19 +1909,15 @@ def get_following_users():
     if not identifier:
         return jsonify({'status': 'Identifier is required'}), 400
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
 
     # Get user_id of the requesting user
-    cursor.execute("SELECT id FROM users WHERE email = %s", (identifier,))
-    result = cursor.fetchone()
-    if not result:
+    user_id = user_ids.get(conn, identifier)
+    if user_id is None:
         cursor.close()
-        conn.close()
         return jsonify({'status': 'User not found'}), 404
 
-    user_id = result['id']
-
     # Fetch users the current user is following
     cursor.execute("""
         SELECT u.id, u.email, u.name, u.username
@@ -1507,7 +1930,6 @@ def get_following_users():
     following_users = cursor.fetchall()
 
     cursor.close()
-    conn.close()
 
     return jsonify(following_users)
 
@@ -1520,19 +1942,15 @@ def get_notifications():
     if not identifier:
         return jsonify({'status': 'Identifier is required'}), 400
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
 
     # Get user_id of the requesting user
-    cursor.execute("SELECT id FROM users WHERE email = %s", (identifier,))
-    result = cursor.fetchone()
-    if not result:
+    user_id = user_ids.get(conn, identifier)
+    if user_id is None:
         cursor.close()
-        conn.close()
         return jsonify({'status': 'User not found'}), 404
 
-    user_id = result['id']
-
     # Fetch recent followers and their details
     cursor.execute("""
         SELECT u.id, u.email, u.name, u.username
@@ -1545,7 +1963,6 @@ def get_notifications():
     notifications = cursor.fetchall()
 
     cursor.close()
-    conn.close()
 
     return jsonify(notifications)
 
@@ -1558,24 +1975,24 @@ def follow_user():
     user_identifier = data.get('identifier')  # The identifier of the user who is performing the follow action
     followed_id = data.get('followed_id')  # The ID of the user being followed
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
 
     # Get the user ID of the follower using the identifier (email)
-    cursor.execute("SELECT id FROM users WHERE email = %s", (user_identifier,))
-    follower_id = cursor.fetchone()
-
+    follower_id = user_ids.get(conn, user_identifier)
     if follower_id is None:
         return jsonify({'error': 'Follower not found'}), 404
 
-    # Insert the follow relationship into the follows table
+    # Insert the follow relationship into the follows table; a repeated
+    # follow is a no-op so the follower counts stay right
     cursor.execute(
-        "INSERT INTO follows (follower_id, followed_id) VALUES (%s, %s)",
+        "INSERT INTO follows (follower_id, followed_id) VALUES (%s, %s) ON CONFLICT DO NOTHING",
         (follower_id, followed_id)
     )
+    if cursor.rowcount and feed.has_feed(conn):
+        feed.backfill(cursor, follower_id, followed_id)
     conn.commit()
     cursor.close()
-    conn.close()
 
     return jsonify({'message': 'Followed successfully'}), 201
 
@@ -1588,13 +2005,11 @@ def unfollow_user():
     user_identifier = data.get('identifier')  # The identifier of the user who is performing the unfollow action
     followed_id = data.get('followed_id')  # The ID of the user being unfollowed
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
 
     # Get the user ID of the follower using the identifier (email)
-    cursor.execute("SELECT id FROM users WHERE email = %s", (user_identifier,))
-    follower_id = cursor.fetchone()
-
+    follower_id = user_ids.get(conn, user_identifier)
     if follower_id is None:
         return jsonify({'error': 'Follower not found'}), 404
 
@@ -1603,9 +2018,10 @@ def unfollow_user():
         "DELETE FROM follows WHERE follower_id = %s AND followed_id = %s",
         (follower_id, followed_id)
     )
+    if cursor.rowcount and feed.has_feed(conn):
+        feed.catch_up(cursor, followed_id)
     conn.commit()
     cursor.close()
-    conn.close()
 
     return jsonify({'message': 'Unfollowed successfully'}), 200
 
@@ -1615,26 +2031,20 @@ def unfollow_user():
 def get_following():
     user_identifier = request.args.get('identifier')
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
 
     # Get the user ID of the follower using the identifier (email)
-    cursor.execute("SELECT id FROM users WHERE email = %s", (user_identifier,))
-    follower_data = cursor.fetchone()
-
-    if follower_data is None:
+    follower_id = user_ids.get(conn, user_identifier)
+    if follower_id is None:
         cursor.close()
-        conn.close()
         return jsonify([])
 
-    follower_id = follower_data['id']  # Extract the 'id' from the dictionary
-
     # Get the list of followed user IDs
     cursor.execute("SELECT followed_id FROM follows WHERE follower_id = %s", (follower_id,))
     followed_ids = cursor.fetchall()
 
     cursor.close()
-    conn.close()
 
     return jsonify([follow['followed_id'] for follow in followed_ids])
 
@@ -1643,142 +2053,96 @@ def get_following():
 
 @app.route('/api/following_been_there', methods=['GET'])
 def get_following_been_there():
-    user_identifier = request.args.get('identifier')
+    """Been there entries from followed users, newest first.
 
-    conn = get_db_connection()
+    Paged by ?limit=; pass the previous page's X-Next-Cursor as ?cursor=.
+    """
+    user_identifier = request.args.get('identifier')
+    try:
+        limit = max(1, min(int(request.args.get('limit', FEED_PAGE_SIZE)), FEED_MAX_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'Invalid limit'}), 400
+
+    before = None
+    if request.args.get('cursor'):
+        try:
+            before = int(decode_cursor(request.args['cursor'])['id'])
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+    conn = get_db()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
 
     # Get the user ID of the follower using the identifier (email)
-    cursor.execute("SELECT id FROM users WHERE email = %s", (user_identifier,))
-    follower_data = cursor.fetchone()
-
-    if follower_data is None:
-        cursor.close()
-        conn.close()
-        return jsonify([])
-
-    follower_id = follower_data['id']
-
-    # Get the list of followed user IDs
-    cursor.execute("SELECT followed_id FROM follows WHERE follower_id = %s", (follower_id,))
-    followed_ids = cursor.fetchall()
-
-    if not followed_ids:
+    follower_id = user_ids.get(conn, user_identifier)
+    if follower_id is None:
         cursor.close()
-        conn.close()
         return jsonify([])
 
-    # Extract the followed_ids
-    followed_ids = [follow['followed_id'] for follow in followed_ids]
-
-    # Get "Been There" entries for followed users
-    query = """
-    SELECT bt.id, bt.user_id, bt.bar_id, bt.rating, bt.comments, u.name as user_name, b.name as bar_name 
-    FROM been_there bt
-    JOIN users u ON bt.user_id = u.id
-    JOIN bars b ON bt.bar_id = b.id
-    WHERE bt.user_id = ANY(%s)
-    ORDER BY bt.id DESC
-    """
-    cursor.execute(query, (followed_ids,))
-    been_there_entries = cursor.fetchall()
-
+    been_there_entries = feed.load_page(conn, cursor, follower_id, limit, before)
     cursor.close()
-    conn.close()
 
-    return jsonify(been_there_entries)
+    response = jsonify(been_there_entries)
+    if len(been_there_entries) == limit:
+        response.headers['X-Next-Cursor'] = encode_cursor({'id': been_there_entries[-1]['id']})
+    return response
 
 
 # FRIENDS LOCATIONS
 
+# Users the requester follows who follow them back: one self-join on
+# follows, each side served by the covering indexes from migrations/013.
+# f.is_sharing_location is the requester sharing with the friend,
+# shares_with_me the friend sharing back.
+MUTUAL_FRIENDS_SQL = """
+    SELECT u.id, u.email, u.name, u.username, u.latitude, u.longitude, f.is_sharing_location,
+           r.is_sharing_location AS shares_with_me
+    FROM follows f
+    JOIN follows r ON r.follower_id = f.followed_id AND r.followed_id = f.follower_id
+    JOIN users u ON u.id = f.followed_id
+    WHERE f.follower_id = %s
+"""
+
+
 @app.route('/api/mutual_friends', methods=['GET'])
 def get_mutual_friends():
     identifier = request.args.get('identifier')
     if not identifier:
         return jsonify({'status': 'Identifier is required'}), 400
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
 
     # Get user_id of the requesting user
-    cursor.execute("SELECT id FROM users WHERE email = %s", (identifier,))
-    result = cursor.fetchone()
-    if not result:
+    user_id = user_ids.get(conn, identifier)
+    if user_id is None:
         cursor.close()
-        conn.close()
         return jsonify({'status': 'User not found'}), 404
 
-    user_id = result['id']
-
-    # Get users that the requesting user follows
-    cursor.execute("SELECT followed_id FROM follows WHERE follower_id = %s", (user_id,))
-    following = cursor.fetchall()
-
-    following_ids = {f['followed_id'] for f in following}
-
-    # Get users that follow the requesting user
-    cursor.execute("SELECT follower_id FROM follows WHERE followed_id = %s", (user_id,))
-    followers = cursor.fetchall()
-
-    follower_ids = {f['follower_id'] for f in followers}
-
-    # Find mutual friends (intersection of following and followers)
-    mutual_ids = following_ids.intersection(follower_ids)
+    # Mutual follows and both directions' sharing flags in one round trip
+    cursor.execute(MUTUAL_FRIENDS_SQL, (user_id,))
+    mutual_friends = cursor.fetchall()
 
-    if not mutual_ids:
+    if not mutual_friends:
         cursor.close()
-        conn.close()
         return jsonify([])  # Return empty list if no mutual friends found
 
-    # Fetch mutual friends' details including is_sharing_location
-    format_strings = ','.join(['%s'] * len(mutual_ids))
-    cursor.execute(f"""
-        SELECT u.id, u.email, u.name, u.username, u.latitude, u.longitude, f.is_sharing_location
-        FROM users u
-        JOIN follows f ON u.id = f.followed_id
-        WHERE u.id IN ({format_strings}) AND f.follower_id = %s
-    """, tuple(mutual_ids) + (user_id,))
-
-    mutual_friends = cursor.fetchall()
-
-    def haversine(lat1, lon1, lat2, lon2):
-        R = 6371e3  # Earth radius in meters
-        phi1 = math.radians(lat1)
-        phi2 = math.radians(lat2)
-        delta_phi = math.radians(lat2 - lat1)
-        delta_lambda = math.radians(lon2 - lon1)
-        a = math.sin(delta_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2) ** 2
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-        return R * c
-
-    # For each mutual friend, find the closest bar if they are sharing location
+    # Hide friends who aren't sharing, then resolve everyone else's closest
+    # bar in one pass over the shared location index
     for friend in mutual_friends:
-        cursor.execute("""
-            SELECT is_sharing_location FROM follows
-            WHERE follower_id = %s AND followed_id = %s
-        """, (friend['id'], user_id))
-        sharing_status = cursor.fetchone()
-        if not (sharing_status and sharing_status['is_sharing_location']):
+        if not friend.pop('shares_with_me'):
             friend['latitude'] = None
             friend['longitude'] = None
-            friend['current_bar'] = None
-        else:
-            cursor.execute("SELECT id, name, latitude, longitude FROM bars")
-            bars = cursor.fetchall()
-
-            closest_bar = None
-            min_distance = float('inf')
-            if friend['latitude'] and friend['longitude']:
-                for bar in bars:
-                    distance = haversine(friend['latitude'], friend['longitude'], bar['latitude'], bar['longitude'])
-                    if distance < min_distance:
-                        min_distance = distance
-                        closest_bar = bar['name'] if distance < 15 else None  # Assuming a 15 meter threshold
 
-            friend['current_bar'] = closest_bar
+    index = bar_locations.get(conn)
+    closest = index.nearest_many(
+        [(friend['latitude'] or None, friend['longitude'] or None) for friend in mutual_friends],
+        15  # Assuming a 15 meter threshold
+    )
+    for friend, hit in zip(mutual_friends, closest):
+        friend['current_bar'] = hit[0]['name'] if hit else None
 
     cursor.close()
-    conn.close()
 
     print(mutual_friends)
 
@@ -1802,21 +2166,16 @@ def update_sharing():
         print("Invalid request data")
         return jsonify({'status': 'Invalid request data'}), 400
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
 
     # Get user_id of the requesting user
-    cursor.execute("SELECT id FROM users WHERE email = %s", (identifier,))
-    result = cursor.fetchone()
-
-    if result is None:
+    user_id = user_ids.get(conn, identifier)
+    if user_id is None:
         print("User not found")
         cursor.close()
-        conn.close()
         return jsonify({'status': 'User not found'}), 404
 
-    user_id = result[0]  # Accessing the first element of the tuple
-
     # Debug: Print user_id
     print(f"User ID for identifier {identifier} is {user_id}")
 
@@ -1830,7 +2189,6 @@ def update_sharing():
     if follow_exists is None:
         print(f"No follow relationship exists between user_id {user_id} and friend_id {friend_id}")
         cursor.close()
-        conn.close()
         return jsonify({'status': 'Follow relationship not found'}), 404
 
     # Update the sharing location status in the follows table
@@ -1841,7 +2199,6 @@ def update_sharing():
 
     conn.commit()
     cursor.close()
-    conn.close()
 
     print("Location sharing status updated successfully")
     return jsonify({'status': 'Location sharing status updated successfully!'}), 200
@@ -1859,17 +2216,14 @@ def block_user():
     if not identifier or not blocked_id:
         return jsonify({'status': 'Invalid request data'}), 400
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
 
     # Get user_id of the requesting user
-    cursor.execute("SELECT id FROM users WHERE email = %s", (identifier,))
-    result = cursor.fetchone()
-    if result is None:
+    blocker_id = user_ids.get(conn, identifier)
+    if blocker_id is None:
         return jsonify({'status': 'User not found'}), 404
 
-    blocker_id = result[0]
-
     # Insert into blocks table
     cursor.execute("""
         INSERT INTO blocks (blocker_id, blocked_id)
@@ -1881,11 +2235,15 @@ def block_user():
     cursor.execute("""
         DELETE FROM follows WHERE (follower_id = %s AND followed_id = %s)
         OR (follower_id = %s AND followed_id = %s)
+        RETURNING followed_id
     """, (blocker_id, blocked_id, blocked_id, blocker_id))
+    unfollowed_ids = [row[0] for row in cursor.fetchall()]
+    if unfollowed_ids and feed.has_feed(conn):
+        for author_id in unfollowed_ids:
+            feed.catch_up(cursor, author_id)
 
     conn.commit()
     cursor.close()
-    conn.close()
 
     return jsonify({'status': 'User blocked successfully!'}), 200
 
@@ -1898,17 +2256,14 @@ def unblock_user():
     if not identifier or not blocked_id:
         return jsonify({'status': 'Invalid request data'}), 400
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
 
     # Get user_id of the requesting user
-    cursor.execute("SELECT id FROM users WHERE email = %s", (identifier,))
-    result = cursor.fetchone()
-    if result is None:
+    blocker_id = user_ids.get(conn, identifier)
+    if blocker_id is None:
         return jsonify({'status': 'User not found'}), 404
 
-    blocker_id = result[0]
-
     # Delete from blocks table
     cursor.execute("""
         DELETE FROM blocks WHERE blocker_id = %s AND blocked_id = %s
@@ -1916,7 +2271,6 @@ def unblock_user():
 
     conn.commit()
     cursor.close()
-    conn.close()
 
     return jsonify({'status': 'User unblocked successfully!'}), 200
 
@@ -1926,19 +2280,15 @@ def get_blocked_users():
     if not identifier:
         return jsonify({'status': 'Identifier is required'}), 400
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
 
     # Get user_id of the requesting user
-    cursor.execute("SELECT id FROM users WHERE email = %s", (identifier,))
-    result = cursor.fetchone()
-    if not result:
+    user_id = user_ids.get(conn, identifier)
+    if user_id is None:
         cursor.close()
-        conn.close()
         return jsonify({'status': 'User not found'}), 404
 
-    user_id = result['id']
-
     # Get blocked users
     cursor.execute("""
         SELECT u.id, u.email, u.name, u.username
@@ -1949,7 +2299,6 @@ def get_blocked_users():
     blocked_users = cursor.fetchall()
 
     cursor.close()
-    conn.close()
 
     return jsonify(blocked_users)
 
@@ -1962,20 +2311,25 @@ def get_follow_counts():
     if not identifier:
         return jsonify({'status': 'Identifier is required'}), 400
 
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor()
 
-    cursor.execute("SELECT id FROM users WHERE email = %s", (identifier,))
-    user_id = cursor.fetchone()[0]
-
-    cursor.execute("SELECT COUNT(*) FROM follows WHERE followed_id = %s", (user_id,))
-    follower_count = cursor.fetchone()[0]
-
-    cursor.execute("SELECT COUNT(*) FROM follows WHERE follower_id = %s", (user_id,))
-    following_count = cursor.fetchone()[0]
-
+    # Both counts in one round trip, joined on the email
+    if follow_counts.has_follow_counters(conn):
+        cursor.execute("SELECT follower_count, following_count FROM users WHERE email = %s", (identifier,))
+    else:
+        cursor.execute("""
+            SELECT (SELECT COUNT(*) FROM follows WHERE followed_id = u.id),
+                   (SELECT COUNT(*) FROM follows WHERE follower_id = u.id)
+            FROM users u
+            WHERE u.email = %s
+        """, (identifier,))
+    counts = cursor.fetchone()
     cursor.close()
-    conn.close()
+
+    if counts is None:
+        return jsonify({'status': 'User not found'}), 404
+    follower_count, following_count = counts
 
     return jsonify({
         'follower_count': follower_count,
@@ -1983,6 +2337,21 @@ def get_follow_counts():
     })
 
 
+@app.route('/api/follow_counts/batch', methods=['GET'])
+def get_follow_counts_batch():
+    """Counts for many users at once, for list screens: ?ids=1,2,3."""
+    try:
+        ids = follow_counts.parse_ids(request.args.get('ids'))
+    except ValueError as e:
+        return jsonify({'status': str(e)}), 400
+
+    counts = follow_counts.counts_for_ids(get_db(), ids)
+    return jsonify({
+        str(user_id): {'follower_count': counts[user_id][0], 'following_count': counts[user_id][1]}
+        for user_id in ids if user_id in counts
+    })
+
+
 # FRIEND BEEN THERE
 
 @app.route('/api/been_there', methods=['GET'])
@@ -1992,7 +2361,7 @@ def get_been_there_entries():
     if not user_id:
         return jsonify({'status': 'User ID is required'}), 400
     
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
     cursor.execute("""
         SELECT bt.id, bt.user_id, bt.bar_id, bt.rating, bt.comments, u.name AS user_name, b.name AS bar_name
@@ -2003,7 +2372,6 @@ def get_been_there_entries():
     """, (user_id,))
     entries = cursor.fetchall()
     cursor.close()
-    conn.close()
 
     print(entries)
     
@@ -2019,7 +2387,7 @@ def get_want_to_go_entries():
     if not user_id:
         return jsonify({'status': 'User ID is required'}), 400
     
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
     cursor.execute("""
         SELECT wt.id, wt.user_id, wt.bar_id, u.name AS user_name, b.name AS bar_name
@@ -2030,7 +2398,6 @@ def get_want_to_go_entries():
     """, (user_id,))
     entries = cursor.fetchall()
     cursor.close()
-    conn.close()
 
     print(entries)
     
@@ -2050,18 +2417,14 @@ def save_like_level():
         return jsonify({'status': 'Email, Bar ID, Like Level, and Rating are required'}), 400
 
     # Get DB connection
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
 
     # Get user ID from email
-    cursor.execute('SELECT id FROM users WHERE email = %s', (email,))
-    user = cursor.fetchone()
-
-    if not user:
+    user_id = user_ids.get(conn, email)
+    if user_id is None:
         return jsonify({'status': 'User not found'}), 404
 
-    user_id = user['id']
-
     # Check if an entry already exists for this user and bar
     cursor.execute(
         'SELECT * FROM been_there WHERE user_id = %s AND bar_id = %s',
@@ -2085,14 +2448,16 @@ def save_like_level():
             '''
             INSERT INTO been_there (user_id, bar_id, like_level, rating)
             VALUES (%s, %s, %s, %s)
+            RETURNING id
             ''',
             (user_id, bar_id, like_level, rating)
         )
+        if feed.has_feed(conn):
+            feed.fan_out(cursor, user_id, cursor.fetchone()['id'])
 
     # Commit the transaction
     conn.commit()
     cursor.close()
-    conn.close()
 
     return jsonify({'status': 'Like level and rating saved successfully!'}), 200
 
@@ -2107,23 +2472,27 @@ def get_bars_by_like_level():
     if not email or not like_level:
         return jsonify({'status': 'Email and Like Level are required'}), 400
 
+    try:
+        columns, _ = requested_fields(request.args.get('fields'), BAR_CARD_COLUMNS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     # Get DB connection
-    conn = get_db_connection()
+    conn = get_db()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
 
     # Get user ID from email
-    cursor.execute('SELECT id FROM users WHERE email = %s', (email,))
-    user = cursor.fetchone()
-
-    if not user:
+    user_id = user_ids.get(conn, email)
+    if user_id is None:
         return jsonify({'status': 'User not found'}), 404
 
-    user_id = user['id']
-
-    # Get bars with the selected like_level
+    # Get bars with the selected like_level, as cards plus the user's rating
     cursor.execute(
-        '''
-        SELECT * FROM been_there
+        f'''
+        SELECT {columns_sql(columns, 'bars')},
+               been_there.user_id, been_there.bar_id, been_there.rating,
+               been_there.comments, been_there.like_level
+        FROM been_there
         JOIN bars ON been_there.bar_id = bars.id
         WHERE been_there.user_id = %s AND been_there.like_level = %s
         ORDER BY been_there.rating DESC
@@ -2135,7 +2504,6 @@ def get_bars_by_like_level():
 
     # Close connection
     cursor.close()
-    conn.close()
 
     return jsonify({'status': 'Bars fetched successfully', 'bars': bars}), 200
 
@@ -2149,7 +2517,7 @@ def validate_invite_code():
         return jsonify({"status": "error", "message": "Invite code is required"}), 400
 
     try:
-        conn = get_db_connection()
+        conn = get_db()
         cur = conn.cursor(cursor_factory=RealDictCursor)
 
         # Check if the invite code exists
@@ -2177,7 +2545,6 @@ def validate_invite_code():
         conn.commit()
 
         cur.close()
-        conn.close()
 
         return jsonify({"status": "success", "message": "Invite code validated successfully"}), 200
 
@@ -2187,6 +2554,7 @@ def validate_invite_code():
 
 
 @app.route('/api/latest_version', methods=['GET'])
+@conditional(cache_control='public, max-age=3600')
 def get_latest_version():
     return jsonify({
         'latest_version': '5.0',
@@ -2195,6 +2563,23 @@ def get_latest_version():
     })
 
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    # Operators only: pool, cache and schema internals aren't for clients,
+    # and anything but the right token gets the same 404 as no endpoint
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if not METRICS_TOKEN or scheme.lower() != 'bearer' or not hmac.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+        return jsonify({'error': 'Not found'}), 404
+
+    return jsonify({
+        'db_pool': db.pool.stats(),
+        'schema_features': db.features(),
+        'ai_search_cache': dict(ai_cache_stats, memory=ai_cache.stats()),
+        'response_cache': response_cache.stats(),
+        'song_queue': song_queue.hub.stats(),
+        'user_ids': user_ids.stats()
+    })
+
 
 if __name__ == '__main__':
 
@@ -0,0 +1,122 @@
+import re
+from collections import defaultdict
+
+import numpy as np
+
+import db
+from acrcloud_file_monitor import _normalize_text
+
+_NON_ALNUM_RE = re.compile(r'[^0-9a-z]+')
+
+
+def normalize_name(name):
+    """Lowercase, ASCII-quoted, punctuation-free form of a bar name.
+
+    Apostrophes are dropped rather than split on, so "Althea’s Rooftop" and
+    "Altheas Rooftop" normalize the same.
+    """
+    name = _normalize_text(name or '').lower().replace("'", '')
+    return ' '.join(_NON_ALNUM_RE.sub(' ', name).split())
+
+
+def trigrams(normalized):
+    # Pad each word like pg_trgm does so short names still produce trigrams
+    grams = set()
+    for word in normalized.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class BarNameIndex:
+    """Trigram inverted index over bar names.
+
+    Scores are the trigram similarity of the two names. A suggestion of two
+    or more words found whole inside a bar name scores 0.9, which keeps the
+    old "name ILIKE %suggestion%" matches; single words like "Bar" or
+    "Lounge" don't get that boost, or they would match every bar named so.
+    """
+
+    def __init__(self, rows):
+        self.ids = []
+        self.names = []
+        self.gram_counts = []
+        self.postings = defaultdict(list)
+
+        for row in rows:
+            normalized = normalize_name(row['name'])
+            if not normalized:
+                continue
+            i = len(self.ids)
+            grams = trigrams(normalized)
+            self.ids.append(row['id'])
+            self.names.append(normalized)
+            self.gram_counts.append(len(grams))
+            for gram in grams:
+                self.postings[gram].append(i)
+
+        self.gram_counts = np.array(self.gram_counts, dtype=np.int32)
+        self.postings = {gram: np.array(idx, dtype=np.int32) for gram, idx in self.postings.items()}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, name, min_score=0.5):
+        """[(bar_id, score)] for bars matching one name, best first."""
+        normalized = normalize_name(name)
+        grams = trigrams(normalized)
+        if not grams:
+            return []
+
+        hits = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not hits:
+            return []
+
+        # Shared trigram counts for every bar at once
+        shared = np.bincount(np.concatenate(hits), minlength=len(self.ids))
+        candidates = np.nonzero(shared)[0]
+        common = shared[candidates]
+        scores = common / (len(grams) + self.gram_counts[candidates] - common)
+
+        # Only bars holding every trigram of the suggestion can contain it
+        if len(normalized.split()) > 1:
+            padded = f' {normalized} '
+            for j in np.nonzero(common == len(grams))[0].tolist():
+                if padded in f' {self.names[candidates[j]]} ':
+                    scores[j] = max(scores[j], 0.9)
+
+        keep = scores >= min_score
+        matches = [
+            (self.ids[i], float(score))
+            for i, score in zip(candidates[keep].tolist(), scores[keep].tolist())
+        ]
+        matches.sort(key=lambda match: -match[1])
+        return matches
+
+    def resolve(self, names, min_score=0.6, limit=10):
+        """The best matching bar for each suggested name, best first, at most `limit`.
+
+        Like the old per-suggestion "LIMIT 1" lookup, a name resolves to one
+        bar at most; two names resolving to the same bar count once.
+        """
+        best = {}
+        for name in names:
+            matches = self.search(name, min_score)
+            if matches:
+                bar_id, score = matches[0]
+                best[bar_id] = max(score, best.get(bar_id, 0))
+        return sorted(best.items(), key=lambda match: -match[1])[:limit]
+
+
+class BarNames(db.CatalogIndex):
+    """Process-wide BarNameIndex, versioned by 'bar_locations' (migrations/016),
+    which moves whenever a bar is added, removed or renamed."""
+
+    catalog = 'bar_locations'
+
+    def build(self, conn):
+        cursor = conn.cursor()
+        cursor.execute('SELECT id, name FROM bars')
+        rows = [{'id': row[0], 'name': row[1]} for row in cursor.fetchall()]
+        cursor.close()
+        return BarNameIndex(rows)
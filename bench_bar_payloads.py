@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# Payload size and JSON serialization time for bar responses: the original
+# SELECT * rows vs the card/detail shapes from projections.py, and a narrow
+# ?fields= selection. Read-only, runs against the configured database.
+#
+#   python bench_bar_payloads.py [runs] [list size]
+
+import sys
+import time
+
+from flask import Flask
+from psycopg2.extras import RealDictCursor
+
+from db import pool
+from projections import BAR_CARD_COLUMNS, bar_detail_columns, requested_fields, columns_sql
+
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+LIST_SIZE = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+
+# Serialize with Flask's provider, as jsonify() does
+app = Flask(__name__)
+
+
+def measure(rows):
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        body = app.json.dumps(rows)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return len(body.encode()), timings[len(timings) // 2]
+
+
+def fetch(cursor, columns_clause, limit):
+    cursor.execute(f"SELECT {columns_clause} FROM bars ORDER BY id LIMIT %s", (limit,))
+    return cursor.fetchall()
+
+
+def main():
+    with pool.connection() as conn:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        narrow, _ = requested_fields('id,name,photo,price_signs', BAR_CARD_COLUMNS)
+
+        cases = [
+            (f'list x{LIST_SIZE}: SELECT *', fetch(cursor, '*', LIST_SIZE)),
+            (f'list x{LIST_SIZE}: card', fetch(cursor, columns_sql(BAR_CARD_COLUMNS), LIST_SIZE)),
+            (f'list x{LIST_SIZE}: fields=', fetch(cursor, columns_sql(narrow), LIST_SIZE)),
+            ('detail: SELECT *', fetch(cursor, '*', 1)[0]),
+            ('detail: detail', fetch(cursor, columns_sql(bar_detail_columns(conn)), 1)[0]),
+        ]
+        cursor.close()
+
+    print(f"{'shape':28} {'bytes':>9} {'serialize ms':>13}")
+    for label, rows in cases:
+        size, ms = measure(rows)
+        print(f"{label:28} {size:9} {ms:13.3f}")
+
+
+if __name__ == '__main__':
+    main()
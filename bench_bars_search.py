@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# Benchmark the /api/bars search box: the original LEFT JOIN + five ILIKEs
+# vs the bar_search documents from migrations/002_bars_search.sql. Read-only,
+# runs against the configured database.
+#
+#   python bench_bars_search.py [runs] [term ...]
+
+import sys
+import time
+
+import search as search_bars
+from db import pool
+
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+TERMS = sys.argv[2:] or ['rooftop', 'wine bar', 'soho', 'disco', 'althea’s', 'drake', 'lounge', 'x']
+PER_PAGE = 30
+
+LEGACY_QUERY = """
+    SELECT b.id
+    FROM bars b
+    LEFT JOIN playlists p ON b.id = p.bar_id
+    LEFT JOIN songs s ON p.id = s.playlist_id
+    WHERE (b.name ILIKE %s OR b.description ILIKE %s OR b.address ILIKE %s
+           OR s.name ILIKE %s OR s.artist ILIKE %s)
+    LIMIT %s
+"""
+
+
+def indexed_query(term):
+    joins, match, match_params, rank, rank_params = search_bars.bar_search_sql(term, True)
+    query = f"SELECT b.id, {rank} AS rank FROM bars b {joins} WHERE {match} ORDER BY rank DESC LIMIT %s"
+    return query, rank_params + match_params + [PER_PAGE]
+
+
+def timed(cursor, query, params):
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2], rows
+
+
+def main():
+    with pool.connection() as conn:
+        if not search_bars.has_search_document(conn):
+            sys.exit("bar_search is missing; apply migrations/002_bars_search.sql first")
+
+        cursor = conn.cursor()
+        print(f"{'term':12} {'legacy ms':>10} {'rows':>5} {'dupes':>5} {'indexed ms':>11} {'rows':>5}")
+        for term in TERMS:
+            pattern = f'%{term}%'
+            legacy_ms, legacy_rows = timed(cursor, LEGACY_QUERY, [pattern] * 5 + [PER_PAGE])
+            query, params = indexed_query(term)
+            indexed_ms, indexed_rows = timed(cursor, query, params)
+
+            dupes = len(legacy_rows) - len({row[0] for row in legacy_rows})
+            print(f"{term:12} {legacy_ms:10.2f} {len(legacy_rows):5} {dupes:5} {indexed_ms:11.2f} {len(indexed_rows):5}")
+
+        cursor.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# Benchmark the /api/bars distance query: haversine fallback vs earthdistance
+# GiST index. Loads the NYC venues from updated_csv_file_geoparse.csv into a
+# temp table, scaled up SCALE times with a little positional jitter.
+#
+#   python bench_bars_spatial.py [scale] [runs]
+
+import csv
+import io
+import random
+import sys
+import time
+
+import geo
+from db import pool
+
+CSV_PATH = 'updated_csv_file_geoparse.csv'
+SCALE = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+RUNS = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+PER_PAGE = 30
+RADIUS_MILES = 1.0
+JITTER = 0.02  # degrees
+
+
+def load_venues():
+    with open(CSV_PATH, newline='', encoding='utf-8') as f:
+        return [
+            (float(row['latitude']), float(row['longitude']))
+            for row in csv.DictReader(f)
+            if row['latitude'] and row['longitude']
+        ]
+
+
+def build_query(latitude, longitude, spatial, radius):
+    distance, params = geo.distance_sql(latitude, longitude, spatial)
+    query = f"SELECT b.id, {distance} AS distance FROM bench_bars b WHERE true"
+    if radius:
+        within, within_params = geo.within_sql(latitude, longitude, radius, spatial)
+        query += f" AND {within}"
+        params += within_params
+    order, order_params = geo.nearest_order_sql(latitude, longitude, spatial)
+    query += f" ORDER BY {order} LIMIT %s"
+    return query, params + order_params + [PER_PAGE]
+
+
+def run(cursor, venues, spatial, radius):
+    random.seed(0)
+    timings = []
+    for _ in range(RUNS):
+        latitude, longitude = random.choice(venues)
+        query, params = build_query(latitude, longitude, spatial, radius)
+        start = time.perf_counter()
+        cursor.execute(query, params)
+        cursor.fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2], timings[int(len(timings) * 0.95) - 1]
+
+
+def main():
+    venues = load_venues()
+    random.seed(42)
+
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        spatial = geo.has_earthdistance(conn)
+
+        cursor.execute('CREATE TEMP TABLE bench_bars (id serial PRIMARY KEY, latitude double precision, longitude double precision)')
+        buf = io.StringIO()
+        for _ in range(SCALE):
+            for latitude, longitude in venues:
+                buf.write(f"{latitude + random.uniform(-JITTER, JITTER)}\t{longitude + random.uniform(-JITTER, JITTER)}\n")
+        buf.seek(0)
+        cursor.copy_from(buf, 'bench_bars', columns=('latitude', 'longitude'))
+        if spatial:
+            cursor.execute('CREATE INDEX ON bench_bars USING gist (ll_to_earth(latitude, longitude))')
+        cursor.execute('ANALYZE bench_bars')
+        print(f"Loaded {len(venues) * SCALE} bars ({len(venues)} venues x {SCALE})")
+
+        variants = [(False, 'haversine')]
+        if spatial:
+            variants.append((True, 'earthdistance'))
+        else:
+            print("earthdistance not installed; only benchmarking the fallback")
+
+        for radius in (0, RADIUS_MILES):
+            for variant_spatial, label in variants:
+                p50, p95 = run(cursor, venues, variant_spatial, radius)
+                print(f"{label:14} radius={radius:<4} p50={p50:8.2f}ms p95={p95:8.2f}ms")
+
+        conn.rollback()
+        cursor.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# Benchmark response serialization for /api/bars pages (cards with their
+# songs) and the full /api/events list: Flask's stdlib json provider vs
+# fastjson.OrjsonProvider, plus what gzip/brotli add on top. Read-only,
+# runs against the configured database.
+#
+#   python bench_json.py [runs] [pages]
+
+import sys
+import time
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from psycopg2.extras import RealDictCursor
+
+import compression
+from app import attach_songs
+from db import pool
+from fastjson import OrjsonProvider
+from projections import BAR_CARD_COLUMNS, columns_sql
+
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+PAGES = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+PER_PAGE = 30
+
+
+def load_payloads():
+    payloads = []
+    with pool.connection() as conn:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        for page in range(PAGES):
+            cursor.execute(
+                f"SELECT {columns_sql(BAR_CARD_COLUMNS)} FROM bars ORDER BY id LIMIT %s OFFSET %s",
+                (PER_PAGE, page * PER_PAGE)
+            )
+            bars = cursor.fetchall()
+            attach_songs(cursor, bars)
+            payloads.append((f'bars page {page + 1}', bars))
+
+        cursor.execute('SELECT * FROM events')
+        payloads.append(('events', cursor.fetchall()))
+        cursor.close()
+    return payloads
+
+
+def median_ms(fn):
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2], result
+
+
+def main():
+    app = Flask(__name__)
+    stdlib = DefaultJSONProvider(app)
+    fast = OrjsonProvider(app)
+
+    print(f"{'payload':14} {'stdlib ms':>10} {'orjson ms':>10} {'bytes':>8} {'gzip ms':>8} {'gzip b':>7} {'br ms':>7} {'br b':>7}")
+    with app.app_context():
+        for label, rows in load_payloads():
+            stdlib_ms, expected = median_ms(lambda: stdlib.response(rows).get_data())
+            fast_ms, body = median_ms(lambda: fast.response(rows).get_data())
+            if stdlib.loads(expected) != fast.loads(body):
+                sys.exit(f"{label}: orjson output differs from the stdlib provider")
+
+            gzip_ms, gzipped = median_ms(lambda: compression.compress(body, 'gzip'))
+            if compression.brotli is not None:
+                br_ms, brotlied = median_ms(lambda: compression.compress(body, 'br'))
+                br = f"{br_ms:7.2f} {len(brotlied):7}"
+            else:
+                br = f"{'-':>7} {'-':>7}"
+
+            print(f"{label:14} {stdlib_ms:10.2f} {fast_ms:10.2f} {len(body):8} {gzip_ms:8.2f} {len(gzipped):7} {br}")
+
+
+if __name__ == '__main__':
+    main()
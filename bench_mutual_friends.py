@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# /api/mutual_friends at scale: the original two id fetches + Python set
+# intersection + IN (...) list vs the single self-join in MUTUAL_FRIENDS_SQL.
+# Builds a synthetic follows graph in a temp table shaped like follows
+# (same columns and indexes, so apply migrations/013 first) where one user
+# follows and is followed by FOLLOWS users, half of them mutual, among
+# NOISE other rows. The users join is left out: both versions do it the
+# same way. Checks both return the same friends and sharing flags and that
+# the self-join uses an index on each side. Writes nothing; exits 1 if any
+# check fails.
+#
+#   python bench_mutual_friends.py [runs] [follows]
+
+import sys
+import time
+
+from db import pool
+
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+FOLLOWS = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+NOISE = 20 * FOLLOWS
+USER_ID = 1
+
+SELF_JOIN = """
+    SELECT f.followed_id AS id, f.is_sharing_location, r.is_sharing_location AS shares_with_me
+    FROM follows f
+    JOIN follows r ON r.follower_id = f.followed_id AND r.followed_id = f.follower_id
+    WHERE f.follower_id = %s
+"""
+
+
+def build_graph(cursor):
+    """USER_ID follows 2..FOLLOWS+1 and is followed by FOLLOWS/2+2..3*FOLLOWS/2+1."""
+    cursor.execute("CREATE TEMP TABLE follows (LIKE public.follows INCLUDING DEFAULTS INCLUDING INDEXES) ON COMMIT DROP")
+    cursor.execute("""
+        INSERT INTO follows (follower_id, followed_id, is_sharing_location)
+        SELECT %(user_id)s, n, n %% 3 = 0 FROM generate_series(2, %(follows)s + 1) n
+    """, {'user_id': USER_ID, 'follows': FOLLOWS})
+    cursor.execute("""
+        INSERT INTO follows (follower_id, followed_id, is_sharing_location)
+        SELECT n, %(user_id)s, n %% 2 = 0 FROM generate_series(%(follows)s / 2 + 2, %(follows)s * 3 / 2 + 1) n
+    """, {'user_id': USER_ID, 'follows': FOLLOWS})
+    # Everyone else's follows, so the indexes have something to skip
+    cursor.execute("""
+        INSERT INTO follows (follower_id, followed_id, is_sharing_location)
+        SELECT DISTINCT 2 + (random() * %(users)s)::int, 2 + (random() * %(users)s)::int, false
+        FROM generate_series(1, %(noise)s)
+        ON CONFLICT DO NOTHING
+    """, {'users': FOLLOWS * 2, 'noise': NOISE})
+    cursor.execute("ANALYZE follows")
+
+
+def legacy(cursor):
+    cursor.execute("SELECT followed_id FROM follows WHERE follower_id = %s", (USER_ID,))
+    following_ids = {row[0] for row in cursor.fetchall()}
+    cursor.execute("SELECT follower_id FROM follows WHERE followed_id = %s", (USER_ID,))
+    follower_ids = {row[0] for row in cursor.fetchall()}
+    mutual_ids = following_ids.intersection(follower_ids)
+    if not mutual_ids:
+        return []
+
+    format_strings = ','.join(['%s'] * len(mutual_ids))
+    cursor.execute(f"""
+        SELECT f.followed_id AS id, f.is_sharing_location, r.is_sharing_location AS shares_with_me
+        FROM follows f
+        JOIN follows r ON f.followed_id = r.follower_id AND r.followed_id = %s
+        WHERE f.follower_id = %s AND f.followed_id IN ({format_strings})
+    """, (USER_ID, USER_ID) + tuple(mutual_ids))
+    return cursor.fetchall()
+
+
+def self_join(cursor):
+    cursor.execute(SELF_JOIN, (USER_ID,))
+    return cursor.fetchall()
+
+
+def timed(cursor, fetch):
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        rows = fetch(cursor)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2], sorted(rows)
+
+
+def main():
+    failed = False
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        build_graph(cursor)
+
+        legacy_ms, legacy_rows = timed(cursor, legacy)
+        self_join_ms, self_join_rows = timed(cursor, self_join)
+        print(f"== {FOLLOWS} following, {FOLLOWS} followers, {len(self_join_rows)} mutual")
+        print(f"legacy (3 queries + set intersection): {legacy_ms:.2f} ms")
+        print(f"self-join (1 query): {self_join_ms:.2f} ms")
+
+        cursor.execute("EXPLAIN " + SELF_JOIN, (USER_ID,))
+        plan = '\n'.join(row[0] for row in cursor.fetchall())
+        print("-- self-join plan")
+        print(plan)
+
+        if self_join_rows != legacy_rows:
+            print("FAIL: self-join returned different friends or sharing flags")
+            failed = True
+        if len(self_join_rows) != FOLLOWS // 2:
+            print(f"FAIL: expected {FOLLOWS // 2} mutual friends, got {len(self_join_rows)}")
+            failed = True
+        if 'Seq Scan' in plan:
+            print("FAIL: self-join scans follows sequentially")
+            failed = True
+
+        cursor.close()
+        conn.rollback()
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# Microbenchmark for /api/nearby_bars: the old per-request haversine loop
+# over every bar vs the in-memory GridIndex. Runs on the venues in
+# updated_csv_file_geoparse.csv, no database needed.
+#
+#   python bench_nearby_bars.py [scale] [queries]
+
+import csv
+import math
+import random
+import sys
+import time
+
+from geo import GridIndex
+
+CSV_PATH = 'updated_csv_file_geoparse.csv'
+SCALE = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+QUERIES = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+DISTANCE_LIMIT = 15  # meters
+JITTER = 0.02  # degrees, applied to copies when SCALE > 1
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    R = 6371e3  # Earth radius in meters
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    delta_phi = math.radians(lat2 - lat1)
+    delta_lambda = math.radians(lon2 - lon1)
+    a = math.sin(delta_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2) ** 2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return R * c
+
+
+def loop_nearby(bars, latitude, longitude):
+    nearby_bars = []
+    for bar in bars:
+        if bar['latitude'] is None or bar['longitude'] is None:
+            continue
+        distance = haversine(latitude, longitude, bar['latitude'], bar['longitude'])
+        if distance < DISTANCE_LIMIT:
+            nearby_bars.append(dict(bar, distance=distance))
+    nearby_bars.sort(key=lambda x: x['distance'])
+    return nearby_bars
+
+
+def load_bars():
+    random.seed(42)
+    with open(CSV_PATH, newline='', encoding='utf-8') as f:
+        venues = [row for row in csv.DictReader(f) if row['latitude'] and row['longitude']]
+    bars = []
+    for copy in range(SCALE):
+        jitter = JITTER if copy else 0
+        for row in venues:
+            bars.append({
+                'id': len(bars) + 1,
+                'name': row['name'],
+                'latitude': float(row['latitude']) + random.uniform(-jitter, jitter),
+                'longitude': float(row['longitude']) + random.uniform(-jitter, jitter),
+            })
+    return bars
+
+
+def main():
+    bars = load_bars()
+
+    # Query points sit a few meters from a random venue so most hit something
+    random.seed(0)
+    points = []
+    for _ in range(QUERIES):
+        bar = random.choice(bars)
+        points.append((bar['latitude'] + random.uniform(-1e-4, 1e-4), bar['longitude'] + random.uniform(-1e-4, 1e-4)))
+
+    start = time.perf_counter()
+    index = GridIndex(bars)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    expected = [loop_nearby(bars, lat, lon) for lat, lon in points]
+    loop_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = [index.within(lat, lon, DISTANCE_LIMIT) for lat, lon in points]
+    grid_s = time.perf_counter() - start
+
+    for want, got in zip(expected, actual):
+        assert [b['id'] for b in want] == [b['id'] for b, _ in got], (want, got)
+
+    print(f"{len(bars)} bars, {QUERIES} queries, index built in {build_ms:.1f}ms")
+    print(f"loop: {1e6 * loop_s / QUERIES:10.1f}us/query")
+    print(f"grid: {1e6 * grid_s / QUERIES:10.1f}us/query  ({loop_s / grid_s:.0f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# EXPLAIN the genre/vibe filters before and after migrations/004_bars_tag_arrays.sql:
+# the original per-value ILIKE / = ANY() OR-chains vs one && against the
+# GIN-indexed arrays. Checks each rewrite returns the same bars and that its
+# plan can use the GIN index (with seq scans disabled, since on a small bars
+# table the planner rightly prefers one). Read-only, runs against the
+# configured database; exits 1 if any check fails.
+#
+#   python bench_tag_filters.py [runs]
+
+import sys
+import time
+
+import tags
+from db import pool
+
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+# (label, legacy where, legacy params, rewritten where, rewritten params, index)
+CASES = [
+    (
+        'venue types',
+        "(b.venue_types ILIKE %s OR b.venue_types ILIKE %s)", ['%Lounge%', '%Rooftop%'],
+        *tags.genre_filter_sql(['Lounge', 'Rooftop'], True),
+        'bars_venue_tags_idx',
+    ),
+    (
+        'music genres',
+        "(%s = ANY(b.music_genres) OR %s = ANY(b.music_genres))", ['Latin/Reggaeton', 'Disco/Funk'],
+        "b.music_genres && %s::text[]", [['Latin/Reggaeton', 'Disco/Funk']],
+        'bars_music_genres_idx',
+    ),
+    (
+        'club vibes',
+        "(%s = ANY(b.club_vibes) OR %s = ANY(b.club_vibes))", ['Chill', 'Dancing'],
+        "b.club_vibes && %s::text[]", [['Chill', 'Dancing']],
+        'bars_club_vibes_idx',
+    ),
+]
+
+
+def plan(cursor, where, params):
+    cursor.execute(f"EXPLAIN SELECT b.id FROM bars b WHERE {where}", params)
+    return '\n'.join(row[0] for row in cursor.fetchall())
+
+
+def timed(cursor, where, params):
+    query = f"SELECT b.id FROM bars b WHERE {where} ORDER BY b.id"
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2], [row[0] for row in rows]
+
+
+def main():
+    failed = False
+    with pool.connection() as conn:
+        if not tags.has_venue_tags(conn):
+            sys.exit("bars.venue_tags is missing; apply migrations/004_bars_tag_arrays.sql first")
+
+        cursor = conn.cursor()
+        for label, legacy, legacy_params, rewritten, rewritten_params, index in CASES:
+            legacy_ms, legacy_ids = timed(cursor, legacy, legacy_params)
+            rewritten_ms, rewritten_ids = timed(cursor, rewritten, rewritten_params)
+
+            print(f"== {label}: legacy {legacy_ms:.2f} ms ({len(legacy_ids)} bars), "
+                  f"rewritten {rewritten_ms:.2f} ms ({len(rewritten_ids)} bars)")
+            print("-- before")
+            print(plan(cursor, legacy, legacy_params))
+            print("-- after (planner's choice)")
+            print(plan(cursor, rewritten, rewritten_params))
+
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            forced = plan(cursor, rewritten, rewritten_params)
+            cursor.execute("RESET enable_seqscan")
+
+            # venue_tags matches whole tags/words, so it can only drop substring
+            # hits like 'lounge' inside 'loungewear'; the arrays must agree exactly
+            if label == 'venue types':
+                same = set(rewritten_ids) <= set(legacy_ids)
+            else:
+                same = rewritten_ids == legacy_ids
+            if not same:
+                print(f"FAIL: {label} rewrite returned different bars")
+                failed = True
+            if index not in forced:
+                print(f"FAIL: {label} rewrite can't use {index}:\n{forced}")
+                failed = True
+            print()
+
+        cursor.close()
+        conn.rollback()
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,313 @@
+import functools
+import json
+import os
+import secrets
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+
+import redis
+from dotenv import load_dotenv
+from flask import request, make_response
+
+import httpcache
+
+load_dotenv()
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe, size-bounded LRU mapping with hit/miss counters."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {
+            'size': len(self._data),
+            'max_size': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+# SHARED RESPONSE CACHE
+#
+# Route handlers decorated with response_cache.cached() share their 200
+# responses across workers through Redis when REDIS_URL is set, and within
+# the process otherwise. Entries carry tags ('bar:12', 'events', ...) that
+# the write endpoints invalidate.
+
+REDIS_URL = os.getenv('REDIS_URL')  # unset: cache per process only
+CACHE_PREFIX = os.getenv('CACHE_PREFIX', 'intoit:')  # namespace for keys in a shared Redis
+CACHE_LOCAL_SIZE = int(os.getenv('CACHE_LOCAL_SIZE', 2048))  # entries in the in-process fallback
+CACHE_LOCK_TIMEOUT = float(os.getenv('CACHE_LOCK_TIMEOUT', 10))  # seconds a rebuild lock is held at most
+CACHE_LOCK_WAIT = float(os.getenv('CACHE_LOCK_WAIT', 3))  # seconds to wait on another worker's rebuild
+CACHE_TAG_TTL = 24 * 3600  # tag sets outlive the entries they point at
+
+# Headers Flask or the outer decorators set again on every response; the
+# rest (X-Next-Cursor, ...) are part of the cached entry
+UNCACHED_HEADERS = {'content-type', 'content-length', 'set-cookie', 'x-cache'}
+
+
+class LocalBackend:
+    """In-process stand-in for Redis: expiring LRU entries, tag sets and locks."""
+
+    def __init__(self, maxsize):
+        self._entries = LRUCache(maxsize)  # key -> (value, expires_at)
+        self._tags = defaultdict(set)
+        self._locks = {}  # key -> (token, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry[1] < time.monotonic():
+            return None
+        return entry[0]
+
+    def set(self, key, value, ttl, tags=()):
+        self._entries.set(key, (value, time.monotonic() + ttl))
+        with self._lock:
+            for tag in tags:
+                self._tags[tag].add(key)
+
+    def invalidate(self, tags):
+        with self._lock:
+            keys = set().union(*(self._tags.pop(tag, set()) for tag in tags))
+        for key in keys:
+            self._entries.delete(key)
+
+    def acquire(self, key, timeout):
+        """A token for release(), or None if someone else holds the lock."""
+        now = time.monotonic()
+        with self._lock:
+            if self._locks.get(key, (None, 0))[1] > now:
+                return None
+            token = secrets.token_hex(8)
+            self._locks[key] = (token, now + timeout)
+            return token
+
+    def release(self, key, token):
+        """Drop the lock if `token` still holds it."""
+        with self._lock:
+            if self._locks.get(key, (None, 0))[0] == token:
+                del self._locks[key]
+
+    def locked(self, key):
+        with self._lock:
+            return self._locks.get(key, (None, 0))[1] > time.monotonic()
+
+
+# Compare-and-delete for rebuild locks
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisBackend:
+    """Same interface as LocalBackend over a Redis server shared by all workers."""
+
+    def __init__(self, client, prefix):
+        self.client = client
+        self.prefix = prefix
+        self._release = client.register_script(RELEASE_SCRIPT)
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl, tags=()):
+        pipe = self.client.pipeline()
+        pipe.set(self.prefix + key, value, ex=max(1, int(ttl)))
+        for tag in tags:
+            pipe.sadd(f'{self.prefix}tag:{tag}', self.prefix + key)
+            pipe.expire(f'{self.prefix}tag:{tag}', CACHE_TAG_TTL)
+        pipe.execute()
+
+    def invalidate(self, tags):
+        tag_keys = [f'{self.prefix}tag:{tag}' for tag in tags]
+        pipe = self.client.pipeline()
+        for tag_key in tag_keys:
+            pipe.smembers(tag_key)
+        keys = set().union(*pipe.execute())
+        self.client.delete(*keys, *tag_keys)
+
+    def acquire(self, key, timeout):
+        token = secrets.token_hex(8)
+        if self.client.set(f'{self.prefix}lock:{key}', token, nx=True, px=int(timeout * 1000)):
+            return token
+        return None
+
+    def release(self, key, token):
+        # Only the holder may delete: a lock that expired under a slow
+        # rebuild may since belong to another worker
+        self._release(keys=[f'{self.prefix}lock:{key}'], args=[token])
+
+    def locked(self, key):
+        return bool(self.client.exists(f'{self.prefix}lock:{key}'))
+
+
+class ResponseCache:
+    """Decorator-based cache of JSON route responses with tag invalidation.
+
+    On a miss only one request per key (across workers, with Redis) runs the
+    view; the others wait up to CACHE_LOCK_WAIT seconds for its result
+    instead of all hitting Postgres at once, or run the view themselves as
+    soon as it finishes with nothing to cache. Redis errors are counted and
+    the view is served uncached.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.counts = Counter()
+
+    def _call(self, method, *args, default=None):
+        try:
+            return getattr(self.backend, method)(*args)
+        except redis.RedisError as e:
+            self.counts['errors'] += 1
+            print(f"Response cache {method} failed: {e}")
+            return default
+
+    @staticmethod
+    def _key(catalogs, bucket=None):
+        key = f'route:{request.endpoint}:{request.full_path}'
+        stamp = httpcache.stamps.get(catalogs) if catalogs else None
+        if stamp is not None:
+            key += f':v{"-".join(map(str, stamp[0]))}'
+        if bucket:
+            key += f':t{httpcache.time_bucket(bucket)}'
+        return key
+
+    @staticmethod
+    def _response(value):
+        head, _, body = value.partition(b'\n')
+        try:
+            meta = json.loads(head)
+        except ValueError:
+            meta = {'mimetype': head.decode(), 'headers': []}  # entry stored before headers were kept
+        response = make_response(body)
+        response.mimetype = meta['mimetype']
+        for name, header_value in meta['headers']:
+            response.headers.add(name, header_value)
+        response.headers['X-Cache'] = 'HIT'
+        return response
+
+    def _store(self, key, response, ttl, tags):
+        if response.status_code == 200 and not response.direct_passthrough:
+            meta = {
+                'mimetype': response.mimetype,
+                'headers': [[name, value] for name, value in response.headers.items()
+                            if name.lower() not in UNCACHED_HEADERS],
+            }
+            value = json.dumps(meta, separators=(',', ':')).encode() + b'\n' + response.get_data()
+            self._call('set', key, value, ttl, tags)
+        response.headers['X-Cache'] = 'MISS'
+        return response
+
+    def cached(self, ttl, tags=(), catalogs=(), bucket=None):
+        """Cache a GET view's 200 responses for `ttl` seconds under route + args.
+
+        `tags` are formatted with the view's keyword arguments, e.g. 'bar:{id}'.
+        `catalogs` versions (see httpcache) go into the key, so writes that
+        skip the app, like the scheduler's, still retire old entries and the
+        body never lags behind the ETag. Views whose conditional() ETag has a
+        time `bucket` pass the same one here for the same reason.
+        """
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                key = self._key(catalogs, bucket)
+                entry_tags = [tag.format(**kwargs) for tag in tags]
+
+                value = self._call('get', key)
+                if value is not None:
+                    self.counts['hits'] += 1
+                    return self._response(value)
+                self.counts['misses'] += 1
+
+                # Single flight: whoever takes the lock rebuilds, the rest
+                # poll for its result. With Redis unreachable ('') every
+                # request just runs the view.
+                token = self._call('acquire', key, CACHE_LOCK_TIMEOUT, default='')
+                if token is None:
+                    deadline = time.monotonic() + CACHE_LOCK_WAIT
+                    while time.monotonic() < deadline:
+                        time.sleep(0.05)
+                        value = self._call('get', key)
+                        if value is None and not self._call('locked', key, default=False):
+                            # The rebuild finished without storing anything
+                            # (a 404, a 400...): no point waiting out the clock
+                            value = self._call('get', key)
+                            if value is None:
+                                self.counts['uncacheable'] += 1
+                                break
+                        if value is not None:
+                            self.counts['waited'] += 1
+                            return self._response(value)
+                    else:
+                        self.counts['lock_timeouts'] += 1
+                    return self._store(key, make_response(view(*args, **kwargs)), ttl, entry_tags)
+
+                try:
+                    return self._store(key, make_response(view(*args, **kwargs)), ttl, entry_tags)
+                finally:
+                    if token:
+                        self._call('release', key, token)
+
+            return wrapper
+        return decorator
+
+    def invalidate(self, *tags):
+        """Drop every cached response carrying any of `tags`."""
+        self.counts['invalidations'] += 1
+        self._call('invalidate', [str(tag) for tag in tags])
+
+    def stats(self):
+        return dict(self.counts, backend=type(self.backend).__name__)
+
+
+def _default_backend():
+    if REDIS_URL:
+        print("Response cache: Redis")
+        return RedisBackend(redis.Redis.from_url(REDIS_URL, socket_timeout=0.5), CACHE_PREFIX)
+    print("Response cache: in-process")
+    return LocalBackend(CACHE_LOCAL_SIZE)
+
+
+response_cache = ResponseCache(_default_backend())
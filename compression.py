@@ -0,0 +1,76 @@
+import gzip
+import os
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only without it
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))  # bytes; smaller bodies aren't worth it
+COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', 6))  # gzip level 1-9
+BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', 5))  # brotli quality 0-11
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/')
+
+
+def accepted_encodings(header):
+    """Codings from an Accept-Encoding header with a non-zero q value."""
+    encodings = set()
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        q = params.strip()
+        if q.startswith('q='):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            encodings.add(coding.strip().lower())
+    return encodings
+
+
+def choose_encoding(header):
+    """'br', 'gzip' or None, preferring brotli when it's installed."""
+    encodings = accepted_encodings(header)
+    if brotli is not None and 'br' in encodings:
+        return 'br'
+    if 'gzip' in encodings or '*' in encodings:
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESS_LEVEL)
+
+
+def compress_response(response, accept_encoding):
+    """Compress a buffered JSON/text response in place for the client's Accept-Encoding."""
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or 'Content-Encoding' in response.headers
+            or not (response.mimetype or '').startswith(COMPRESSIBLE_TYPES)):
+        return response
+
+    response.vary.add('Accept-Encoding')
+
+    body = response.get_data()
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None or len(body) < COMPRESS_MIN_SIZE:
+        return response
+
+    response.set_data(compress(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def _compress(response):
+    return compress_response(response, request.headers.get('Accept-Encoding'))
+
+
+def init_app(app):
+    app.after_request(_compress)
@@ -0,0 +1,332 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+from dotenv import load_dotenv
+from flask import g
+
+load_dotenv()
+
+HOST = os.getenv('HOST')
+DATABASE = os.getenv('DATABASE')
+DB_USER = os.getenv('DB_USER')
+PASSWORD = os.getenv('PASSWORD')
+
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))  # seconds to wait for a free connection
+DB_POOL_HEALTHCHECK_SECS = float(os.getenv('DB_POOL_HEALTHCHECK_SECS', 30))  # ping idle conns older than this
+SCHEMA_RECHECK_SECS = float(os.getenv('SCHEMA_RECHECK_SECS', 60))  # how long a missing migration goes unnoticed
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of psycopg2 connections.
+
+    Uses threading primitives only, so it is also safe under gevent once
+    the stdlib has been monkey-patched.
+    """
+
+    def __init__(self, maxconn, timeout, healthcheck_secs, **connect_kwargs):
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.healthcheck_secs = healthcheck_secs
+        self.connect_kwargs = connect_kwargs
+
+        self._idle = []  # list of (conn, last_used)
+        self._size = 0
+        self._cond = threading.Condition()
+
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+
+    def _connect(self):
+        conn = psycopg2.connect(**self.connect_kwargs)
+        with self._cond:
+            self._created += 1
+        return conn
+
+    def _is_healthy(self, conn, last_used):
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.healthcheck_secs:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        start = time.monotonic()
+        waited = False
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.maxconn:
+                    # Reserve the slot, connect outside the lock
+                    self._size += 1
+                    conn, last_used = None, None
+                    break
+
+                waited = True
+                remaining = self.timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(f'No database connection available after {self.timeout}s')
+                self._cond.wait(remaining)
+
+        try:
+            if conn is not None and not self._is_healthy(conn, last_used):
+                self._close(conn)
+                conn = None
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        elapsed = time.monotonic() - start
+        with self._cond:
+            self._checkouts += 1
+            if waited:
+                self._waits += 1
+            self._wait_time_total += elapsed
+            self._wait_time_max = max(self._wait_time_max, elapsed)
+        return conn
+
+    def putconn(self, conn, discard=False):
+        if not discard and not conn.closed:
+            try:
+                # Never hand out a connection with an open or failed transaction
+                if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+            except psycopg2.Error:
+                discard = True
+
+        with self._cond:
+            if discard or conn.closed:
+                self._size -= 1
+                self._close(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _close(self, conn):
+        with self._cond:
+            self._discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection for code running outside a Flask request."""
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self._size,
+                'max_size': self.maxconn,
+                'in_use': self._size - len(self._idle),
+                'idle': len(self._idle),
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'timeouts': self._timeouts,
+                'wait_time_avg_ms': round(1000 * self._wait_time_total / self._checkouts, 3) if self._checkouts else 0.0,
+                'wait_time_max_ms': round(1000 * self._wait_time_max, 3),
+                'connections_created': self._created,
+                'connections_discarded': self._discarded,
+            }
+
+    def closeall(self):
+        with self._cond:
+            for conn, _ in self._idle:
+                self._close(conn)
+                self._size -= 1
+            self._idle = []
+
+
+pool = ConnectionPool(
+    DB_POOL_MAX,
+    DB_POOL_TIMEOUT,
+    DB_POOL_HEALTHCHECK_SECS,
+    host=HOST,
+    database=DATABASE,
+    user=DB_USER,
+    password=PASSWORD
+)
+
+
+# FLASK REQUEST HOOKS
+
+def get_db():
+    """Return this request's connection, checking one out of the pool on first use."""
+    if 'db_conn' not in g:
+        g.db_conn = pool.getconn()
+    return g.db_conn
+
+
+def release_db(exc=None):
+    """Return this request's connection to the pool (safe to call more than once)."""
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        pool.putconn(conn)
+
+
+def init_app(app):
+    app.teardown_appcontext(release_db)
+
+
+# SCHEMA FEATURES
+#
+# Endpoints keep their pre-migration query until the migration that makes
+# the fast one possible has run. Whether it has is asked of the catalogs
+# here, once per process for a feature that's present and again every
+# SCHEMA_RECHECK_SECS for one that isn't, so running workers pick up a
+# migration without a restart.
+
+_schema_facts = {}  # name -> (value, checked_at)
+
+
+def schema_fact(conn, name, query, parse, final=lambda value: False):
+    """parse(rows of `query`), cached under `name`.
+
+    Re-read after SCHEMA_RECHECK_SECS unless final(value) says it can't
+    change any more.
+    """
+    cached = _schema_facts.get(name)
+    now = time.monotonic()
+    if cached is not None and (final(cached[0]) or now - cached[1] < SCHEMA_RECHECK_SECS):
+        return cached[0]
+
+    cursor = conn.cursor()
+    cursor.execute(query)
+    value = parse(cursor.fetchall())
+    cursor.close()
+    _schema_facts[name] = (value, now)
+    return value
+
+
+def has_feature(conn, name, query):
+    """True once `query` (returning one boolean) says feature `name` exists.
+
+    Migrations only ever add features, so True is kept for good.
+    """
+    return schema_fact(conn, name, query, lambda rows: bool(rows[0][0]), final=bool)
+
+
+def features():
+    """{name: available} for every feature checked so far, for /api/metrics."""
+    return {name: value for name, (value, _) in _schema_facts.items() if isinstance(value, bool)}
+
+
+# CATALOG VERSIONS
+
+def has_catalog_versions(conn):
+    """True once migration 003 has created catalog_versions."""
+    return has_feature(conn, 'catalog_versions', "SELECT to_regclass('catalog_versions') IS NOT NULL")
+
+
+def catalog_version(conn, name):
+    """Change counter for `name` from catalog_versions, or None before migration 003."""
+    if not has_catalog_versions(conn):
+        return None
+
+    cursor = conn.cursor()
+    cursor.execute('SELECT version FROM catalog_versions WHERE name = %s', (name,))
+    row = cursor.fetchone()
+    cursor.close()
+    return row[0] if row else 0
+
+
+def catalog_stamps(conn, names):
+    """{name: (version, updated_at)} for `names` in one query, or None before migration 003.
+
+    Names without a row yet are left out.
+    """
+    if not has_catalog_versions(conn):
+        return None
+
+    cursor = conn.cursor()
+    cursor.execute('SELECT name, version, updated_at FROM catalog_versions WHERE name = ANY(%s)', (list(names),))
+    stamps = {name: (version, updated_at) for name, version, updated_at in cursor.fetchall()}
+    cursor.close()
+    return stamps
+
+
+class CatalogIndex:
+    """Process-wide in-memory index built from the database.
+
+    Rebuilt after invalidate(), after ttl seconds, or when the `catalog`
+    version moves (checked at most every check_interval seconds), which
+    also catches the offline loaders and writes from other workers.
+    Readers keep using the previous index while a rebuild runs.
+    Subclasses set `catalog` and implement build(conn).
+    """
+
+    catalog = None
+
+    def __init__(self, ttl, check_interval=5):
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._index = None
+        self._version = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._loaded_at = 0.0
+
+    def _stale(self, conn):
+        now = time.monotonic()
+        if self._index is None or now - self._loaded_at > self.ttl:
+            return True
+        if now - self._checked_at > self.check_interval:
+            self._checked_at = now
+            return catalog_version(conn, self.catalog) != self._version
+        return False
+
+    def get(self, conn):
+        if self._stale(conn):
+            with self._lock:
+                # Another thread may have reloaded while we waited
+                if self._index is None or time.monotonic() - self._loaded_at > self.check_interval:
+                    self.load(conn)
+        return self._index
+
+    def load(self, conn):
+        version = catalog_version(conn, self.catalog)
+        self._index = self.build(conn)
+        self._version = version
+        self._loaded_at = self._checked_at = time.monotonic()
+        print(f"Loaded {type(self).__name__} index: {len(self._index)} bars, version {version}")
+
+    def build(self, conn):
+        raise NotImplementedError
@@ -0,0 +1,57 @@
+import os
+from datetime import datetime, time, timedelta
+
+import pytz
+
+import db
+
+EVENTS_TIMEZONE = os.getenv('EVENTS_TIMEZONE', 'America/New_York')  # bars' local time, as in scheduler.py
+NIGHT_START_HOUR = 12  # a night's events start from noon...
+NIGHT_END_HOUR = 5     # ...and run until 5am the next day
+
+WINDOWS = ('upcoming', 'tonight', 'weekend', 'all')
+
+
+def has_start_time(conn):
+    """True if events has a start_time column to window and page on."""
+    return db.has_feature(conn, 'events_start_time', """
+        SELECT EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'events' AND column_name = 'start_time'
+        )
+    """)
+
+
+def _night_of(now):
+    """Date of the night `now` falls in; before 5am that's yesterday."""
+    return now.date() - timedelta(days=1) if now.hour < NIGHT_END_HOUR else now.date()
+
+
+def _at(tz, day, hour):
+    return tz.localize(datetime.combine(day, time(hour)))
+
+
+def window_bounds(window, now=None):
+    """(start, end) for a named window in EVENTS_TIMEZONE; either may be None for open-ended.
+
+    'tonight' is noon to 5am of the current night, 'weekend' is Friday noon
+    to Monday 5am of this weekend (the coming one, Monday to Thursday).
+    Raises ValueError for an unknown window.
+    """
+    tz = pytz.timezone(EVENTS_TIMEZONE)
+    now = now.astimezone(tz) if now else datetime.now(tz)
+
+    if window == 'all':
+        return None, None
+    if window == 'upcoming':
+        return now, None
+
+    night = _night_of(now)
+    if window == 'tonight':
+        return _at(tz, night, NIGHT_START_HOUR), _at(tz, night + timedelta(days=1), NIGHT_END_HOUR)
+    if window == 'weekend':
+        # Friday is weekday 4; on Saturday and Sunday nights the weekend is under way
+        friday = night - timedelta(days=night.weekday() - 4) if night.weekday() >= 4 \
+            else night + timedelta(days=4 - night.weekday())
+        return _at(tz, friday, NIGHT_START_HOUR), _at(tz, friday + timedelta(days=3), NIGHT_END_HOUR)
+    raise ValueError(f"Unknown window: {window}")
@@ -0,0 +1,86 @@
+from collections import defaultdict
+
+from db import CatalogIndex
+
+FACETS = ('price_signs', 'neighborhood', 'music_genres', 'club_vibes')
+ARRAY_FACETS = {'music_genres', 'club_vibes'}
+
+
+def _bits(bitmap):
+    """Positions of the set bits in an int bitmap, ascending."""
+    return [i for i, bit in enumerate(reversed(bin(bitmap)[2:])) if bit == '1']
+
+
+class FacetIndex:
+    """Bitmap per facet value over every bar, using Python ints as bitsets.
+
+    Bars are numbered in the order given (name order, from load()), so ids
+    read off a result bitmap are already sorted the way /api/filter_bars
+    returns them. Values within a
+    facet are OR'd together and facets are AND'd, like the SQL it replaces.
+    """
+
+    def __init__(self, rows):
+        self.ids = [row['id'] for row in rows]
+        self.all = (1 << len(rows)) - 1
+        self.bitmaps = {facet: defaultdict(int) for facet in FACETS}
+
+        for bit, row in enumerate(rows):
+            for facet in FACETS:
+                values = row[facet] if facet in ARRAY_FACETS else [row[facet]]
+                for value in values or ():
+                    if value is not None:
+                        self.bitmaps[facet][value] |= 1 << bit
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _selected(self, facet, values):
+        if not values:
+            return None  # no filter on this facet
+        bitmap = 0
+        for value in values:
+            bitmap |= self.bitmaps[facet].get(value, 0)
+        return bitmap
+
+    def query(self, selections):
+        """(bar ids in name order, per-facet value counts) for {facet: [values]}.
+
+        Each facet's counts apply every other facet's selection but not its
+        own, i.e. how many bars ticking that value would add or leave.
+        """
+        masks = {facet: self._selected(facet, selections.get(facet)) for facet in FACETS}
+
+        result = self.all
+        for mask in masks.values():
+            if mask is not None:
+                result &= mask
+
+        counts = {}
+        for facet in FACETS:
+            base = self.all
+            for other, mask in masks.items():
+                if other != facet and mask is not None:
+                    base &= mask
+            counts[facet] = {
+                value: (base & bitmap).bit_count()
+                for value, bitmap in self.bitmaps[facet].items()
+                if base & bitmap
+            }
+
+        return [self.ids[i] for i in _bits(result)], counts
+
+
+class BarFacets(CatalogIndex):
+    """Process-wide FacetIndex over the bars table, versioned by 'bar_facets'
+    (which also catches load_tags.py)."""
+
+    catalog = 'bar_facets'
+
+    def build(self, conn):
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT id, name, {', '.join(FACETS)} FROM bars ORDER BY name, id")
+        columns = [col[0] for col in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        cursor.close()
+        return FacetIndex(rows)
@@ -0,0 +1,69 @@
+import decimal
+import os
+from datetime import date, time
+
+import orjson
+from flask.json.provider import DefaultJSONProvider, JSONProvider
+from werkzeug.http import http_date
+
+FAST_JSON = os.getenv('FAST_JSON', '1') == '1'  # set to 0 to go back to Flask's stdlib json provider
+
+_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS
+
+
+def _default(value):
+    # Same output as Flask's default provider for these types
+    if isinstance(value, date):  # datetime too
+        return http_date(value)
+    if isinstance(value, time):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if hasattr(value, '__html__'):
+        return str(value.__html__())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson.
+
+    RealDictRow and other dict/list subclasses are serialized natively; dates
+    are HTTP dates and Decimals strings, matching Flask's default provider.
+    Keys are sorted like the default too.
+
+    Two differences from the default: NaN and Infinity floats come out as
+    null (valid JSON) rather than the bare NaN/Infinity tokens the stdlib
+    writes, and a payload orjson can't encode at all (integers wider than
+    64 bits) is handed to the stdlib provider instead of failing.
+    """
+
+    mimetype = 'application/json'
+
+    def __init__(self, app):
+        super().__init__(app)
+        self._fallback = DefaultJSONProvider(app)
+
+    def _encode(self, obj):
+        try:
+            return orjson.dumps(obj, default=_default, option=_OPTIONS)
+        except orjson.JSONEncodeError:
+            # Raised before _default for ints orjson can't hold; the stdlib
+            # handles those and raises the same TypeError for anything else
+            return self._fallback.dumps(obj).encode()
+
+    def dumps(self, obj, **kwargs):
+        return self._encode(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = self._encode(obj)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def init_app(app):
+    if FAST_JSON:
+        app.json = OrjsonProvider(app)
+    print(f"JSON provider: {type(app.json).__name__}")
@@ -0,0 +1,170 @@
+import os
+
+import db
+import follow_counts
+
+# Fan-out-on-write "been there" feed (/api/following_been_there).
+#
+# A new been_there entry is copied into feed_items for each of the
+# author's followers in the same transaction, so opening the feed is one
+# index range scan instead of a join over everything everyone followed
+# has ever checked into. Authors with more than FEED_FANOUT_MAX followers
+# aren't copied anywhere; their followers pull those entries at read time
+# and merge them into the page (the hybrid path). When an author drops
+# back to FEED_FANOUT_MAX followers, catch_up() pushes their recent
+# entries, which were only ever pulled, to every follower. Feeds are
+# trimmed to FEED_MAX_LENGTH entries by scheduler.py.
+
+FEED_MAX_LENGTH = int(os.getenv('FEED_MAX_LENGTH', 500))  # entries kept per feed by trim()
+FEED_FANOUT_MAX = int(os.getenv('FEED_FANOUT_MAX', 5000))  # authors with more followers are pulled at read time
+FEED_BACKFILL = int(os.getenv('FEED_BACKFILL', 50))  # recent entries copied into a feed on a new follow
+
+
+def has_feed(conn):
+    """True once migrations/012 has created feed_items (and 011's counters)."""
+    return (db.has_feature(conn, 'feed_items', "SELECT to_regclass('feed_items') IS NOT NULL")
+            and follow_counts.has_follow_counters(conn))
+
+
+def fan_out(cursor, author_id, entry_id):
+    """Copy a new been_there entry into the author's followers' feeds.
+
+    Runs on the caller's cursor so it commits with the entry itself.
+    """
+    cursor.execute("""
+        INSERT INTO feed_items (user_id, entry_id, author_id)
+        SELECT f.follower_id, %(entry_id)s, %(author_id)s
+        FROM follows f
+        JOIN users a ON a.id = f.followed_id
+        WHERE f.followed_id = %(author_id)s AND a.follower_count <= %(fanout_max)s
+        ON CONFLICT DO NOTHING
+    """, {'entry_id': entry_id, 'author_id': author_id, 'fanout_max': FEED_FANOUT_MAX})
+
+
+def backfill(cursor, follower_id, author_id):
+    """Seed a new follower's feed with the author's recent entries."""
+    cursor.execute("""
+        INSERT INTO feed_items (user_id, entry_id, author_id)
+        SELECT %(follower_id)s, bt.id, bt.user_id
+        FROM been_there bt
+        JOIN users a ON a.id = bt.user_id
+        WHERE bt.user_id = %(author_id)s AND a.follower_count <= %(fanout_max)s
+        ORDER BY bt.id DESC
+        LIMIT %(backfill)s
+        ON CONFLICT DO NOTHING
+    """, {'follower_id': follower_id, 'author_id': author_id,
+          'fanout_max': FEED_FANOUT_MAX, 'backfill': FEED_BACKFILL})
+
+
+def catch_up(cursor, author_id):
+    """Push an author's recent entries to all their followers, if the
+    author has just dropped back under the pull threshold.
+
+    Call after deleting one of the author's follows, on the same cursor.
+    Entries posted while the author was pulled at read time exist in no
+    feed, so without this they'd vanish from followers' feeds.
+    """
+    cursor.execute("""
+        INSERT INTO feed_items (user_id, entry_id, author_id)
+        SELECT f.follower_id, recent.id, %(author_id)s
+        FROM users a
+        CROSS JOIN LATERAL (
+            SELECT bt.id FROM been_there bt
+            WHERE bt.user_id = a.id
+            ORDER BY bt.id DESC
+            LIMIT %(backfill)s
+        ) recent
+        JOIN follows f ON f.followed_id = a.id
+        WHERE a.id = %(author_id)s AND a.follower_count = %(fanout_max)s
+        ON CONFLICT DO NOTHING
+    """, {'author_id': author_id, 'fanout_max': FEED_FANOUT_MAX, 'backfill': FEED_BACKFILL})
+
+
+# Newest first, keyset on the been_there id. Pushed entries are rechecked
+# against follows, so unfollowed (and blocked) authors drop out at once.
+# The pull branch reads at most one page per followed popular author from
+# been_there (user_id, id). UNION keeps entries an author pushed before
+# crossing FEED_FANOUT_MAX from showing up twice.
+PAGE_SQL = """
+    WITH page AS (
+        (SELECT fi.entry_id
+         FROM feed_items fi
+         JOIN follows f ON f.follower_id = fi.user_id AND f.followed_id = fi.author_id
+         WHERE fi.user_id = %(user_id)s AND fi.entry_id < %(before)s
+         ORDER BY fi.entry_id DESC
+         LIMIT %(limit)s)
+        UNION
+        (SELECT recent.id
+         FROM follows f
+         JOIN users a ON a.id = f.followed_id AND a.follower_count > %(fanout_max)s
+         CROSS JOIN LATERAL (
+             SELECT bt.id FROM been_there bt
+             WHERE bt.user_id = f.followed_id AND bt.id < %(before)s
+             ORDER BY bt.id DESC
+             LIMIT %(limit)s
+         ) recent
+         WHERE f.follower_id = %(user_id)s)
+    )
+    SELECT bt.id, bt.user_id, bt.bar_id, bt.rating, bt.comments, u.name as user_name, b.name as bar_name
+    FROM page
+    JOIN been_there bt ON bt.id = page.entry_id
+    JOIN users u ON bt.user_id = u.id
+    JOIN bars b ON bt.bar_id = b.id
+    ORDER BY bt.id DESC
+    LIMIT %(limit)s
+"""
+
+# Before migrations/012: the original pull over every followed user, paged
+PULL_SQL = """
+    SELECT bt.id, bt.user_id, bt.bar_id, bt.rating, bt.comments, u.name as user_name, b.name as bar_name
+    FROM follows f
+    JOIN been_there bt ON bt.user_id = f.followed_id
+    JOIN users u ON bt.user_id = u.id
+    JOIN bars b ON bt.bar_id = b.id
+    WHERE f.follower_id = %(user_id)s AND bt.id < %(before)s
+    ORDER BY bt.id DESC
+    LIMIT %(limit)s
+"""
+
+
+def load_page(conn, cursor, user_id, limit, before=None):
+    """One page of the feed for `user_id`, entries older than `before` (an id)."""
+    params = {
+        'user_id': user_id,
+        'before': before if before is not None else 2 ** 63 - 1,
+        'limit': limit,
+        'fanout_max': FEED_FANOUT_MAX,
+    }
+    cursor.execute(PAGE_SQL if has_feed(conn) else PULL_SQL, params)
+    return cursor.fetchall()
+
+
+def trim(conn):
+    """Cut every feed to FEED_MAX_LENGTH and drop entries that no longer show.
+
+    Returns the number of rows removed.
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        DELETE FROM feed_items fi
+        USING (
+            SELECT user_id, entry_id,
+                   row_number() OVER (PARTITION BY user_id ORDER BY entry_id DESC) AS position
+            FROM feed_items
+        ) ranked
+        WHERE ranked.user_id = fi.user_id AND ranked.entry_id = fi.entry_id
+          AND ranked.position > %s
+    """, (FEED_MAX_LENGTH,))
+    removed = cursor.rowcount
+    cursor.execute("""
+        DELETE FROM feed_items fi
+        WHERE NOT EXISTS (
+            SELECT 1 FROM follows f WHERE f.follower_id = fi.user_id AND f.followed_id = fi.author_id
+        ) OR NOT EXISTS (
+            SELECT 1 FROM been_there bt WHERE bt.id = fi.entry_id
+        )
+    """)
+    removed += cursor.rowcount
+    conn.commit()
+    cursor.close()
+    return removed
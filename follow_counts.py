@@ -0,0 +1,82 @@
+import db
+
+# Follower / following counts.
+#
+# migrations/011_follow_counts.sql keeps users.follower_count and
+# users.following_count in step with follows from a trigger, in the same
+# transaction as the follow, unfollow or block that changed them. Profile
+# views and list screens read the columns instead of counting follows.
+# reconcile() repairs any drift (rows written with the trigger disabled,
+# restores); scheduler.py runs it nightly.
+
+FOLLOW_COUNTS_MAX_IDS = 200  # user ids per batched lookup
+
+
+def has_follow_counters(conn):
+    """True once migrations/011 has added the counter columns to users."""
+    return db.has_feature(conn, 'follow_counters', """
+        SELECT count(*) = 2 FROM information_schema.columns
+        WHERE table_name = 'users' AND column_name IN ('follower_count', 'following_count')
+    """)
+
+
+def parse_ids(value):
+    """User ids from a comma separated query parameter, deduplicated in order.
+
+    Raises ValueError for a non-integer id or more than FOLLOW_COUNTS_MAX_IDS.
+    """
+    try:
+        ids = list(dict.fromkeys(int(part) for part in (value or '').split(',') if part.strip()))
+    except ValueError:
+        raise ValueError("ids must be comma separated integers")
+    if len(ids) > FOLLOW_COUNTS_MAX_IDS:
+        raise ValueError(f"At most {FOLLOW_COUNTS_MAX_IDS} ids per request")
+    return ids
+
+
+def counts_for_ids(conn, ids):
+    """{user_id: (follower_count, following_count)} for the users that exist."""
+    if not ids:
+        return {}
+    cursor = conn.cursor()
+    if has_follow_counters(conn):
+        cursor.execute("""
+            SELECT id, follower_count, following_count FROM users WHERE id = ANY(%s)
+        """, (ids,))
+    else:
+        cursor.execute("""
+            SELECT u.id,
+                   (SELECT COUNT(*) FROM follows WHERE followed_id = u.id),
+                   (SELECT COUNT(*) FROM follows WHERE follower_id = u.id)
+            FROM users u
+            WHERE u.id = ANY(%s)
+        """, (ids,))
+    counts = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+    cursor.close()
+    return counts
+
+
+def reconcile(conn):
+    """Reset every drifted counter from follows; returns the users repaired."""
+    cursor = conn.cursor()
+    cursor.execute("""
+        UPDATE users u
+        SET follower_count = actual.followers,
+            following_count = actual.following
+        FROM (
+            SELECT u.id,
+                   coalesce(followers.n, 0) AS followers,
+                   coalesce(following.n, 0) AS following
+            FROM users u
+            LEFT JOIN (SELECT followed_id AS id, COUNT(*) AS n FROM follows GROUP BY followed_id) followers
+                ON followers.id = u.id
+            LEFT JOIN (SELECT follower_id AS id, COUNT(*) AS n FROM follows GROUP BY follower_id) following
+                ON following.id = u.id
+        ) actual
+        WHERE actual.id = u.id
+          AND (u.follower_count, u.following_count) IS DISTINCT FROM (actual.followers, actual.following)
+    """)
+    repaired = cursor.rowcount
+    conn.commit()
+    cursor.close()
+    return repaired
@@ -0,0 +1,192 @@
+import math
+from collections import defaultdict
+
+import numpy as np
+
+import db
+
+EARTH_RADIUS_MILES = 3959
+EARTH_RADIUS_METERS = 6371e3
+METERS_PER_DEGREE_LAT = 111320
+METERS_PER_MILE = 1609.344
+
+
+def has_earthdistance(conn):
+    """True if the cube/earthdistance extensions (and their GiST index path) are installed."""
+    return db.has_feature(conn, 'earthdistance', "SELECT count(*) = 2 FROM pg_extension WHERE extname IN ('cube', 'earthdistance')")
+
+
+# SQL BUILDERS FOR bars b
+#
+# Each returns (sql, params) so callers can splice them into a larger query.
+# The spatial variants are written against the GiST expression index on
+# ll_to_earth(latitude, longitude) from migrations/001_bars_earthdistance.sql.
+
+def distance_sql(latitude, longitude, spatial):
+    """Distance in miles from (latitude, longitude) to b."""
+    if spatial:
+        return (
+            f"earth_distance(ll_to_earth(b.latitude, b.longitude), ll_to_earth(%s, %s)) / {METERS_PER_MILE}",
+            [latitude, longitude]
+        )
+    return (
+        f"""{EARTH_RADIUS_MILES} * acos(
+            cos(radians(%s)) * cos(radians(b.latitude)) *
+            cos(radians(b.longitude) - radians(%s)) +
+            sin(radians(%s)) * sin(radians(b.latitude))
+        )""",
+        [latitude, longitude, latitude]
+    )
+
+
+def within_sql(latitude, longitude, miles, spatial):
+    """b lies within `miles` of (latitude, longitude)."""
+    distance, params = distance_sql(latitude, longitude, spatial)
+    if spatial:
+        # earth_box is an indexable bounding-box prefilter; the exact
+        # distance check trims the corners.
+        return (
+            f"(earth_box(ll_to_earth(%s, %s), %s) @> ll_to_earth(b.latitude, b.longitude) AND {distance} < %s)",
+            [latitude, longitude, miles * METERS_PER_MILE] + params + [miles]
+        )
+    return f"{distance} < %s", params + [miles]
+
+
+def nearest_order_sql(latitude, longitude, spatial):
+    """Expression that sorts bars nearest-first.
+
+    Spatial values are chord lengths rather than miles, so compare them only
+    with each other (e.g. in a keyset cursor), never with distance_sql().
+    """
+    if spatial:
+        # <-> on cube is answered by the GiST index as a KNN scan; the chord
+        # distance it compares orders identically to great-circle distance.
+        return "ll_to_earth(b.latitude, b.longitude) <-> ll_to_earth(%s, %s)", [latitude, longitude]
+    return distance_sql(latitude, longitude, spatial)
+
+
+# IN-PROCESS GRID INDEX
+
+def haversine_np(lat1, lon1, lat2, lon2):
+    """Vectorized great-circle distance in meters; arguments broadcast as NumPy arrays."""
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    delta_phi = phi2 - phi1
+    delta_lambda = np.radians(lon2) - np.radians(lon1)
+    a = np.sin(delta_phi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(delta_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class GridIndex:
+    """Uniform lat/lon grid over rows with latitude/longitude keys.
+
+    A radius query only probes the cells its bounding box overlaps and then
+    measures the candidates in one vectorized pass. Rows without coordinates
+    are skipped.
+    """
+
+    def __init__(self, rows, cell_meters=50):
+        self.rows = [row for row in rows if row['latitude'] is not None and row['longitude'] is not None]
+        self.lats = np.array([float(row['latitude']) for row in self.rows], dtype=float)
+        self.lons = np.array([float(row['longitude']) for row in self.rows], dtype=float)
+
+        # Cells are a fixed number of degrees; the longitude width is sized
+        # for the data's mean latitude, and queries widen their probe as needed.
+        ref_lat = float(self.lats.mean()) if self.rows else 0.0
+        self.cell_lat = cell_meters / METERS_PER_DEGREE_LAT
+        self.cell_lon = cell_meters / (METERS_PER_DEGREE_LAT * max(math.cos(math.radians(ref_lat)), 0.01))
+
+        cells = defaultdict(list)
+        ys = np.floor(self.lats / self.cell_lat).astype(int)
+        xs = np.floor(self.lons / self.cell_lon).astype(int)
+        for i, key in enumerate(zip(ys.tolist(), xs.tolist())):
+            cells[key].append(i)
+        self.cells = {key: np.array(idx, dtype=np.intp) for key, idx in cells.items()}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _candidates(self, latitude, longitude, radius_m):
+        dlat = radius_m / METERS_PER_DEGREE_LAT
+        dlon = radius_m / (METERS_PER_DEGREE_LAT * max(math.cos(math.radians(latitude)), 0.01))
+        y0 = math.floor((latitude - dlat) / self.cell_lat)
+        y1 = math.floor((latitude + dlat) / self.cell_lat)
+        x0 = math.floor((longitude - dlon) / self.cell_lon)
+        x1 = math.floor((longitude + dlon) / self.cell_lon)
+
+        found = [
+            self.cells[(y, x)]
+            for y in range(y0, y1 + 1)
+            for x in range(x0, x1 + 1)
+            if (y, x) in self.cells
+        ]
+        if not found:
+            return np.empty(0, dtype=np.intp)
+        return np.concatenate(found)
+
+    def within(self, latitude, longitude, radius_m):
+        """Rows within radius_m of the point as (row, distance_m), nearest first."""
+        idx = self._candidates(latitude, longitude, radius_m)
+        if not len(idx):
+            return []
+        distances = haversine_np(latitude, longitude, self.lats[idx], self.lons[idx])
+        keep = distances < radius_m
+        idx, distances = idx[keep], distances[keep]
+        order = np.argsort(distances, kind='stable')
+        return [(self.rows[i], float(d)) for i, d in zip(idx[order].tolist(), distances[order].tolist())]
+
+    def nearest_many(self, points, radius_m):
+        """Closest row within radius_m for each (latitude, longitude) in points.
+
+        Returns a list aligned with points of (row, distance_m) or None. All
+        candidate pairs are measured in a single vectorized call.
+        """
+        results = [None] * len(points)
+        point_idx, row_idx = [], []
+        for p, (latitude, longitude) in enumerate(points):
+            if latitude is None or longitude is None:
+                continue
+            idx = self._candidates(float(latitude), float(longitude), radius_m)
+            if len(idx):
+                point_idx.append(np.full(len(idx), p, dtype=np.intp))
+                row_idx.append(idx)
+        if not point_idx:
+            return results
+
+        point_idx = np.concatenate(point_idx)
+        row_idx = np.concatenate(row_idx)
+        point_lats = np.array([np.nan if lat is None else float(lat) for lat, _ in points])
+        point_lons = np.array([np.nan if lon is None else float(lon) for _, lon in points])
+        distances = haversine_np(point_lats[point_idx], point_lons[point_idx], self.lats[row_idx], self.lons[row_idx])
+
+        keep = distances < radius_m
+        point_idx, row_idx, distances = point_idx[keep], row_idx[keep], distances[keep]
+
+        # Sort by (point, distance) and take the first hit per point
+        order = np.lexsort((distances, point_idx))
+        point_idx, row_idx, distances = point_idx[order], row_idx[order], distances[order]
+        first = np.ones(len(point_idx), dtype=bool)
+        first[1:] = point_idx[1:] != point_idx[:-1]
+        for p, i, d in zip(point_idx[first].tolist(), row_idx[first].tolist(), distances[first].tolist()):
+            results[p] = (self.rows[i], d)
+        return results
+
+
+class BarLocations(db.CatalogIndex):
+    """Process-wide GridIndex over bar coordinates, versioned by
+    'bar_locations' (migrations/016), so bars added or moved by the
+    offline loaders show up without a restart."""
+
+    catalog = 'bar_locations'
+
+    def __init__(self, ttl, cell_meters=50, check_interval=5):
+        super().__init__(ttl, check_interval)
+        self.cell_meters = cell_meters
+
+    def build(self, conn):
+        cursor = conn.cursor()
+        cursor.execute('SELECT id, name, address, latitude, longitude FROM bars')
+        columns = [col[0] for col in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        cursor.close()
+        return GridIndex(rows, self.cell_meters)
@@ -0,0 +1,100 @@
+import functools
+import hashlib
+import os
+import time
+
+from flask import request, make_response
+from werkzeug.http import is_resource_modified
+
+import db
+
+CATALOG_CHECK_INTERVAL = float(os.getenv('CATALOG_CHECK_INTERVAL', 2))  # seconds a catalog version is trusted before re-reading it
+
+
+class CatalogStamps:
+    """Recently read catalog_versions rows.
+
+    Versions are re-read at most every check_interval seconds, so a client
+    revalidating an unchanged resource gets its 304 without a database
+    round trip (or a pool checkout) most of the time.
+    """
+
+    def __init__(self, check_interval):
+        self.check_interval = check_interval
+        self._stamps = {}  # name -> (version, updated_at, checked_at)
+
+    def get(self, names):
+        """(versions, last_modified) for `names`, or None before migration 003."""
+        now = time.monotonic()
+        cached = [self._stamps.get(name) for name in names]
+        if any(stamp is None or now - stamp[2] > self.check_interval for stamp in cached):
+            stamps = db.catalog_stamps(db.get_db(), names)
+            if stamps is None:
+                return None
+            for name in names:
+                version, updated_at = stamps.get(name, (0, None))
+                self._stamps[name] = (version, updated_at, now)
+            cached = [self._stamps[name] for name in names]
+
+        versions = tuple(stamp[0] for stamp in cached)
+        modified = [stamp[1] for stamp in cached if stamp[1] is not None]
+        return versions, max(modified) if modified else None
+
+    def clear(self):
+        self._stamps.clear()
+
+
+stamps = CatalogStamps(CATALOG_CHECK_INTERVAL)
+
+
+def time_bucket(seconds):
+    """Which `seconds`-long slice of wall-clock time this is."""
+    return int(time.time() // seconds)
+
+
+def _etag(path, versions):
+    return hashlib.sha1(f"{path}|{versions}".encode()).hexdigest()[:20]
+
+
+def conditional(*catalogs, cache_control='no-cache', bucket=None):
+    """Add a weak ETag, Last-Modified and Cache-Control to a GET view and answer 304s.
+
+    With catalogs, the ETag is derived from the URL and those catalog
+    versions, so If-None-Match / If-Modified-Since are checked before the
+    view runs. Without catalogs (or before migration 003) the ETag is a hash
+    of the body, which still saves resending it. ETags are weak because the
+    body may be gzip/brotli encoded on the way out.
+
+    Views whose output depends on the clock (e.g. upcoming events) pass
+    `bucket` seconds: their ETags roll over that often and If-Modified-Since
+    is ignored.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            stamp = stamps.get(catalogs) if catalogs else None
+            if stamp is not None:
+                versions = stamp[0] + (time_bucket(bucket),) if bucket else stamp[0]
+                etag = _etag(request.full_path, versions)
+                last_modified = None if bucket else stamp[1]
+                if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                    response = make_response('', 304)
+                    response.set_etag(etag, weak=True)
+                    response.last_modified = last_modified
+                    response.headers['Cache-Control'] = cache_control
+                    return response
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+
+            if stamp is not None:
+                response.set_etag(etag, weak=True)
+                response.last_modified = last_modified
+            else:
+                response.add_etag(weak=True)
+            response.headers['Cache-Control'] = cache_control
+            return response.make_conditional(request)
+
+        return wrapper
+    return decorator
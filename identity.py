@@ -0,0 +1,61 @@
+import threading
+
+from flask import g
+
+import httpcache
+from cache import LRUCache
+
+
+class UserIds:
+    """email -> users.id, cached per request (flask.g) and per process (LRU).
+
+    Emails never change in place, so entries only go stale when a user is
+    deleted. delete_user() invalidates its own worker directly; the
+    'user_ids' catalog version (migrations/010) tells the other workers,
+    checked at most every CATALOG_CHECK_INTERVAL seconds. Unknown emails
+    aren't cached, so a sign-up is visible immediately.
+    """
+
+    def __init__(self, maxsize):
+        self._cache = LRUCache(maxsize)
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _check_version(self):
+        stamp = httpcache.stamps.get(('user_ids',))
+        version = stamp[0] if stamp else None
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._cache.clear()
+                    self._version = version
+
+    def get(self, conn, email):
+        """The user id for `email`, or None if there's no such user."""
+        if not email:
+            return None
+
+        per_request = g.setdefault('user_ids', {})
+        if email in per_request:
+            return per_request[email]
+
+        self._check_version()
+        user_id = self._cache.get(email)
+        if user_id is None:
+            cursor = conn.cursor()
+            cursor.execute('SELECT id FROM users WHERE email = %s', (email,))
+            row = cursor.fetchone()
+            cursor.close()
+            user_id = row[0] if row else None
+            if user_id is not None:
+                self._cache.set(email, user_id)
+
+        per_request[email] = user_id
+        return user_id
+
+    def invalidate(self, email):
+        self._cache.delete(email)
+        g.get('user_ids', {}).pop(email, None)
+
+    def stats(self):
+        return self._cache.stats()
@@ -0,0 +1,36 @@
+import db
+
+# Ranked song request queues.
+#
+# 'top' is upvotes - downvotes. 'hot' also decays with age without ever
+# being recomputed: log10 of the score plus the request time in units of
+# HOT_SECONDS, so a request HOT_SECONDS newer outranks one with ten times
+# the votes. Both are kept in columns by the trigger in
+# migrations/009_song_requests_score.sql and served from its indexes.
+
+ORDERS = ('recent', 'top', 'hot')
+HOT_SECONDS = 3600  # must match song_request_hot() in migrations/009
+
+
+def has_score_columns(conn):
+    """True once migrations/009 has added song_requests.score and .hot."""
+    return db.has_feature(conn, 'song_request_scores', """
+        SELECT count(*) = 2 FROM information_schema.columns
+        WHERE table_name = 'song_requests' AND column_name IN ('score', 'hot')
+    """)
+
+
+def rank_sql(order, indexed):
+    """Sort key expression for song_requests sr, highest first.
+
+    Raises ValueError for an order that isn't ranked.
+    """
+    if order == 'top':
+        return "sr.score" if indexed else "(coalesce(sr.upvotes, 0) - coalesce(sr.downvotes, 0))"
+    if order == 'hot':
+        if indexed:
+            return "sr.hot"
+        score = "(coalesce(sr.upvotes, 0) - coalesce(sr.downvotes, 0))"
+        return (f"(sign({score}) * log(greatest(abs({score}), 1))"
+                f" + extract(epoch FROM sr.request_time) / {HOT_SECONDS})")
+    raise ValueError(f"Unknown order: {order}")
@@ -0,0 +1,234 @@
+import json
+import os
+import queue
+import select
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from datetime import date, datetime
+from decimal import Decimal
+
+import orjson
+import psycopg2
+
+import db
+
+QUEUE_BACKLOG = int(os.getenv('QUEUE_BACKLOG', 256))  # deltas kept per bar for reconnecting clients
+QUEUE_SUBSCRIBER_BUFFER = int(os.getenv('QUEUE_SUBSCRIBER_BUFFER', 1000))  # deltas a slow client may fall behind by
+QUEUE_HEARTBEAT = float(os.getenv('QUEUE_HEARTBEAT', 15))  # seconds between keep-alive comments
+
+NOTIFY_CHANNEL = 'song_requests'
+
+
+def has_queue_notify(conn):
+    """True once migrations/008 has added the NOTIFY trigger on song_requests."""
+    return db.has_feature(conn, 'song_requests_notify', "SELECT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'song_requests_notify')")
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value):
+    """JSON for the stream. Timestamps are ISO 8601, as row_to_json() writes them."""
+    return orjson.dumps(value, default=_default).decode()
+
+
+def plain_row(row):
+    """A song_requests row shaped like the trigger's row_to_json() output."""
+    return {key: value.isoformat() if isinstance(value, (date, datetime)) else value for key, value in row.items()}
+
+
+def matches(row, event_id, today):
+    """Same filter as GET /api/song_requests/<bar_id> for a full row."""
+    if event_id is None:
+        return row.get('event_id') is None
+    if row.get('event_id') is None:
+        return str(row.get('request_time', ''))[:10] == today.isoformat()
+    return str(row['event_id']) == str(event_id)
+
+
+class QueueHub:
+    """In-process pub/sub of song request deltas, one channel per bar.
+
+    Every delta gets a sequence number, shown to clients as the SSE id
+    '<epoch>-<seq>'. The last QUEUE_BACKLOG deltas per bar are kept so a
+    client reconnecting with Last-Event-ID gets only what it missed. If
+    the deltas it needs are gone, or it last talked to another worker, it
+    gets a fresh snapshot instead.
+    """
+
+    def __init__(self, backlog=QUEUE_BACKLOG):
+        self.epoch = uuid.uuid4().hex[:8]
+        self._seq = 0
+        self._backlog = defaultdict(lambda: deque(maxlen=backlog))  # bar_id -> deque of (seq, delta)
+        self._subscribers = defaultdict(set)  # bar_id -> set of queue.Queue
+        self._lock = threading.Lock()
+
+    def event_id(self, seq):
+        return f'{self.epoch}-{seq}'
+
+    def publish(self, bar_id, delta):
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            self._backlog[bar_id].append((seq, delta))
+            subscribers = list(self._subscribers[bar_id])
+
+        for subscriber in subscribers:
+            if subscriber.qsize() >= QUEUE_SUBSCRIBER_BUFFER:
+                # Too far behind; end its stream so the client reconnects
+                # for a snapshot
+                self.unsubscribe(bar_id, subscriber)
+                subscriber.put(None)
+            else:
+                subscriber.put((seq, delta))
+
+    def subscribe(self, bar_id, last_event_id=None):
+        """(subscriber queue, replay) where replay is None when a snapshot is needed."""
+        subscriber = queue.Queue()
+        with self._lock:
+            self._subscribers[bar_id].add(subscriber)
+            return subscriber, self._replay(bar_id, last_event_id)
+
+    def _replay(self, bar_id, last_event_id):
+        epoch, _, seq = (last_event_id or '').partition('-')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        backlog = self._backlog[bar_id]
+        # A full backlog may have dropped deltas the client never saw
+        if len(backlog) == backlog.maxlen and backlog[0][0] > seq + 1:
+            return None
+        return [(s, delta) for s, delta in backlog if s > seq]
+
+    def unsubscribe(self, bar_id, subscriber):
+        with self._lock:
+            self._subscribers[bar_id].discard(subscriber)
+
+    def current_seq(self):
+        with self._lock:
+            return self._seq
+
+    def stats(self):
+        with self._lock:
+            return {
+                'epoch': self.epoch,
+                'seq': self._seq,
+                'subscribers': sum(len(s) for s in self._subscribers.values()),
+            }
+
+
+class NotifyListener(threading.Thread):
+    """Feeds the hub from LISTEN song_requests on a dedicated connection.
+
+    Each change reaches every worker once, with the row in the payload, so
+    pushing it to any number of clients costs no further queries.
+    """
+
+    def __init__(self, hub):
+        super().__init__(name='song-queue-listener', daemon=True)
+        self.hub = hub
+
+    def run(self):
+        while True:
+            try:
+                self._listen()
+            except Exception as e:
+                print(f"Song queue listener failed, reconnecting: {e}")
+                time.sleep(5)
+
+    def _listen(self):
+        conn = psycopg2.connect(**db.pool.connect_kwargs)
+        conn.autocommit = True
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'LISTEN {NOTIFY_CHANNEL}')
+            cursor.close()
+            print("Song queue listener connected")
+            while True:
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    delta = json.loads(notify.payload)
+                    self.hub.publish(delta['request']['bar_id'], delta)
+        finally:
+            conn.close()
+
+
+class SongQueue:
+    """Live song request queues: the hub plus however it is fed.
+
+    With the NOTIFY trigger installed, deltas come from the listener and
+    cover every worker and writer. Without it the write endpoints publish
+    their own changes, which reach clients of the same worker only.
+    """
+
+    def __init__(self):
+        self.hub = QueueHub()
+        self._listener = None
+        self._lock = threading.Lock()
+
+    def start(self, conn):
+        """Start the listener on first use; returns whether NOTIFY feeds the hub."""
+        if not has_queue_notify(conn):
+            return False
+        if self._listener is None:
+            with self._lock:
+                if self._listener is None:
+                    self._listener = NotifyListener(self.hub)
+                    self._listener.start()
+        return True
+
+    def changed(self, conn, op, row):
+        """Publish a change made by this worker, unless the trigger already will."""
+        if not has_queue_notify(conn):
+            self.hub.publish(row['bar_id'], {'op': op, 'request': plain_row(row)})
+
+    def stream(self, bar_id, event_id, last_event_id, load_snapshot):
+        """SSE lines for a client: a snapshot (or missed deltas), then deltas as they happen.
+
+        `load_snapshot()` returns the current rows. It runs after
+        subscribing, so no change can fall between it and the first delta.
+        Deltas carry whole rows and apply idempotently, so any that overlap
+        the snapshot do no harm.
+        """
+        subscriber, replay = self.hub.subscribe(bar_id, last_event_id)
+        today = date.today()
+
+        def relevant(delta):
+            # Deletes notified before migrations/017 only say which request
+            request = delta['request']
+            return 'event_id' not in request or matches(request, event_id, today)
+
+        try:
+            if replay is None:
+                seq = self.hub.current_seq()
+                rows = [plain_row(row) for row in load_snapshot()]
+                yield f"id: {self.hub.event_id(seq)}\nevent: snapshot\ndata: {dumps(rows)}\n\n"
+            else:
+                for seq, delta in replay:
+                    if relevant(delta):
+                        yield f"id: {self.hub.event_id(seq)}\nevent: delta\ndata: {dumps(delta)}\n\n"
+
+            while True:
+                try:
+                    item = subscriber.get(timeout=QUEUE_HEARTBEAT)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if item is None:
+                    return
+                seq, delta = item
+                if relevant(delta):
+                    yield f"id: {self.hub.event_id(seq)}\nevent: delta\ndata: {dumps(delta)}\n\n"
+        finally:
+            self.hub.unsubscribe(bar_id, subscriber)
+
+
+song_queue = SongQueue()
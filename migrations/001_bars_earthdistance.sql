@@ -0,0 +1,11 @@
+-- Spatial index for /api/bars distance filtering and nearest-first ordering.
+-- app.py detects these extensions at runtime and falls back to the plain
+-- haversine expression when they are missing.
+
+CREATE EXTENSION IF NOT EXISTS cube;
+CREATE EXTENSION IF NOT EXISTS earthdistance;
+
+CREATE INDEX IF NOT EXISTS bars_earth_idx
+    ON bars USING gist (ll_to_earth(latitude, longitude));
+
+ANALYZE bars;
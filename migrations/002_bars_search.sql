@@ -0,0 +1,93 @@
+-- Weighted search documents for the /api/bars search box.
+--
+--   search_document  name (A) > neighborhood, address (B) > genres, vibes (C) > description (D)
+--   songs_document   names and artists of the bar's songs, ranked below everything above
+--
+-- They live in bar_search, one row per bar, so SELECT * FROM bars doesn't
+-- start shipping tsvectors. Triggers on bars and songs keep them current;
+-- both are GIN-indexed, and a trigram index on bars.name covers substring
+-- matches. app.py checks for bar_search at runtime and keeps the old ILIKE
+-- query when it's missing.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Same folding as bar_names.normalize_name(): apostrophes dropped, anything
+-- else that isn't [0-9a-z] becomes a word break
+CREATE OR REPLACE FUNCTION search_normalize(value text) RETURNS text AS $$
+    SELECT regexp_replace(lower(translate(coalesce(value, ''), '’‘''', '')), '[^0-9a-z]+', ' ', 'g')
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE TABLE IF NOT EXISTS bar_search (
+    bar_id bigint PRIMARY KEY REFERENCES bars(id) ON DELETE CASCADE,
+    search_document tsvector NOT NULL DEFAULT ''::tsvector,
+    songs_document tsvector NOT NULL DEFAULT ''::tsvector
+);
+
+CREATE OR REPLACE FUNCTION refresh_search_document(target_bar_id bigint) RETURNS void AS $$
+    INSERT INTO bar_search (bar_id, search_document)
+    SELECT b.id,
+           setweight(to_tsvector('simple', search_normalize(b.name)), 'A') ||
+           setweight(to_tsvector('simple', search_normalize(b.neighborhood) || ' ' || search_normalize(b.address)), 'B') ||
+           setweight(to_tsvector('simple', search_normalize(
+               array_to_string(coalesce(b.music_genres, '{}') || coalesce(b.club_vibes, '{}'), ' ')
+           )), 'C') ||
+           setweight(to_tsvector('simple', search_normalize(b.description)), 'D')
+    FROM bars b
+    WHERE b.id = target_bar_id
+    ON CONFLICT (bar_id) DO UPDATE SET search_document = EXCLUDED.search_document
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION refresh_songs_document(target_bar_id bigint) RETURNS void AS $$
+    INSERT INTO bar_search (bar_id, songs_document)
+    SELECT b.id, coalesce((
+               SELECT to_tsvector('simple', search_normalize(string_agg(s.name || ' ' || coalesce(s.artist, ''), ' ')))
+               FROM songs s
+               WHERE s.bar_id = b.id
+           ), ''::tsvector)
+    FROM bars b
+    WHERE b.id = target_bar_id
+    ON CONFLICT (bar_id) DO UPDATE SET songs_document = EXCLUDED.songs_document
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION bars_search_document() RETURNS trigger AS $$
+BEGIN
+    PERFORM refresh_search_document(NEW.id);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS bars_search_document ON bars;
+CREATE TRIGGER bars_search_document
+    AFTER INSERT OR UPDATE OF name, neighborhood, address, music_genres, club_vibes, description ON bars
+    FOR EACH ROW EXECUTE FUNCTION bars_search_document();
+
+CREATE OR REPLACE FUNCTION songs_search_document() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_songs_document(NEW.bar_id);
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM refresh_songs_document(OLD.bar_id);
+    ELSIF NEW.bar_id IS DISTINCT FROM OLD.bar_id THEN
+        PERFORM refresh_songs_document(OLD.bar_id);
+        PERFORM refresh_songs_document(NEW.bar_id);
+    ELSIF NEW.name IS DISTINCT FROM OLD.name OR NEW.artist IS DISTINCT FROM OLD.artist THEN
+        PERFORM refresh_songs_document(NEW.bar_id);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS songs_search_document ON songs;
+CREATE TRIGGER songs_search_document
+    AFTER INSERT OR UPDATE OR DELETE ON songs
+    FOR EACH ROW EXECUTE FUNCTION songs_search_document();
+
+-- Backfill
+SELECT refresh_search_document(id), refresh_songs_document(id) FROM bars;
+
+CREATE INDEX IF NOT EXISTS bar_search_document_idx ON bar_search USING gin (search_document);
+CREATE INDEX IF NOT EXISTS bar_search_songs_document_idx ON bar_search USING gin (songs_document);
+CREATE INDEX IF NOT EXISTS bars_name_trgm_idx ON bars USING gin (name gin_trgm_ops);
+
+ANALYZE bars;
+ANALYZE bar_search;
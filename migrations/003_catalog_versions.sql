@@ -0,0 +1,30 @@
+-- Change counters for catalog data cached in the app.
+--
+-- Each row is bumped once per statement that changes the data it covers, so
+-- any worker can tell its in-memory copy is stale with a primary-key lookup.
+-- Writers outside the app (load_tags.py, the scrapers) are covered too.
+
+CREATE TABLE IF NOT EXISTS catalog_versions (
+    name text PRIMARY KEY,
+    version bigint NOT NULL DEFAULT 0,
+    updated_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION bump_catalog_version() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO catalog_versions (name, version, updated_at)
+    VALUES (TG_ARGV[0], 1, now())
+    ON CONFLICT (name) DO UPDATE
+    SET version = catalog_versions.version + 1,
+        updated_at = now();
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+-- Facet columns used by /api/filter_bars
+DROP TRIGGER IF EXISTS bars_facets_version ON bars;
+CREATE TRIGGER bars_facets_version
+    AFTER INSERT OR DELETE OR UPDATE OF name, price_signs, neighborhood, music_genres, club_vibes ON bars
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version('bar_facets');
+
+INSERT INTO catalog_versions (name) VALUES ('bar_facets') ON CONFLICT DO NOTHING;
@@ -0,0 +1,31 @@
+-- Indexed tag arrays for genre/vibe filtering.
+--
+-- venue_types stays the free-text source column (the scrapers write it);
+-- venue_tags is derived from it and holds each lowercased comma/semicolon
+-- separated tag plus the individual words in it, so "Cocktail Bar, Latin/Reggaeton"
+-- becomes {cocktail bar, cocktail, bar, latin/reggaeton, latin, reggaeton}.
+-- /api/bars filters it with && instead of one ILIKE per selected genre.
+-- app.py checks for venue_tags at runtime and keeps the ILIKE filter when
+-- it's missing.
+
+-- Must stay in step with tags.venue_tag()
+CREATE OR REPLACE FUNCTION venue_tags(value text) RETURNS text[] AS $$
+    SELECT coalesce(array_agg(DISTINCT tag ORDER BY tag), '{}')
+    FROM (
+        SELECT lower(regexp_replace(btrim(part), '\s+', ' ', 'g')) AS tag
+        FROM regexp_split_to_table(coalesce(value, ''), '[,;|]') AS part
+        UNION
+        SELECT lower(word)
+        FROM regexp_split_to_table(coalesce(value, ''), '[^[:alnum:]]+') AS word
+    ) tags
+    WHERE tag <> ''
+$$ LANGUAGE sql IMMUTABLE;
+
+ALTER TABLE bars ADD COLUMN IF NOT EXISTS venue_tags text[]
+    GENERATED ALWAYS AS (venue_tags(venue_types)) STORED;
+
+CREATE INDEX IF NOT EXISTS bars_venue_tags_idx ON bars USING gin (venue_tags);
+CREATE INDEX IF NOT EXISTS bars_music_genres_idx ON bars USING gin (music_genres);
+CREATE INDEX IF NOT EXISTS bars_club_vibes_idx ON bars USING gin (club_vibes);
+
+ANALYZE bars;
@@ -0,0 +1,23 @@
+-- Change counters behind the ETag/Last-Modified headers on the catalog
+-- endpoints (see httpcache.py). Uses catalog_versions and
+-- bump_catalog_version() from 003_catalog_versions.sql.
+
+-- Any change to bars: /api/bars/<id>
+DROP TRIGGER IF EXISTS bars_version ON bars;
+CREATE TRIGGER bars_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON bars
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version('bars');
+
+-- /api/events, /api/bars/<id>/events and the events in /api/bars/<id>
+DROP TRIGGER IF EXISTS events_version ON events;
+CREATE TRIGGER events_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON events
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version('events');
+
+-- /api/bars/<id>/songs
+DROP TRIGGER IF EXISTS songs_version ON songs;
+CREATE TRIGGER songs_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON songs
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version('songs');
+
+INSERT INTO catalog_versions (name) VALUES ('bars'), ('events'), ('songs') ON CONFLICT DO NOTHING;
@@ -0,0 +1,7 @@
+-- Index for /api/events windows and keyset pages, which filter and order on
+-- start_time. bar_id rides along so the geo filter's join to bars can be
+-- fed from the index.
+
+CREATE INDEX IF NOT EXISTS events_start_time_bar_id_idx ON events (start_time, bar_id);
+
+ANALYZE events;
@@ -0,0 +1,26 @@
+-- One vote per user per song request, enforced by the database so the
+-- single-statement vote in app.py can rely on ON CONFLICT DO NOTHING.
+
+-- Concurrent double taps could get two votes (and two tally bumps) in
+-- before; keep the first vote and take the extra bumps back off
+WITH duplicates AS (
+    DELETE FROM votes v
+    USING votes older
+    WHERE v.user_email = older.user_email
+      AND v.request_id = older.request_id
+      AND v.ctid > older.ctid
+    RETURNING v.request_id, v.vote_type
+)
+UPDATE song_requests sr
+SET upvotes = sr.upvotes - extra.upvotes,
+    downvotes = sr.downvotes - extra.downvotes
+FROM (
+    SELECT request_id,
+           count(*) FILTER (WHERE vote_type = 'upvote') AS upvotes,
+           count(*) FILTER (WHERE vote_type = 'downvote') AS downvotes
+    FROM duplicates
+    GROUP BY request_id
+) extra
+WHERE extra.request_id = sr.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS votes_user_email_request_id_key ON votes (user_email, request_id);
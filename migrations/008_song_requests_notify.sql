@@ -0,0 +1,26 @@
+-- Push song request changes to the live queue streams
+-- (/api/song_requests/<bar_id>/live). Each worker LISTENs on song_requests
+-- and fans the row out to its connected clients, so a change costs no
+-- queries per client. NOTIFY is sent on commit; payloads are one small row.
+
+CREATE OR REPLACE FUNCTION notify_song_request() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('song_requests', json_build_object(
+            'op', 'delete',
+            'request', json_build_object('id', OLD.id, 'bar_id', OLD.bar_id)
+        )::text);
+    ELSE
+        PERFORM pg_notify('song_requests', json_build_object(
+            'op', lower(TG_OP),
+            'request', row_to_json(NEW)
+        )::text);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS song_requests_notify ON song_requests;
+CREATE TRIGGER song_requests_notify
+    AFTER INSERT OR UPDATE OR DELETE ON song_requests
+    FOR EACH ROW EXECUTE FUNCTION notify_song_request();
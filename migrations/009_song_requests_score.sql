@@ -0,0 +1,36 @@
+-- Materialized ranking for song request queues (see leaderboard.py).
+--
+-- score = upvotes - downvotes and hot = score decayed by age are set by a
+-- BEFORE trigger on every insert and vote, so ranked reads walk an index
+-- instead of sorting the bar's whole history.
+
+ALTER TABLE song_requests ADD COLUMN IF NOT EXISTS score integer NOT NULL DEFAULT 0;
+ALTER TABLE song_requests ADD COLUMN IF NOT EXISTS hot double precision NOT NULL DEFAULT 0;
+
+-- Must stay in step with leaderboard.HOT_SECONDS and rank_sql()
+CREATE OR REPLACE FUNCTION song_request_hot(score integer, requested_at timestamptz) RETURNS double precision AS $$
+    SELECT sign(score) * log(greatest(abs(score), 1)) + extract(epoch FROM requested_at) / 3600
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION set_song_request_score() RETURNS trigger AS $$
+BEGIN
+    NEW.score := coalesce(NEW.upvotes, 0) - coalesce(NEW.downvotes, 0);
+    NEW.hot := song_request_hot(NEW.score, coalesce(NEW.request_time, now()));
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS song_requests_score ON song_requests;
+CREATE TRIGGER song_requests_score
+    BEFORE INSERT OR UPDATE OF upvotes, downvotes, request_time ON song_requests
+    FOR EACH ROW EXECUTE FUNCTION set_song_request_score();
+
+-- Backfill without a live queue NOTIFY per row
+ALTER TABLE song_requests DISABLE TRIGGER song_requests_notify;
+UPDATE song_requests SET upvotes = upvotes;  -- fires song_requests_score
+ALTER TABLE song_requests ENABLE TRIGGER song_requests_notify;
+
+CREATE INDEX IF NOT EXISTS song_requests_top_idx ON song_requests (bar_id, event_id, score DESC, id DESC);
+CREATE INDEX IF NOT EXISTS song_requests_hot_idx ON song_requests (bar_id, event_id, hot DESC, id DESC);
+
+ANALYZE song_requests;
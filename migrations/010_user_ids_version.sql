@@ -0,0 +1,10 @@
+-- Change counter for the email -> id cache in identity.py, so every worker
+-- drops its copy when a user is deleted (or an email is ever rewritten).
+-- Uses catalog_versions and bump_catalog_version() from 003.
+
+DROP TRIGGER IF EXISTS users_ids_version ON users;
+CREATE TRIGGER users_ids_version
+    AFTER DELETE OR TRUNCATE OR UPDATE OF id, email ON users
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version('user_ids');
+
+INSERT INTO catalog_versions (name) VALUES ('user_ids') ON CONFLICT DO NOTHING;
@@ -0,0 +1,50 @@
+-- Denormalized follower/following counts on users (see follow_counts.py).
+--
+-- A row trigger on follows adjusts both users in the statement that
+-- follows, unfollows or blocks, so the counts commit (or roll back) with
+-- it. Both rows are updated in one statement, in id order, so opposite
+-- follows between the same two users can't deadlock.
+
+-- Repeated follow taps could insert the same pair twice; the counts (and
+-- ON CONFLICT in /api/follow) need one row per pair
+DELETE FROM follows f
+USING follows older
+WHERE f.follower_id = older.follower_id
+  AND f.followed_id = older.followed_id
+  AND f.ctid > older.ctid;
+
+CREATE UNIQUE INDEX IF NOT EXISTS follows_follower_id_followed_id_key ON follows (follower_id, followed_id);
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS follower_count integer NOT NULL DEFAULT 0;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS following_count integer NOT NULL DEFAULT 0;
+
+CREATE OR REPLACE FUNCTION update_follow_counts() RETURNS trigger AS $$
+DECLARE
+    pair follows%ROWTYPE;
+    delta integer;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        pair := NEW;
+        delta := 1;
+    ELSE
+        pair := OLD;
+        delta := -1;
+    END IF;
+
+    UPDATE users
+    SET follower_count = follower_count + CASE WHEN id = pair.followed_id THEN delta ELSE 0 END,
+        following_count = following_count + CASE WHEN id = pair.follower_id THEN delta ELSE 0 END
+    WHERE id IN (pair.follower_id, pair.followed_id);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS follows_counts ON follows;
+CREATE TRIGGER follows_counts
+    AFTER INSERT OR DELETE ON follows
+    FOR EACH ROW EXECUTE FUNCTION update_follow_counts();
+
+-- Backfill; follow_counts.reconcile() runs the same repair nightly
+UPDATE users u
+SET follower_count = (SELECT COUNT(*) FROM follows WHERE followed_id = u.id),
+    following_count = (SELECT COUNT(*) FROM follows WHERE follower_id = u.id);
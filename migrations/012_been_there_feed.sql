@@ -0,0 +1,27 @@
+-- Materialized "been there" feeds (see feed.py). Needs 011 for
+-- users.follower_count, which decides push or pull per author.
+
+CREATE TABLE IF NOT EXISTS feed_items (
+    user_id integer NOT NULL,    -- whose feed
+    entry_id integer NOT NULL,   -- been_there.id
+    author_id integer NOT NULL,  -- been_there.user_id, rechecked against follows on read
+    PRIMARY KEY (user_id, entry_id)
+);
+
+-- Pull path for popular authors and backfill on follow
+CREATE INDEX IF NOT EXISTS been_there_user_id_id_idx ON been_there (user_id, id DESC);
+
+-- Seed every feed with its most recent entries from pushed authors
+INSERT INTO feed_items (user_id, entry_id, author_id)
+SELECT follower_id, id, user_id
+FROM (
+    SELECT f.follower_id, bt.id, bt.user_id,
+           row_number() OVER (PARTITION BY f.follower_id ORDER BY bt.id DESC) AS position
+    FROM follows f
+    JOIN users a ON a.id = f.followed_id AND a.follower_count <= 5000  -- feed.FEED_FANOUT_MAX
+    JOIN been_there bt ON bt.user_id = f.followed_id
+) recent
+WHERE position <= 500  -- feed.FEED_MAX_LENGTH
+ON CONFLICT DO NOTHING;
+
+ANALYZE feed_items;
@@ -0,0 +1,16 @@
+-- Covering indexes for both directions of follows, so the mutual friends
+-- self-join (MUTUAL_FRIENDS_SQL in app.py) and the follower/following
+-- lists can be index-only scans (once autovacuum has set the visibility
+-- map): each carries the sharing flag it reads.
+--
+-- The (follower_id, followed_id) one replaces 011's unique index and
+-- keeps it unique for ON CONFLICT in /api/follow.
+
+CREATE UNIQUE INDEX IF NOT EXISTS follows_follower_followed_covering
+    ON follows (follower_id, followed_id) INCLUDE (is_sharing_location);
+DROP INDEX IF EXISTS follows_follower_id_followed_id_key;
+
+CREATE INDEX IF NOT EXISTS follows_followed_follower_covering
+    ON follows (followed_id, follower_id) INCLUDE (is_sharing_location);
+
+ANALYZE follows;
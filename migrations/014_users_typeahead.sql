@@ -0,0 +1,25 @@
+-- Typeahead indexes for /api/users (see user_search.py).
+--
+-- C collation btrees on the lowercased username and name serve
+-- lower(x) COLLATE "C" LIKE 'abc%' as an ordered range scan; trigram GIN
+-- indexes serve the ILIKE '%abc%' substring branch. The block anti-join
+-- uses the (blocker_id, blocked_id) key /api/block already relies on, and
+-- the friends boost uses the follows indexes from 013.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS users_username_prefix_idx ON users ((lower(username) COLLATE "C"));
+CREATE INDEX IF NOT EXISTS users_name_prefix_idx ON users ((lower(name) COLLATE "C"));
+CREATE INDEX IF NOT EXISTS users_username_trgm_idx ON users USING gin (username gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS users_name_trgm_idx ON users USING gin (name gin_trgm_ops);
+
+-- Blocks change who may appear in anyone's results; bump a version so
+-- cached search responses are retired at once (see app.py)
+DROP TRIGGER IF EXISTS blocks_version ON blocks;
+CREATE TRIGGER blocks_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON blocks
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version('blocks');
+
+INSERT INTO catalog_versions (name) VALUES ('blocks') ON CONFLICT DO NOTHING;
+
+ANALYZE users;
@@ -0,0 +1,54 @@
+-- Rebuild each bar's songs_document once per statement instead of once per
+-- row. The row trigger from 002 re-aggregated every song of the bar for
+-- each song inserted or deleted, so reloading a playlist of N songs cost
+-- O(N^2). The statement triggers read the changed rows from transition
+-- tables and refresh each affected bar once.
+
+DROP TRIGGER IF EXISTS songs_search_document ON songs;
+
+CREATE OR REPLACE FUNCTION songs_search_document_batch() RETURNS trigger AS $$
+BEGIN
+    -- Transition tables only exist for the events that define them, so
+    -- each branch names only its own (PL/pgSQL plans a query when it runs)
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_songs_document(bar_id)
+        FROM (SELECT DISTINCT bar_id FROM new_songs WHERE bar_id IS NOT NULL) changed;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM refresh_songs_document(bar_id)
+        FROM (SELECT DISTINCT bar_id FROM old_songs WHERE bar_id IS NOT NULL) changed;
+    ELSE
+        PERFORM refresh_songs_document(bar_id)
+        FROM (
+            SELECT n.bar_id FROM new_songs n JOIN old_songs o ON o.id = n.id
+            WHERE n.bar_id IS DISTINCT FROM o.bar_id
+               OR n.name IS DISTINCT FROM o.name
+               OR n.artist IS DISTINCT FROM o.artist
+            UNION
+            SELECT o.bar_id FROM new_songs n JOIN old_songs o ON o.id = n.id
+            WHERE n.bar_id IS DISTINCT FROM o.bar_id
+        ) changed
+        WHERE bar_id IS NOT NULL;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS songs_search_document_insert ON songs;
+CREATE TRIGGER songs_search_document_insert
+    AFTER INSERT ON songs
+    REFERENCING NEW TABLE AS new_songs
+    FOR EACH STATEMENT EXECUTE FUNCTION songs_search_document_batch();
+
+DROP TRIGGER IF EXISTS songs_search_document_update ON songs;
+CREATE TRIGGER songs_search_document_update
+    AFTER UPDATE ON songs
+    REFERENCING OLD TABLE AS old_songs NEW TABLE AS new_songs
+    FOR EACH STATEMENT EXECUTE FUNCTION songs_search_document_batch();
+
+DROP TRIGGER IF EXISTS songs_search_document_delete ON songs;
+CREATE TRIGGER songs_search_document_delete
+    AFTER DELETE ON songs
+    REFERENCING OLD TABLE AS old_songs
+    FOR EACH STATEMENT EXECUTE FUNCTION songs_search_document_batch();
+
+DROP FUNCTION IF EXISTS songs_search_document();
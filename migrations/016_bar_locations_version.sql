@@ -0,0 +1,13 @@
+-- Change counter for the in-memory bar indexes built from names and
+-- coordinates: the grid behind /api/nearby_bars (geo.BarLocations) and the
+-- trigram name index that resolves AI suggestions (bar_names.BarNames).
+-- Unlike 'bars', it doesn't move on the crowd/line updates from
+-- /api/update_bar, so those don't trigger rebuilds.
+-- Uses catalog_versions and bump_catalog_version() from 003.
+
+DROP TRIGGER IF EXISTS bars_locations_version ON bars;
+CREATE TRIGGER bars_locations_version
+    AFTER INSERT OR DELETE OR TRUNCATE OR UPDATE OF name, address, latitude, longitude ON bars
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version('bar_locations');
+
+INSERT INTO catalog_versions (name) VALUES ('bar_locations') ON CONFLICT DO NOTHING;
@@ -0,0 +1,27 @@
+-- Delete notifications for the live queue streams carry the request's
+-- event_id and request_time as well, so a stream for one event (or for
+-- tonight's unscheduled requests) only forwards the deletes that belong
+-- to it, the same filter inserts and updates already get. Replaces
+-- notify_song_request() from 008; the trigger itself is unchanged.
+
+CREATE OR REPLACE FUNCTION notify_song_request() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('song_requests', json_build_object(
+            'op', 'delete',
+            'request', json_build_object(
+                'id', OLD.id,
+                'bar_id', OLD.bar_id,
+                'event_id', OLD.event_id,
+                'request_time', OLD.request_time
+            )
+        )::text);
+    ELSE
+        PERFORM pg_notify('song_requests', json_build_object(
+            'op', lower(TG_OP),
+            'request', row_to_json(NEW)
+        )::text);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
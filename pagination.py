@@ -0,0 +1,22 @@
+import base64
+import json
+import math
+
+
+def encode_cursor(values):
+    """Opaque, URL-safe cursor for a dict of keyset values (None/inf allowed)."""
+    values = {key: (None if isinstance(value, float) and math.isinf(value) else value) for key, value in values.items()}
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor(); raises ValueError on anything malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, dict):
+        raise ValueError('Invalid cursor')
+    return values
@@ -0,0 +1,54 @@
+import db
+
+# Named response shapes for bar rows.
+#
+# List endpoints return the compact card; single-bar and owner views return
+# the detail shape, which is every bars column except the private ones.
+# Either can be narrowed further with ?fields=id,name,... on the request.
+
+# Never serialized: the bar's Spotify OAuth token, the owner passcode and
+# columns derived for indexing
+PRIVATE_BAR_COLUMNS = {'spotify_token', 'passcode', 'venue_tags'}
+
+# Compact columns for bar list items
+BAR_CARD_COLUMNS = [
+    'id', 'name', 'address', 'photo', 'price_signs', 'price_num', 'neighborhood',
+    'music_genres', 'club_vibes', 'venue_types', 'vibe', 'line_wait_time', 'how_crowded',
+    'latitude', 'longitude'
+]
+
+def bar_detail_columns(conn):
+    """Every bars column except PRIVATE_BAR_COLUMNS, in table order.
+
+    Re-read every db.SCHEMA_RECHECK_SECS, so a column added by a migration
+    shows up without a restart.
+    """
+    return db.schema_fact(conn, 'bar_detail_columns', """
+        SELECT column_name FROM information_schema.columns
+        WHERE table_name = 'bars' AND table_schema = current_schema()
+        ORDER BY ordinal_position
+    """, lambda rows: [row[0] for row in rows if row[0] not in PRIVATE_BAR_COLUMNS])
+
+
+def requested_fields(fields, columns, extras=()):
+    """(columns, extras) narrowed to a comma-separated ?fields= value.
+
+    `extras` are keys the endpoint adds itself (songs, events, distance) and
+    are only computed when asked for. Without `fields` everything is
+    returned. id is always kept. Raises ValueError naming unknown fields.
+    """
+    if not fields:
+        return list(columns), set(extras)
+
+    wanted = {field.strip() for field in fields.split(',') if field.strip()}
+    unknown = wanted - set(columns) - set(extras)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    return [column for column in columns if column == 'id' or column in wanted], wanted & set(extras)
+
+
+def columns_sql(columns, alias=None):
+    """Comma-separated, qualified column list for a SELECT."""
+    prefix = f'{alias}.' if alias else ''
+    return ', '.join(f'{prefix}{column}' for column in columns)
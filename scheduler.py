@@ -8,6 +8,9 @@ from dotenv import load_dotenv
 import logging
 import pytz
 
+import feed
+import follow_counts
+
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
@@ -115,12 +118,34 @@ def update_database():
     except Exception as e:
         logger.error("Error updating database: %s", e)
 
+def reconcile_follow_counts():
+    try:
+        conn = get_db_connection()
+        if follow_counts.has_follow_counters(conn):
+            repaired = follow_counts.reconcile(conn)
+            logger.info("Follow counts reconciled, %s users repaired", repaired)
+        conn.close()
+    except Exception as e:
+        logger.error("Error reconciling follow counts: %s", e)
+
+def trim_feeds():
+    try:
+        conn = get_db_connection()
+        if feed.has_feed(conn):
+            removed = feed.trim(conn)
+            logger.info("Been there feeds trimmed, %s entries removed", removed)
+        conn.close()
+    except Exception as e:
+        logger.error("Error trimming feeds: %s", e)
+
 def run_schedule():
     logger.info("Running initial database update...")
     update_database()  # Update immediately upon starting
 
     logger.info("Scheduling hourly updates...")
     schedule.every().hour.at(":00").do(update_database)  # Schedule to run at the start of every hour
+    schedule.every().day.at("04:30").do(reconcile_follow_counts)  # Repair follower/following count drift nightly
+    schedule.every().day.at("04:45").do(trim_feeds)  # Keep each been there feed to feed.FEED_MAX_LENGTH
     while True:
         schedule.run_pending()
         time.sleep(1)
@@ -0,0 +1,59 @@
+import db
+from bar_names import normalize_name
+
+
+def has_search_document(conn):
+    """True once migrations/002_bars_search.sql has created bar_search."""
+    return db.has_feature(conn, 'bar_search', "SELECT to_regclass('bar_search') IS NOT NULL")
+
+
+def prefix_tsquery(search):
+    """tsquery text requiring every word of `search` as a prefix, e.g. 'roof:* bar:*'."""
+    return ' & '.join(f'{word}:*' for word in normalize_name(search).split())
+
+
+def bar_search_sql(search, indexed):
+    """(join_sql, match_sql, match_params, rank_sql, rank_params) for bars b matching the search box text.
+
+    The indexed variant joins bar_search bs, uses its GIN-backed documents and ranks
+    name > neighborhood/address > genres/vibes > description > songs, with
+    trigram similarity on the name as a tie-breaker. The fallback is the
+    original unindexed ILIKE query with every match ranked equally.
+
+    rank_sql is always float8: ts_rank and similarity are float4, which
+    never equals the float8 a cursor hands back, so keyset pages would skip
+    rows that tie on rank.
+    """
+    pattern = f'%{search}%'
+
+    if not indexed:
+        return (
+            "",
+            """(b.name ILIKE %s OR b.description ILIKE %s OR b.address ILIKE %s
+               OR EXISTS (
+                   SELECT 1
+                   FROM playlists p
+                   JOIN songs s ON p.id = s.playlist_id
+                   WHERE p.bar_id = b.id AND (s.name ILIKE %s OR s.artist ILIKE %s)
+               ))""",
+            [pattern] * 5,
+            "0::float8",
+            []
+        )
+
+    tsquery = prefix_tsquery(search)
+    if not tsquery:
+        # Nothing but punctuation; only the trigram name index can help
+        return "", "b.name ILIKE %s", [pattern], "similarity(b.name, %s)::float8", [search]
+
+    return (
+        "LEFT JOIN bar_search bs ON bs.bar_id = b.id",
+        """(bs.search_document @@ to_tsquery('simple', %s)
+            OR bs.songs_document @@ to_tsquery('simple', %s)
+            OR b.name ILIKE %s)""",
+        [tsquery, tsquery, pattern],
+        """(coalesce(ts_rank(bs.search_document, to_tsquery('simple', %s)), 0)
+            + 0.5 * coalesce(ts_rank(bs.songs_document, to_tsquery('simple', %s)), 0)
+            + similarity(b.name, %s))::float8""",
+        [tsquery, tsquery, search]
+    )
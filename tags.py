@@ -0,0 +1,32 @@
+import re
+
+import db
+
+
+def has_venue_tags(conn):
+    """True once migrations/004_bars_tag_arrays.sql has added bars.venue_tags."""
+    return db.has_feature(conn, 'bars_venue_tags', """
+        SELECT EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'bars' AND column_name = 'venue_tags'
+        )
+    """)
+
+
+def venue_tag(value):
+    """Normalize a genre/venue type the way the venue_tags() SQL function does."""
+    return re.sub(r'\s+', ' ', value.strip()).lower()
+
+
+def genre_filter_sql(genres, indexed):
+    """(sql, params) matching bars b whose venue types include any of `genres`.
+
+    The indexed variant is a single && against the GIN-indexed venue_tags
+    array. The fallback is the original ILIKE per genre on venue_types.
+    """
+    if indexed:
+        return "b.venue_tags && %s::text[]", [[venue_tag(genre) for genre in genres]]
+
+    conditions = " OR ".join("b.venue_types ILIKE %s" for _ in genres)
+    return f"({conditions})", [f"%{genre}%" for genre in genres]
+
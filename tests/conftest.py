@@ -0,0 +1,83 @@
+import os
+import sys
+
+import pytest
+
+# The modules under test live at the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+
+
+@pytest.fixture
+def pg():
+    """A connection to the configured database, rolled back afterwards.
+
+    Tests that need real query plans use this; they're skipped when no
+    database is reachable (HOST, DATABASE, DB_USER, PASSWORD as for the app).
+    """
+    try:
+        conn = db.pool.getconn()
+    except Exception as e:
+        pytest.skip(f"no database: {e}")
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+        db.pool.putconn(conn)
+
+
+class FakeCursor:
+    """Records statements on its connection and answers every fetch with its rows."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.rowcount = 0
+
+    @property
+    def description(self):
+        return self.connection.description
+
+    def execute(self, sql, params=None):
+        self.connection.statements.append((' '.join(sql.split()), params))
+        self.rowcount = self.connection.rowcount
+
+    def fetchall(self):
+        return list(self.connection.rows)
+
+    def fetchone(self):
+        return self.connection.rows[0] if self.connection.rows else None
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """Stand-in for a psycopg2 connection with canned results.
+
+    `rows` answer every fetch, `rowcount` every statement and `description`
+    (a list of (name,) tuples) the column names; all can be changed between
+    calls. Statements run are kept, whitespace-collapsed, in `statements`.
+    """
+
+    def __init__(self, rows=(), rowcount=0, description=None):
+        self.rows = list(rows)
+        self.rowcount = rowcount
+        self.description = description
+        self.statements = []
+        self.commits = 0
+
+    def cursor(self, cursor_factory=None):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+
+@pytest.fixture
+def fake_conn():
+    """FakeConnection, to call with the rows, rowcount and description a test needs."""
+    return FakeConnection
@@ -0,0 +1,57 @@
+from bar_names import BarNameIndex, normalize_name, trigrams
+
+BARS = [
+    {'id': 1, 'name': 'Le Bain'},
+    {'id': 2, 'name': 'Le Bar'},
+    {'id': 3, 'name': "Althea’s Rooftop Bar"},
+    {'id': 4, 'name': 'The Rooftop at Pier 17'},
+    {'id': 5, 'name': 'Blue Lounge'},
+    {'id': 6, 'name': 'Red Lounge'},
+    {'id': 7, 'name': 'Corner Bar'},
+    {'id': 8, 'name': ''},
+]
+
+
+def test_normalize_name_folds_quotes_and_punctuation():
+    assert normalize_name("Althea’s Rooftop") == normalize_name("Altheas  Rooftop!") == 'altheas rooftop'
+
+
+def test_trigrams_pad_words():
+    assert trigrams('ab') == {'  a', ' ab', 'ab '}
+
+
+def test_exact_name_scores_one():
+    index = BarNameIndex(BARS)
+    assert len(index) == 7  # blank names are skipped
+    assert index.search('le bain')[0] == (1, 1.0)
+
+
+def test_multi_word_containment_matches():
+    index = BarNameIndex(BARS)
+    assert (4, 0.9) in index.search('The Rooftop')
+
+
+def test_single_word_gets_no_containment_boost():
+    index = BarNameIndex(BARS)
+    # Plain similarity only: short names stay close, none reach 0.9
+    assert all(score < 0.9 for _, score in index.search('Lounge'))
+    assert index.search('Bar', min_score=0.6) == []
+    assert len(index.resolve(['Lounge'])) == 1
+
+
+def test_resolve_keeps_best_bar_per_name():
+    index = BarNameIndex(BARS)
+    assert index.resolve(['Le Bain']) == [(1, 1.0)]
+    assert index.resolve(['Le Bain', 'le bain', 'Blue Lounge']) == [(1, 1.0), (5, 1.0)]
+
+
+def test_resolve_drops_near_misses_and_caps_total():
+    index = BarNameIndex(BARS)
+    assert index.resolve(['Le Bainn Club']) == []
+    names = [bar['name'] for bar in BARS if bar['name']]
+    assert len(index.resolve(names, limit=3)) == 3
+
+
+def test_le_bain_does_not_resolve_to_le_bar():
+    index = BarNameIndex([bar for bar in BARS if bar['id'] != 1])
+    assert index.resolve(['Le Bain']) == []
@@ -0,0 +1,43 @@
+import pytest
+
+from pagination import decode_cursor, encode_cursor
+from search import bar_search_sql, prefix_tsquery
+
+
+def test_prefix_tsquery():
+    assert prefix_tsquery('Rooftop  bar!') == 'rooftop:* & bar:*'
+    assert prefix_tsquery('--') == ''
+
+
+@pytest.mark.parametrize('search, indexed', [('rooftop', True), ('--', True), ('rooftop', False)])
+def test_rank_is_float8_in_every_branch(search, indexed):
+    rank = bar_search_sql(search, indexed)[3]
+    assert rank.rstrip().endswith('::float8')
+
+
+def test_pages_across_tied_ranks(pg):
+    # Four names with the same float4 similarity to 'bar'; paging two at a
+    # time through a round-tripped cursor must see each exactly once
+    cursor = pg.cursor()
+    cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    cursor.execute("CREATE TEMP TABLE tie_bars (id integer PRIMARY KEY, name text) ON COMMIT DROP")
+    cursor.executemany("INSERT INTO tie_bars VALUES (%s, %s)",
+                       [(1, 'Bar Q'), (2, 'Bar W'), (3, 'Bar X'), (4, 'Bar Z'), (5, 'Rooftop')])
+
+    _, _, _, rank, _ = bar_search_sql('--', True)
+    seen, after = [], None
+    while True:
+        where, params = "b.name ILIKE %s", ['%bar%']
+        if after is not None:
+            where += f" AND ({rank} < %s OR ({rank} = %s AND b.id > %s))"
+            params += ['bar', after['r'], 'bar', after['r'], after['id']]
+        cursor.execute(f"SELECT b.id, {rank} AS rank FROM tie_bars b WHERE {where} "
+                       f"ORDER BY rank DESC, b.id LIMIT 2", ['bar'] + params)
+        rows = cursor.fetchall()
+        seen.extend(row[0] for row in rows)
+        if len(rows) < 2:
+            break
+        after = decode_cursor(encode_cursor({'r': rows[-1][1], 'id': rows[-1][0]}))
+
+    cursor.close()
+    assert seen == [1, 2, 3, 4]
@@ -0,0 +1,27 @@
+import app as app_module
+import geo
+import search
+import tags
+from pagination import decode_cursor
+
+
+def test_search_results_leave_out_paging_columns(monkeypatch, fake_conn):
+    rows = [{'id': n, 'name': f'Bar {n}', 'sort_key': float(n), 'rank': 1.0 / n} for n in range(1, 31)]
+    monkeypatch.setattr(app_module, 'get_db', lambda: fake_conn(rows=rows))
+    monkeypatch.setattr(geo, 'has_earthdistance', lambda conn: False)
+    monkeypatch.setattr(search, 'has_search_document', lambda conn: True)
+    monkeypatch.setattr(tags, 'has_venue_tags', lambda conn: True)
+
+    response = app_module.app.test_client().get('/api/bars?search=bar&fields=name')
+
+    assert response.status_code == 200
+    assert all('rank' not in bar and 'sort_key' not in bar for bar in response.get_json())
+    assert decode_cursor(response.headers['X-Next-Cursor']) == {'k': 30.0, 'id': 30, 'r': 1.0 / 30}
+
+
+def test_malformed_query_values_are_a_400():
+    client = app_module.app.test_client()
+    for query in ('page=two', 'latitude=north', 'longitude=', 'selected_distance=inf'):
+        response = client.get(f'/api/bars?{query}')
+        assert response.status_code == 400
+        assert response.get_json()['error'].startswith('Invalid ')
@@ -0,0 +1,167 @@
+import threading
+import time
+
+from flask import Flask, jsonify, request
+
+import httpcache
+from cache import RELEASE_SCRIPT, LRUCache, LocalBackend, RedisBackend, ResponseCache
+
+
+def make_app():
+    app = Flask(__name__)
+    cache = ResponseCache(LocalBackend(64))
+    calls = []
+
+    @app.route('/page')
+    @cache.cached(60, tags=('pages',))
+    def page():
+        calls.append(request.full_path)
+        response = jsonify([1, 2, 3])
+        response.headers['X-Next-Cursor'] = 'abc'
+        return response
+
+    return app, cache, calls
+
+
+def test_hit_keeps_next_cursor():
+    app, _, calls = make_app()
+    client = app.test_client()
+
+    first = client.get('/page?limit=3')
+    second = client.get('/page?limit=3')
+
+    assert first.headers['X-Cache'] == 'MISS'
+    assert second.headers['X-Cache'] == 'HIT'
+    assert second.headers['X-Next-Cursor'] == 'abc'
+    assert second.mimetype == 'application/json'
+    assert second.get_json() == [1, 2, 3]
+    assert len(calls) == 1
+
+
+def test_invalidate_drops_entry():
+    app, cache, calls = make_app()
+    client = app.test_client()
+
+    client.get('/page')
+    cache.invalidate('pages')
+    assert client.get('/page').headers['X-Cache'] == 'MISS'
+    assert len(calls) == 2
+
+
+def test_reads_entries_stored_without_headers():
+    app, _, _ = make_app()
+    with app.test_request_context():
+        response = ResponseCache._response(b'application/json\n[1]')
+    assert response.mimetype == 'application/json'
+    assert response.get_data() == b'[1]'
+    assert 'X-Next-Cursor' not in response.headers
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+
+
+def test_time_bucket_goes_into_the_key(monkeypatch):
+    app = Flask(__name__)
+    cache = ResponseCache(LocalBackend(64))
+    calls = []
+
+    @app.route('/upcoming')
+    @cache.cached(300, bucket=60)
+    def upcoming():
+        calls.append(1)
+        return jsonify(len(calls))
+
+    client = app.test_client()
+    monkeypatch.setattr(httpcache.time, 'time', lambda: 119.0)
+    assert client.get('/upcoming').get_json() == 1
+    assert client.get('/upcoming').headers['X-Cache'] == 'HIT'
+    # The conditional() ETag rolls over here, so the body must too
+    monkeypatch.setattr(httpcache.time, 'time', lambda: 120.0)
+    assert client.get('/upcoming').get_json() == 2
+
+
+def test_local_lock_is_released_only_by_its_holder(monkeypatch):
+    backend = LocalBackend(8)
+    now = [0.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+
+    slow = backend.acquire('k', 10)
+    assert slow and backend.acquire('k', 10) is None
+    now[0] = 11.0  # the slow holder's lock expires and another worker takes it
+    fast = backend.acquire('k', 10)
+    assert fast and fast != slow
+
+    backend.release('k', slow)
+    assert backend.acquire('k', 10) is None
+    backend.release('k', fast)
+    assert backend.acquire('k', 10)
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+        self.released = []
+
+    def set(self, key, value, nx=False, px=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    def register_script(self, script):
+        assert script == RELEASE_SCRIPT
+
+        def release(keys, args):
+            self.released.append((keys, args))
+            if self.values.get(keys[0]) == args[0]:
+                del self.values[keys[0]]
+        return release
+
+
+def test_redis_lock_stores_a_token_and_releases_by_compare_and_delete():
+    client = FakeRedis()
+    backend = RedisBackend(client, 'p:')
+    token = backend.acquire('k', 10)
+    assert client.values['p:lock:k'] == token
+    assert backend.acquire('k', 10) is None
+
+    backend.release('k', 'someone-else')
+    assert 'p:lock:k' in client.values
+    backend.release('k', token)
+    assert client.released[-1] == (['p:lock:k'], [token])
+    assert 'p:lock:k' not in client.values
+
+
+def test_waiters_run_at_once_when_the_leader_caches_nothing():
+    app = Flask(__name__)
+    cache = ResponseCache(LocalBackend(64))
+    started = threading.Event()
+    calls = []
+
+    @app.route('/missing')
+    @cache.cached(60)
+    def missing():
+        calls.append(1)
+        if len(calls) == 1:
+            started.set()
+            time.sleep(0.2)
+        return jsonify({'error': 'Not found'}), 404
+
+    leader = threading.Thread(target=lambda: app.test_client().get('/missing'))
+    leader.start()
+    started.wait()
+    start = time.monotonic()
+    response = app.test_client().get('/missing')
+    leader.join()
+
+    assert response.status_code == 404
+    assert time.monotonic() - start < 1  # not CACHE_LOCK_WAIT
+    assert len(calls) == 2
+    assert cache.stats()['uncacheable'] == 1
@@ -0,0 +1,39 @@
+import db
+from bar_names import BarNames
+from geo import BarLocations
+
+COLUMNS = [('id',), ('name',), ('address',), ('latitude',), ('longitude',)]
+
+
+def catalog(fake_conn):
+    conn = fake_conn(rows=[(1, 'Le Bain', '444 W 13th', 40.74, -74.01)], description=COLUMNS)
+    conn.version = 1
+    return conn
+
+
+def test_bar_indexes_reload_when_the_catalog_version_moves(monkeypatch, fake_conn):
+    conn = catalog(fake_conn)
+    monkeypatch.setattr(db, 'catalog_version', lambda c, name: c.version if name == 'bar_locations' else None)
+    locations = BarLocations(ttl=600, check_interval=0)
+    names = BarNames(ttl=600, check_interval=0)
+
+    assert len(locations.get(conn)) == 1
+    assert len(names.get(conn)) == 1
+
+    conn.rows.append((2, 'Rooftop', '1 Main St', 40.75, -74.0))
+    assert len(locations.get(conn)) == 1  # same version: keep the index
+
+    conn.version = 2
+    assert len(locations.get(conn)) == 2
+    assert len(names.get(conn)) == 2
+
+
+def test_invalidate_reloads_without_a_version_change(monkeypatch, fake_conn):
+    conn = catalog(fake_conn)
+    monkeypatch.setattr(db, 'catalog_version', lambda c, name: None)
+    locations = BarLocations(ttl=600, check_interval=0)
+    locations.get(conn)
+
+    conn.rows.append((2, 'Rooftop', '1 Main St', 40.75, -74.0))
+    locations.invalidate()
+    assert len(locations.get(conn)) == 2
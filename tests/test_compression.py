@@ -0,0 +1,44 @@
+import gzip
+
+from flask import Flask, Response
+
+import compression
+from compression import accepted_encodings, choose_encoding, compress_response
+
+
+def test_accepted_encodings_parses_q_values():
+    assert accepted_encodings('gzip, deflate;q=0.5, br;q=0, identity;q=bogus') == {'gzip', 'deflate'}
+    assert accepted_encodings(None) == set()
+    assert accepted_encodings('GZIP ;q=1.0') == {'gzip'}
+
+
+def test_choose_encoding(monkeypatch):
+    monkeypatch.setattr(compression, 'brotli', None)
+    assert choose_encoding('br, gzip') == 'gzip'
+    assert choose_encoding('*') == 'gzip'
+    assert choose_encoding('gzip;q=0') is None
+    assert choose_encoding('') is None
+
+
+def test_choose_encoding_prefers_brotli_when_installed(monkeypatch):
+    monkeypatch.setattr(compression, 'brotli', object())
+    assert choose_encoding('gzip, br') == 'br'
+
+
+def test_compresses_large_json():
+    app = Flask(__name__)
+    body = b'[' + b'1,' * 2000 + b'1]'
+    with app.app_context():
+        response = compress_response(Response(body, mimetype='application/json'), 'gzip')
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.get_data()) == body
+
+
+def test_leaves_small_and_binary_bodies_alone():
+    app = Flask(__name__)
+    with app.app_context():
+        small = compress_response(Response(b'[]', mimetype='application/json'), 'gzip')
+        image = compress_response(Response(b'x' * 5000, mimetype='image/png'), 'gzip')
+    assert 'Content-Encoding' not in small.headers
+    assert 'Content-Encoding' not in image.headers
@@ -0,0 +1,46 @@
+from datetime import datetime
+
+import pytest
+import pytz
+
+from event_windows import window_bounds
+
+TZ = pytz.timezone('America/New_York')
+
+
+def local(*args):
+    return TZ.localize(datetime(*args))
+
+
+def test_open_windows():
+    now = local(2024, 6, 5, 15, 0)
+    assert window_bounds('all', now) == (None, None)
+    assert window_bounds('upcoming', now) == (now, None)
+
+
+def test_tonight_runs_noon_to_5am():
+    assert window_bounds('tonight', local(2024, 6, 5, 15, 0)) == (local(2024, 6, 5, 12), local(2024, 6, 6, 5))
+
+
+def test_tonight_after_midnight_is_still_last_night():
+    assert window_bounds('tonight', local(2024, 6, 6, 2, 0)) == (local(2024, 6, 5, 12), local(2024, 6, 6, 5))
+
+
+@pytest.mark.parametrize('now', [
+    local(2024, 6, 4, 10, 0),   # Tuesday: the coming weekend
+    local(2024, 6, 7, 13, 0),   # Friday afternoon
+    local(2024, 6, 9, 23, 0),   # Sunday night
+    local(2024, 6, 10, 3, 0),   # early Monday, still Sunday night
+])
+def test_weekend_is_friday_noon_to_monday_5am(now):
+    assert window_bounds('weekend', now) == (local(2024, 6, 7, 12), local(2024, 6, 10, 5))
+
+
+def test_utc_input_is_converted():
+    now = pytz.utc.localize(datetime(2024, 6, 6, 3, 0))  # 11pm in New York
+    assert window_bounds('tonight', now)[0] == local(2024, 6, 5, 12)
+
+
+def test_unknown_window():
+    with pytest.raises(ValueError):
+        window_bounds('someday', local(2024, 6, 5, 12))
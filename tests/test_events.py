@@ -0,0 +1,18 @@
+import app as app_module
+import httpcache
+
+
+def test_non_numeric_limit_is_a_400(monkeypatch):
+    monkeypatch.setattr(httpcache.stamps, 'get', lambda names: None)
+    response = app_module.app.test_client().get('/api/events?limit=all')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid limit'}
+
+
+def test_malformed_coordinates_are_a_400(monkeypatch):
+    monkeypatch.setattr(httpcache.stamps, 'get', lambda names: None)
+    client = app_module.app.test_client()
+    for query in ('distance=far', 'latitude=north', 'longitude=nan'):
+        response = client.get(f'/api/events?{query}')
+        assert response.status_code == 400
+        assert response.get_json()['error'].startswith('Invalid ')
@@ -0,0 +1,31 @@
+from facets import FacetIndex
+
+ROWS = [
+    {'id': 10, 'price_signs': '$', 'neighborhood': 'SoHo', 'music_genres': ['House'], 'club_vibes': ['Chill']},
+    {'id': 11, 'price_signs': '$$', 'neighborhood': 'SoHo', 'music_genres': ['House', 'Disco'], 'club_vibes': None},
+    {'id': 12, 'price_signs': '$$', 'neighborhood': 'Chelsea', 'music_genres': [], 'club_vibes': ['Dancing']},
+    {'id': 13, 'price_signs': None, 'neighborhood': 'Chelsea', 'music_genres': ['Disco'], 'club_vibes': ['Chill']},
+]
+
+
+def test_no_selection_returns_everything_in_order():
+    ids, counts = FacetIndex(ROWS).query({})
+    assert ids == [10, 11, 12, 13]
+    assert counts['neighborhood'] == {'SoHo': 2, 'Chelsea': 2}
+    assert counts['music_genres'] == {'House': 2, 'Disco': 2}
+
+
+def test_values_or_within_a_facet_and_facets_and():
+    index = FacetIndex(ROWS)
+    assert index.query({'music_genres': ['House', 'Disco']})[0] == [10, 11, 13]
+    assert index.query({'music_genres': ['Disco'], 'neighborhood': ['SoHo']})[0] == [11]
+    assert index.query({'price_signs': ['$$$']})[0] == []
+
+
+def test_counts_ignore_their_own_facet():
+    _, counts = FacetIndex(ROWS).query({'neighborhood': ['SoHo'], 'club_vibes': ['Chill']})
+    # Neighborhood counts only apply the vibe filter
+    assert counts['neighborhood'] == {'SoHo': 1, 'Chelsea': 1}
+    # Vibe counts only apply the neighborhood filter
+    assert counts['club_vibes'] == {'Chill': 1}
+    assert counts['price_signs'] == {'$': 1}
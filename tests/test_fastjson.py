@@ -0,0 +1,46 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from fastjson import OrjsonProvider
+
+
+@pytest.fixture
+def app():
+    return Flask(__name__)
+
+
+@pytest.fixture
+def providers(app):
+    return OrjsonProvider(app), DefaultJSONProvider(app)
+
+
+def test_matches_default_provider(providers):
+    fast, default = providers
+    payload = {'b': 1, 'a': [Decimal('4.50'), datetime(2024, 6, 5, 22, 0)], 'c': None}
+    assert json.loads(fast.dumps(payload)) == json.loads(default.dumps(payload))
+
+
+def test_big_ints_fall_back_to_stdlib(app, providers):
+    fast, _ = providers
+    payload = {'total': 2 ** 70, 'when': datetime(2024, 6, 5)}
+    assert json.loads(fast.dumps(payload)) == {'total': 2 ** 70, 'when': 'Wed, 05 Jun 2024 00:00:00 GMT'}
+
+    with app.app_context():
+        response = fast.response(payload)
+    assert json.loads(response.get_data())['total'] == 2 ** 70
+
+
+def test_nan_is_null(providers):
+    fast, _ = providers
+    assert json.loads(fast.dumps([float('nan'), float('inf')])) == [None, None]
+
+
+def test_unserializable_still_raises(providers):
+    fast, _ = providers
+    with pytest.raises(TypeError):
+        fast.dumps({'x': object()})
@@ -0,0 +1,40 @@
+import app as app_module
+import feed
+
+
+def caught_up(conn):
+    return [params['author_id'] for sql, params in conn.statements if sql.startswith('INSERT INTO feed_items')]
+
+
+def run(monkeypatch, fake_conn, path, body, deleted):
+    # DELETE ... RETURNING followed_id answers with the unfollowed authors
+    conn = fake_conn(rows=[(author_id,) for author_id in deleted], rowcount=len(deleted))
+    monkeypatch.setattr(app_module, 'get_db', lambda: conn)
+    monkeypatch.setattr(app_module.user_ids, 'get', lambda conn, email: 1)
+    monkeypatch.setattr(feed, 'has_feed', lambda conn: True)
+    response = app_module.app.test_client().post(path, json=body)
+    assert response.status_code == 200
+    return conn
+
+
+def test_unfollow_catches_up_the_author(monkeypatch, fake_conn):
+    conn = run(monkeypatch, fake_conn, '/api/unfollow', {'identifier': 'a@example.com', 'followed_id': 7}, [7])
+    assert caught_up(conn) == [7]
+    sql = [sql for sql, _ in conn.statements if sql.startswith('INSERT INTO feed_items')][0]
+    assert 'a.follower_count = %(fanout_max)s' in sql
+
+
+def test_unfollow_of_no_one_does_nothing(monkeypatch, fake_conn):
+    conn = run(monkeypatch, fake_conn, '/api/unfollow', {'identifier': 'a@example.com', 'followed_id': 7}, [])
+    assert caught_up(conn) == []
+
+
+def test_block_catches_up_both_sides(monkeypatch, fake_conn):
+    conn = run(monkeypatch, fake_conn, '/api/block', {'identifier': 'a@example.com', 'blocked_id': 7}, [7, 1])
+    assert caught_up(conn) == [7, 1]
+
+
+def test_non_numeric_limit_is_a_400():
+    response = app_module.app.test_client().get('/api/following_been_there?identifier=a@example.com&limit=x')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid limit'}
@@ -0,0 +1,56 @@
+import pytest
+
+from geo import GridIndex, haversine_np
+
+# Lower Manhattan; 0.001 degrees of latitude is about 111 m
+ROWS = [
+    {'id': 1, 'name': 'Here', 'latitude': 40.7200, 'longitude': -74.0000},
+    {'id': 2, 'name': 'Next door', 'latitude': 40.7201, 'longitude': -74.0000},
+    {'id': 3, 'name': 'Down the block', 'latitude': 40.7210, 'longitude': -74.0000},
+    {'id': 4, 'name': 'Far', 'latitude': 40.7500, 'longitude': -74.0000},
+    {'id': 5, 'name': 'Nowhere', 'latitude': None, 'longitude': None},
+]
+
+
+def test_haversine_one_degree_of_latitude():
+    assert haversine_np(40.0, -74.0, 41.0, -74.0) == pytest.approx(111195, rel=1e-3)
+
+
+def test_rows_without_coordinates_are_skipped():
+    assert len(GridIndex(ROWS)) == 4
+
+
+def test_within_returns_nearest_first():
+    index = GridIndex(ROWS)
+    hits = index.within(40.7200, -74.0000, 150)
+    assert [row['id'] for row, _ in hits] == [1, 2, 3]
+    assert hits[0][1] == pytest.approx(0, abs=1e-6)
+    assert hits[1][1] == pytest.approx(11.1, rel=0.01)
+
+
+def test_within_spans_many_cells():
+    index = GridIndex(ROWS, cell_meters=10)
+    assert {row['id'] for row, _ in index.within(40.7205, -74.0000, 200)} == {1, 2, 3}
+
+
+def test_within_matches_brute_force():
+    index = GridIndex(ROWS)
+    for radius in (5, 50, 500, 5000):
+        expected = {
+            row['id'] for row in ROWS[:4]
+            if haversine_np(40.7203, -74.0001, row['latitude'], row['longitude']) < radius
+        }
+        assert {row['id'] for row, _ in index.within(40.7203, -74.0001, radius)} == expected
+
+
+def test_nearest_many_aligns_with_points():
+    index = GridIndex(ROWS)
+    results = index.nearest_many([(40.72009, -74.0), (None, None), (40.0, -70.0), (40.7499, -74.0)], 15)
+    assert results[0][0]['id'] == 2
+    assert results[1] is None
+    assert results[2] is None
+    assert results[3][0]['id'] == 4
+
+
+def test_nearest_many_empty():
+    assert GridIndex(ROWS).nearest_many([], 15) == []
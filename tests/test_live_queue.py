@@ -0,0 +1,74 @@
+import json
+from datetime import date
+
+from live_queue import QueueHub, SongQueue, matches
+
+
+def delta(n):
+    return {'op': 'update', 'request': {'id': n, 'bar_id': 1}}
+
+
+def test_reconnect_replays_only_missed_deltas():
+    hub = QueueHub(backlog=10)
+    for n in range(1, 6):
+        hub.publish(1, delta(n))
+
+    subscriber, replay = hub.subscribe(1, hub.event_id(3))
+    assert [seq for seq, _ in replay] == [4, 5]
+    hub.unsubscribe(1, subscriber)
+
+
+def test_unknown_or_foreign_ids_need_a_snapshot():
+    hub = QueueHub(backlog=10)
+    hub.publish(1, delta(1))
+    assert hub.subscribe(1, None)[1] is None
+    assert hub.subscribe(1, 'otherepoch-1')[1] is None
+    assert hub.subscribe(1, f'{hub.epoch}-x')[1] is None
+
+
+def test_trimmed_backlog_needs_a_snapshot():
+    hub = QueueHub(backlog=3)
+    for n in range(1, 8):
+        hub.publish(1, delta(n))
+    assert hub.subscribe(1, hub.event_id(2))[1] is None
+    assert [seq for seq, _ in hub.subscribe(1, hub.event_id(4))[1]] == [5, 6, 7]
+
+
+def test_subscribers_get_their_bar_only():
+    hub = QueueHub()
+    subscriber, _ = hub.subscribe(1)
+    hub.publish(2, delta(1))
+    hub.publish(1, delta(2))
+    assert subscriber.get_nowait() == (2, delta(2))
+    assert subscriber.empty()
+    assert hub.stats()['subscribers'] == 1
+
+
+def test_matches_follows_the_list_filter():
+    today = date(2024, 6, 5)
+    assert matches({'event_id': None}, None, today)
+    assert not matches({'event_id': 3}, None, today)
+    assert matches({'event_id': 3}, '3', today)
+    assert matches({'event_id': None, 'request_time': '2024-06-05T22:00:00'}, 3, today)
+    assert not matches({'event_id': None, 'request_time': '2024-06-04T22:00:00'}, 3, today)
+
+
+def test_stream_filters_every_op_by_event():
+    song_queue = SongQueue()
+    stream = song_queue.stream(1, '3', None, lambda: [])
+    assert 'event: snapshot' in next(stream)
+
+    def publish(op, request_id, **request):
+        song_queue.hub.publish(1, {'op': op, 'request': dict(id=request_id, bar_id=1, **request)})
+
+    publish('insert', 1, event_id=3)
+    publish('update', 2, event_id=4, upvotes=1)
+    publish('delete', 3, event_id=4, request_time=None)
+    publish('update', 4, event_id=3, upvotes=2)
+    publish('delete', 5, event_id=3, request_time=None)
+    publish('delete', 6)  # notified before migrations/017: no event to go by
+    publish('insert', 7, event_id=3)
+
+    received = [json.loads(next(stream).split('data: ', 1)[1])['request']['id'] for _ in range(5)]
+    assert received == [1, 4, 5, 6, 7]
+    stream.close()
@@ -0,0 +1,26 @@
+import app as app_module
+
+
+def get(headers=None):
+    return app_module.app.test_client().get('/api/metrics', headers=headers or {})
+
+
+def test_hidden_without_a_configured_token(monkeypatch):
+    monkeypatch.setattr(app_module, 'METRICS_TOKEN', None)
+    assert get().status_code == 404
+    assert get({'Authorization': 'Bearer '}).status_code == 404
+
+
+def test_needs_the_token(monkeypatch):
+    monkeypatch.setattr(app_module, 'METRICS_TOKEN', 's3cret')
+    assert get().status_code == 404
+    assert get({'Authorization': 'Bearer wrong'}).status_code == 404
+    assert get({'Authorization': 'Basic s3cret'}).status_code == 404
+
+
+def test_serves_stats_with_the_token(monkeypatch):
+    monkeypatch.setattr(app_module, 'METRICS_TOKEN', 's3cret')
+    monkeypatch.setattr(app_module.db.pool, 'stats', lambda: {'size': 0})
+    response = get({'Authorization': 'Bearer s3cret'})
+    assert response.status_code == 200
+    assert response.get_json()['db_pool'] == {'size': 0}
@@ -0,0 +1,9 @@
+import app as app_module
+
+
+def test_missing_or_malformed_coordinates_are_a_400():
+    client = app_module.app.test_client()
+    for query in ('', 'latitude=40.7', 'latitude=40.7&longitude=west'):
+        response = client.get(f'/api/nearby_bars?{query}')
+        assert response.status_code == 400
+        assert response.get_json()['error'].startswith('Invalid ')
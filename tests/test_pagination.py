@@ -0,0 +1,20 @@
+import pytest
+
+from pagination import decode_cursor, encode_cursor
+
+
+def test_round_trip():
+    values = {'k': 12.5, 'id': 7, 'name': 'Le Bain'}
+    cursor = encode_cursor(values)
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == values
+
+
+def test_infinity_becomes_null():
+    assert decode_cursor(encode_cursor({'k': float('inf'), 'id': 1})) == {'k': None, 'id': 1}
+
+
+@pytest.mark.parametrize('cursor', ['not a cursor!', 'W10', encode_cursor({'a': 1})[:-3] + '@@@'])
+def test_malformed_cursors_raise_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
@@ -0,0 +1,79 @@
+import threading
+
+import app as app_module
+
+
+def test_fans_out_up_front_and_takes_the_first_match(monkeypatch):
+    release = threading.Event()
+    seen = []
+    lock = threading.Lock()
+
+    def suggest(query, timeout, cancelled):
+        with lock:
+            seen.append(cancelled)
+            n = len(seen)
+        assert timeout <= app_module.AI_ATTEMPT_TIMEOUT
+        if n < 3:
+            release.wait(5)  # two slow completions
+            return ['Slow Bar']
+        return ['Fast Bar']
+
+    monkeypatch.setattr(app_module, 'AI_SEARCH_CONCURRENCY', 3)
+    monkeypatch.setattr(app_module, 'suggest_bar_names', suggest)
+    monkeypatch.setattr(app_module, 'match_suggested_bars', lambda names: [{'name': names[0]}] if names else [])
+
+    try:
+        assert app_module.recommend_bars('dancing') == [{'name': 'Fast Bar'}]
+        assert len(seen) == 3  # all started without waiting on the slow ones
+        assert seen[0].is_set()  # the abandoned calls see the search is over
+    finally:
+        release.set()
+
+
+def test_serial_with_concurrency_one(monkeypatch):
+    calls = []
+
+    def suggest(query, timeout, cancelled):
+        calls.append(1)
+        return ['Le Bain'] if len(calls) == 2 else ['Nowhere']
+
+    monkeypatch.setattr(app_module, 'AI_SEARCH_CONCURRENCY', 1)
+    monkeypatch.setattr(app_module, 'suggest_bar_names', suggest)
+    monkeypatch.setattr(app_module, 'match_suggested_bars',
+                        lambda names: [{'name': names[0]}] if names == ['Le Bain'] else [])
+
+    assert app_module.recommend_bars('rooftop') == [{'name': 'Le Bain'}]
+    assert len(calls) == 2
+
+
+def test_errors_are_replaced(monkeypatch):
+    calls = []
+
+    def suggest(query, timeout, cancelled):
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("rate limited")
+        return ['Le Bain']
+
+    monkeypatch.setattr(app_module, 'AI_SEARCH_CONCURRENCY', 1)
+    monkeypatch.setattr(app_module, 'suggest_bar_names', suggest)
+    monkeypatch.setattr(app_module, 'match_suggested_bars', lambda names: [{'name': names[0]}] if names else [])
+
+    assert app_module.recommend_bars('rooftop') == [{'name': 'Le Bain'}]
+    assert len(calls) == 2
+
+
+def test_misses_stop_at_max_attempts(monkeypatch):
+    calls = []
+    lock = threading.Lock()
+
+    def suggest(query, timeout, cancelled):
+        with lock:
+            calls.append(1)
+        return ['Nowhere']
+
+    monkeypatch.setattr(app_module, 'suggest_bar_names', suggest)
+    monkeypatch.setattr(app_module, 'match_suggested_bars', lambda names: [])
+
+    assert app_module.recommend_bars('nothing') == []
+    assert len(calls) == 10
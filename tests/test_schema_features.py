@@ -0,0 +1,35 @@
+import db
+
+
+def test_present_feature_is_kept(monkeypatch, fake_conn):
+    monkeypatch.setattr(db, '_schema_facts', {})
+    conn = fake_conn(rows=[(True,)])
+    assert db.has_feature(conn, 'thing', 'SELECT true')
+    conn.rows = [(False,)]
+    monkeypatch.setattr(db, 'SCHEMA_RECHECK_SECS', 0)
+    assert db.has_feature(conn, 'thing', 'SELECT true')
+    assert len(conn.statements) == 1
+
+
+def test_missing_feature_is_rechecked(monkeypatch, fake_conn):
+    monkeypatch.setattr(db, '_schema_facts', {})
+    conn = fake_conn(rows=[(False,)])
+    assert not db.has_feature(conn, 'thing', 'SELECT false')
+    assert not db.has_feature(conn, 'thing', 'SELECT false')
+    assert len(conn.statements) == 1  # within SCHEMA_RECHECK_SECS
+
+    monkeypatch.setattr(db, 'SCHEMA_RECHECK_SECS', 0)
+    conn.rows = [(True,)]  # migration applied while running
+    assert db.has_feature(conn, 'thing', 'SELECT false')
+    assert db.features() == {'thing': True}
+
+
+def test_schema_fact_values_expire(monkeypatch, fake_conn):
+    monkeypatch.setattr(db, '_schema_facts', {})
+    monkeypatch.setattr(db, 'SCHEMA_RECHECK_SECS', 0)
+    conn = fake_conn(rows=[('a',)])
+    parse = lambda rows: [rows[0][0]]
+    assert db.schema_fact(conn, 'columns', 'SELECT', parse) == ['a']
+    conn.rows = [('b',)]
+    assert db.schema_fact(conn, 'columns', 'SELECT', parse) == ['b']
+    assert db.features() == {}
@@ -0,0 +1,29 @@
+import app as app_module
+from pagination import decode_cursor
+
+
+def test_ranked_page_cursor_survives_cache_hit(monkeypatch, fake_conn):
+    calls = []
+
+    def load_song_requests(cursor, bar_id, event_id, order='recent', limit=None, after=None):
+        calls.append((bar_id, order, limit, after))
+        return [{'id': 9 - n, 'rank': 5 - n} for n in range(limit)]
+
+    monkeypatch.setattr(app_module, 'get_db', lambda: fake_conn())
+    monkeypatch.setattr(app_module, 'load_song_requests', load_song_requests)
+    app_module.response_cache.invalidate('song_requests:4242')
+
+    client = app_module.app.test_client()
+    first = client.get('/api/song_requests/4242?order=top&limit=2')
+    second = client.get('/api/song_requests/4242?order=top&limit=2')
+
+    assert second.headers['X-Cache'] == 'HIT'
+    assert second.headers['X-Next-Cursor'] == first.headers['X-Next-Cursor']
+    assert decode_cursor(second.headers['X-Next-Cursor']) == {'k': 4, 'id': 8}
+    assert len(calls) == 1
+
+
+def test_non_numeric_limit_is_a_400():
+    response = app_module.app.test_client().get('/api/song_requests/4242?order=top&limit=lots')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid limit'}
@@ -0,0 +1,80 @@
+import pytest
+
+import tags
+from tags import genre_filter_sql, venue_tag
+
+
+def test_venue_tag_matches_the_sql_normalization():
+    assert venue_tag('  Cocktail   Bar ') == 'cocktail bar'
+    assert venue_tag('Latin/Reggaeton') == 'latin/reggaeton'
+
+
+def test_indexed_filter_is_one_overlap():
+    sql, params = genre_filter_sql(['Lounge', ' Rooftop  Bar'], True)
+    assert sql == "b.venue_tags && %s::text[]"
+    assert params == [['lounge', 'rooftop bar']]
+
+
+def test_fallback_is_the_original_ilike_chain():
+    sql, params = genre_filter_sql(['Lounge', 'Rooftop'], False)
+    assert sql == "(b.venue_types ILIKE %s OR b.venue_types ILIKE %s)"
+    assert params == ['%Lounge%', '%Rooftop%']
+
+
+# Against a database with migrations/004 applied: a temp table shaped like
+# bars, so the checks don't depend on what's in the real catalog
+
+ROWS = [
+    (1, 'Cocktail Lounge'),
+    (2, 'Loungewear Pop-up'),
+    (3, 'Rooftop Bar, Latin/Reggaeton'),
+    (4, 'Dive Bar'),
+]
+
+
+@pytest.fixture
+def bars(pg):
+    if not tags.has_venue_tags(pg):
+        pytest.skip("migrations/004_bars_tag_arrays.sql not applied")
+    cursor = pg.cursor()
+    cursor.execute("""
+        CREATE TEMP TABLE tag_bars (
+            id integer PRIMARY KEY,
+            venue_types text,
+            venue_tags text[] GENERATED ALWAYS AS (venue_tags(venue_types)) STORED
+        ) ON COMMIT DROP
+    """)
+    cursor.execute("CREATE INDEX ON tag_bars USING gin (venue_tags)")
+    cursor.executemany("INSERT INTO tag_bars (id, venue_types) VALUES (%s, %s)", ROWS)
+    cursor.execute("ANALYZE tag_bars")
+    yield cursor
+    cursor.close()
+
+
+def matching(cursor, genres, indexed):
+    where, params = genre_filter_sql(genres, indexed)
+    cursor.execute(f"SELECT b.id FROM tag_bars b WHERE {where} ORDER BY b.id", params)
+    return [row[0] for row in cursor.fetchall()]
+
+
+def plan(cursor, genres, indexed):
+    where, params = genre_filter_sql(genres, indexed)
+    cursor.execute("SET LOCAL enable_seqscan = off")  # the table is tiny; ask whether an index *can* serve it
+    cursor.execute(f"EXPLAIN SELECT b.id FROM tag_bars b WHERE {where}", params)
+    return '\n'.join(row[0] for row in cursor.fetchall())
+
+
+def test_whole_tags_replace_substrings(bars):
+    # The intended change: 'Lounge' no longer matches inside 'Loungewear'
+    assert matching(bars, ['Lounge'], False) == [1, 2]
+    assert matching(bars, ['Lounge'], True) == [1]
+    # Whole tags and the words in them still match, case-insensitively
+    assert matching(bars, ['ROOFTOP BAR'], True) == [3]
+    assert matching(bars, ['Bar', 'reggaeton'], True) == [3, 4]
+
+
+def test_plans_before_and_after(bars):
+    before = plan(bars, ['Lounge', 'Rooftop'], False)
+    after = plan(bars, ['Lounge', 'Rooftop'], True)
+    assert 'tag_bars_venue_tags_idx' not in before
+    assert 'tag_bars_venue_tags_idx' in after
@@ -0,0 +1,26 @@
+import app as app_module
+import httpcache
+import user_search
+from user_search import like_escape, search_users
+
+
+def test_like_escape():
+    assert like_escape('50%_off\\') == '50\\%\\_off\\\\'
+
+
+def test_short_queries_keep_the_substring_branch(monkeypatch, fake_conn):
+    monkeypatch.setattr(user_search, 'has_user_search_indexes', lambda conn: True)
+    conn = fake_conn()
+    search_users(conn, conn.cursor(), 1, 'AB', 20)
+    sql, params = conn.statements[0]
+    assert 'ILIKE %(pattern)s' in sql
+    assert params['pattern'] == '%ab%'
+    assert params['prefix'] == 'ab%'
+    assert params['pool'] == 20 * user_search.USER_SEARCH_POOL
+
+
+def test_non_numeric_limit_is_a_400(monkeypatch):
+    monkeypatch.setattr(httpcache.stamps, 'get', lambda names: None)
+    response = app_module.app.test_client().get('/api/users?search=ab&identifier=a@example.com&limit=ten')
+    assert response.status_code == 400
+    assert response.get_json() == {'status': 'Invalid limit'}
@@ -0,0 +1,13 @@
+import app as app_module
+
+
+def test_vote_sql_without_unique_index(monkeypatch):
+    monkeypatch.setattr(app_module.db, 'has_feature', lambda conn, name, query: False)
+    sql = app_module.vote_sql(None)
+    assert 'ON CONFLICT' not in sql
+    assert 'NOT EXISTS' in sql
+
+
+def test_vote_sql_with_unique_index(monkeypatch):
+    monkeypatch.setattr(app_module.db, 'has_feature', lambda conn, name, query: name == 'votes_unique')
+    assert 'ON CONFLICT (user_email, request_id) DO NOTHING' in app_module.vote_sql(None)
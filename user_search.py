@@ -0,0 +1,96 @@
+import db
+
+# Typeahead search for the add friends screen (/api/users).
+#
+# Candidates come from index-backed branches only: a prefix range scan on
+# lower(username) and lower(name) (C collation btrees, which serve both the
+# LIKE 'abc%' range and its order), plus substring matches ("ab" finds
+# Gabe) from the trigram indexes. Under three characters a trigram index
+# can't narrow the substring branch, so it scans users until it has a pool
+# of matches; short queries match most rows, so that stops early.
+# Each branch stops at a candidate pool a few pages deep. Only that pool is
+# ranked: exact username > prefix > substring, then by how many of the
+# searcher's follows already follow the candidate, then by name.
+
+USER_SEARCH_LIMIT = 20  # results per keystroke by default
+USER_SEARCH_MAX_LIMIT = 50  # cap on ?limit=
+USER_SEARCH_POOL = 5  # candidates per branch, as a multiple of the limit
+
+
+def has_user_search_indexes(conn):
+    """True once migrations/014 has indexed users for typeahead."""
+    return db.has_feature(conn, 'user_search_indexes', "SELECT to_regclass('users_username_prefix_idx') IS NOT NULL")
+
+
+def like_escape(value):
+    """`value` with LIKE wildcards escaped, so a typed % or _ matches itself."""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+# The block filter is an anti-join (NOT EXISTS) on blocks (blocker_id,
+# blocked_id) rather than NOT IN over every user who blocked the searcher
+SEARCH_SQL = """
+    WITH candidates AS (
+        (SELECT id FROM users
+         WHERE lower(username) COLLATE "C" LIKE %(prefix)s
+         ORDER BY lower(username) COLLATE "C"
+         LIMIT %(pool)s)
+        UNION
+        (SELECT id FROM users
+         WHERE lower(name) COLLATE "C" LIKE %(prefix)s
+         ORDER BY lower(name) COLLATE "C"
+         LIMIT %(pool)s)
+        UNION
+        (SELECT id FROM users
+         WHERE username ILIKE %(pattern)s OR name ILIKE %(pattern)s
+         LIMIT %(pool)s)
+    )
+    SELECT u.id, u.email, u.name, u.username
+    FROM candidates c
+    JOIN users u ON u.id = c.id
+    WHERE u.id <> %(user_id)s
+      AND NOT EXISTS (
+          SELECT 1 FROM blocks bl WHERE bl.blocker_id = u.id AND bl.blocked_id = %(user_id)s
+      )
+    ORDER BY
+        CASE
+            WHEN lower(u.username) = %(search)s THEN 0
+            WHEN lower(u.username) LIKE %(prefix)s OR lower(u.name) LIKE %(prefix)s THEN 1
+            ELSE 2
+        END,
+        (SELECT count(*)
+         FROM follows theirs
+         JOIN follows mine ON mine.follower_id = %(user_id)s AND mine.followed_id = theirs.follower_id
+         WHERE theirs.followed_id = u.id) DESC,
+        u.name ASC
+    LIMIT %(limit)s
+"""
+
+# Before migrations/014: the original substring match, bounded, with the
+# block filter as an anti-join
+FALLBACK_SQL = """
+    SELECT u.id, u.email, u.name, u.username FROM users u
+    WHERE (u.name ILIKE %(pattern)s OR u.username ILIKE %(pattern)s)
+    AND u.id <> %(user_id)s
+    AND NOT EXISTS (
+        SELECT 1 FROM blocks bl WHERE bl.blocker_id = u.id AND bl.blocked_id = %(user_id)s
+    )
+    ORDER BY u.name ASC
+    LIMIT %(limit)s
+"""
+
+
+def search_users(conn, cursor, user_id, search, limit):
+    """Up to `limit` users matching `search` for `user_id`, best first."""
+    search = search.lower()
+    escaped = like_escape(search)
+    params = {
+        'user_id': user_id,
+        'search': search,
+        'prefix': escaped + '%',
+        'pattern': '%' + escaped + '%',
+        'pool': limit * USER_SEARCH_POOL,
+        'limit': limit,
+    }
+    cursor.execute(SEARCH_SQL if has_user_search_indexes(conn) else FALLBACK_SQL, params)
+    return cursor.fetchall()